@@ -0,0 +1,362 @@
+"""Benchmarks for the ERP data layer - seeded synthetic rosters in, timings out as JSON
+
+    python benchmarks/bench_erp.py                                  # 10k, 100k and 1M records
+    python benchmarks/bench_erp.py --sizes 10k --output base.json
+    python benchmarks/bench_erp.py --sizes 10k --compare base.json  # median ratio per operation
+
+Every size runs in a fresh interpreter against its own scratch data directory (ERP_DATA_DIR),
+so caches, singletons and the import start cold and nothing touches the real data files.
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Synthetic roster shape
+ROLES = {'Sanitary Worker': 0.55, 'Helper': 0.15, 'Driver': 0.12, 'Cleaner': 0.12,
+         'Data Entry Operator': 0.03, 'Zonal Officer': 0.02, 'Assistant Manager': 0.01}
+FIRST_NAMES = ['Ali', 'Ahmed', 'Bilal', 'Kamran', 'Imran', 'Usman', 'Hassan', 'Hamza', 'Faisal', 'Tariq',
+               'Asif', 'Naveed', 'Shahid', 'Zubair', 'Waqas', 'Sajid', 'Adnan', 'Rizwan', 'Arslan', 'Babar']
+LAST_NAMES = ['Khan', 'Ahmed', 'Ali', 'Raza', 'Hussain', 'Iqbal', 'Malik', 'Butt', 'Shah', 'Qureshi',
+              'Chaudhry', 'Sheikh', 'Javed', 'Aslam', 'Riaz']
+USERS = ['admin', 'arslan', 'ali', 'babar']
+VERSIONS_PER_PERSON = 0.4  # extra master rows per person - edits, transfers and removals
+VERSION_KINDS = {'edit': 0.6, 'transfer': 0.3, 'remove': 0.1}
+HISTORY_START = pd.Timestamp('2024-01-01')
+HISTORY_END = pd.Timestamp('2025-11-30')
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    scale = {'k': 1000, 'm': 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip('km')) * scale)
+
+def _placements(hierarchy) -> pd.DataFrame:
+    """Every CC/UC a worker can be posted to - City from the tree, Sadar from its flat UC range"""
+    rows = [('City', pp, zone, cc)
+            for pp, zones in hierarchy.city_data().items()
+            for zone, ccs in zones['zone_to_cc'].items() for cc in ccs]
+    rows += [('Sadar', '', '', uc) for uc in hierarchy.cc_uc_options('Sadar')]
+    return pd.DataFrame(rows, columns=['area', 'pp_sz', 'zone', 'cc_uc'])
+
+def _fill_sadar(rng, df: pd.DataFrame, hierarchy):
+    """Sadar SZ and Zone are independent of the UC - pick them at random"""
+    sadar = (df['area'] == 'Sadar').to_numpy()
+    df.loc[sadar, 'pp_sz'] = rng.choice(hierarchy.pp_sz_options('Sadar'), sadar.sum())
+    df.loc[sadar, 'zone'] = rng.choice(hierarchy.zone_options('Sadar'), sadar.sum())
+
+def _fmt(times: pd.Series, fmt: str) -> pd.Series:
+    return times.dt.strftime(fmt).fillna('')
+
+def generate_roster(records: int, seed: int, hierarchy) -> (pd.DataFrame, pd.DataFrame):
+    """Seeded master + history with `records` master rows - one supervisor per CC/UC, then workers
+    whose later versions are edits (phone), transfers within their area and removals"""
+    rng = np.random.default_rng(seed)
+    places = _placements(hierarchy)
+    n_people = max(len(places) + 1, int(records / (1 + VERSIONS_PER_PERSON)))
+    n_versions = max(0, records - n_people)
+
+    # People - supervisors first, posted one per CC/UC before anyone else joins
+    place_idx = np.concatenate([np.arange(len(places)), rng.integers(0, len(places), n_people - len(places))])
+    people = places.iloc[place_idx].reset_index(drop=True)
+    _fill_sadar(rng, people, hierarchy)
+    supervisor = np.arange(n_people) < len(places)
+    people['role'] = np.where(supervisor, 'Supervisor', rng.choice(list(ROLES), n_people, p=list(ROLES.values())))
+    people['person_id'] = [f'P{n:08X}' for n in range(1, n_people + 1)]
+    people['name'] = (pd.Series(rng.choice(FIRST_NAMES, n_people)) + ' ' + pd.Series(rng.choice(LAST_NAMES, n_people)))
+    people['cnic'] = (3520100000000 + rng.permutation(n_people)).astype(str)
+    people['phone'] = '03' + pd.Series(rng.integers(0, 10 ** 9, n_people)).astype(str).str.zfill(9)
+    driver = (people['role'] == 'Driver').to_numpy()
+    people['vehicle_id'] = np.where(driver, pd.Series(rng.integers(1, 999, n_people)).map('V-{:03d}'.format), '')
+    people['vehicle_reg_no'] = np.where(driver, pd.Series(rng.integers(1000, 9999, n_people)).map('LE{:04d}'.format), '')
+    span = (HISTORY_END - HISTORY_START).total_seconds()
+    joined = HISTORY_START + pd.to_timedelta(rng.uniform(0, span * 0.75, n_people), unit='s')
+    people['updated_on'] = np.where(supervisor, HISTORY_START - pd.Timedelta(days=30) + pd.to_timedelta(np.arange(n_people), unit='s'), joined)
+    people['updated_on'] = pd.to_datetime(people['updated_on']).dt.floor('s')
+    people['kind'] = 'add'
+    people['status'] = 'active'
+    people['status_changed_on'] = pd.NaT
+    people['last_transfer_on'] = pd.NaT
+    people['remarks'] = ''
+
+    # Later versions of workers, in time order per person - a removal can only be the last one
+    owner = rng.choice(np.flatnonzero(~supervisor), n_versions)
+    versions = people.iloc[owner].reset_index(drop=True)
+    versions['kind'] = rng.choice(list(VERSION_KINDS), n_versions, p=list(VERSION_KINDS.values()))
+    start = versions['updated_on']
+    versions['updated_on'] = (start + (HISTORY_END - start) * rng.uniform(0.01, 1, n_versions)).dt.floor('s')
+    versions = versions.sort_values(['person_id', 'updated_on'], kind='stable').reset_index(drop=True)
+    last = ~versions['person_id'].duplicated(keep='last')
+    versions.loc[(versions['kind'] == 'remove') & ~last, 'kind'] = 'edit'
+
+    # Changed values on the versions that change them, carried forward to the person's later versions
+    transfer = (versions['kind'] == 'transfer').to_numpy()
+    carried = pd.DataFrame(index=versions.index, columns=['area', 'pp_sz', 'zone', 'cc_uc', 'phone', 'last_transfer_on'], dtype=object)
+    for area in ('City', 'Sadar'):
+        rows = transfer & (versions['area'] == area).to_numpy()
+        choices = np.flatnonzero(places['area'] == area)
+        carried.loc[rows, ['area', 'pp_sz', 'zone', 'cc_uc']] = places.iloc[rng.choice(choices, rows.sum())].to_numpy()
+    sadar_moves = transfer & (carried['area'] == 'Sadar').to_numpy()
+    carried.loc[sadar_moves, 'pp_sz'] = rng.choice(hierarchy.pp_sz_options('Sadar'), sadar_moves.sum())
+    carried.loc[sadar_moves, 'zone'] = rng.choice(hierarchy.zone_options('Sadar'), sadar_moves.sum())
+    carried.loc[transfer, 'last_transfer_on'] = versions.loc[transfer, 'updated_on']
+    edit = (versions['kind'] == 'edit').to_numpy()
+    carried.loc[edit, 'phone'] = '03' + pd.Series(rng.integers(0, 10 ** 9, edit.sum())).astype(str).str.zfill(9).to_numpy()
+    carried = carried.groupby(versions['person_id']).ffill()
+    for col in carried.columns:
+        versions[col] = carried[col].where(carried[col].notna(), versions[col])
+    remove = (versions['kind'] == 'remove').to_numpy()
+    versions.loc[remove, 'status'] = 'removed'
+    versions.loc[remove, 'status_changed_on'] = versions.loc[remove, 'updated_on']
+
+    # One append-only log - record ids in time order, supervisors looked up by CC/UC
+    master = pd.concat([people, versions], ignore_index=True).sort_values('updated_on', kind='stable').reset_index(drop=True)
+    master['record_id'] = [f'W{n:04d}' for n in range(1, len(master) + 1)]
+    sup_rows = master[master['role'] == 'Supervisor']
+    master['supervisor_id'] = master['cc_uc'].map(dict(zip(sup_rows['cc_uc'], sup_rows['record_id'])))
+    master.loc[master['role'] == 'Supervisor', 'supervisor_id'] = ''
+    previous = master.groupby('person_id')[['cc_uc', 'phone']].shift()
+    kind = master['kind']
+    master.loc[kind == 'transfer', 'remarks'] = 'Transferred from ' + previous['cc_uc'] + '. '
+    master.loc[kind == 'edit', 'remarks'] = 'Edited phone from ' + previous['phone'] + ' to ' + master['phone'] + '. '
+
+    field = kind.map({'add': '', 'edit': 'phone', 'transfer': 'cc_uc', 'remove': 'status'})
+    history = pd.DataFrame({
+        'log_id': [f'H{n:04d}' for n in range(1, len(master) + 1)],
+        'person_id': master['person_id'],
+        'record_id': master['record_id'],
+        'action': kind,
+        'field': field,
+        'old_value': np.select([kind == 'edit', kind == 'transfer', kind == 'remove'],
+                               [previous['phone'], previous['cc_uc'], 'active'], ''),
+        'new_value': np.select([kind == 'edit', kind == 'transfer', kind == 'remove'],
+                               [master['phone'], master['cc_uc'], 'removed'], ''),
+        'by_user': rng.choice(USERS, len(master)),
+        'timestamp': _fmt(master['updated_on'], '%Y-%m-%dT%H:%M:%S.000000Z'),
+        'notes': '',
+    })
+    master['updated_on'] = _fmt(master['updated_on'], '%Y-%m-%d %H:%M:%S')
+    master['status_changed_on'] = _fmt(pd.to_datetime(master['status_changed_on']), '%Y-%m-%d')
+    master['last_transfer_on'] = _fmt(pd.to_datetime(master['last_transfer_on']), '%Y-%m-%d')
+    return master.drop(columns='kind'), history
+
+def _summary(op: str, seconds: List[float], errors: int = 0, rows: Optional[int] = None) -> Dict:
+    """Stats in ms - with several calls the first one (cold caches, views being built) is kept apart as first_ms"""
+    ms = np.array(seconds) * 1000
+    steady = ms[1:] if len(ms) > 1 else ms
+    return {'op': op, 'n': len(ms), 'first_ms': round(float(ms[0]), 3), 'median_ms': round(float(np.median(steady)), 3),
+            'p95_ms': round(float(np.percentile(steady, 95)), 3), 'min_ms': round(float(steady.min()), 3),
+            'max_ms': round(float(steady.max()), 3), 'errors': errors, 'rows': rows}
+
+def measure(results: List[Dict], op: str, fn, repeat: int = 1, rows: Optional[int] = None):
+    """Call fn(i) `repeat` times - a non-empty string result counts as an error, like the app's write paths"""
+    seconds, errors = [], 0
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(i)
+        seconds.append(time.perf_counter() - t0)
+        if isinstance(result, str) and result:
+            errors += 1
+            if errors == 1:
+                print(f"  {op}: {result}", file=sys.stderr)
+    results.append(_summary(op, seconds, errors, rows))
+    result = results[-1]
+    print(f"  {op:<22} first {result['first_ms']:>10.2f} ms  median {result['median_ms']:>10.2f} ms  p95 {result['p95_ms']:>10.2f} ms",
+          file=sys.stderr)
+
+def run_size(records: int, seed: int, repeat: int, bulk_rows: int) -> List[Dict]:
+    """One size, in this (fresh) process - ERP_DATA_DIR already points at an empty scratch directory"""
+    t0 = time.perf_counter()
+    import erp_data as erp
+    import_s = time.perf_counter() - t0
+    # pandas and numpy are already loaded here - this is what erp_data adds on top
+    results = [_summary('import_erp_data_after_pandas', [import_s])]
+
+    rng = np.random.default_rng(seed + 1)
+    t0 = time.perf_counter()
+    master, history = generate_roster(records, seed, erp.get_hierarchy())
+    master[erp.MASTER_COLUMNS].to_csv(erp.MASTER_CSV, index=False, lineterminator='\n')
+    history[erp.HISTORY_COLUMNS].to_csv(erp.HISTORY_CSV, index=False, lineterminator='\n')
+    print(f"  generated {len(master)} master / {len(history)} history rows in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+    places = _placements(erp.get_hierarchy())
+    city = places[places['area'] == 'City'].reset_index(drop=True)
+
+    measure(results, 'bootstrap', lambda i: erp.ensure_bootstrap())
+    measure(results, 'open_store', lambda i: erp.get_store(), rows=len(master))
+    measure(results, 'cold_load_master', lambda i: erp.load_cached_df(erp.MASTER_CSV), rows=len(master))
+    measure(results, 'current_records_build', lambda i: erp.get_current_records(), rows=len(master))
+
+    # Dashboard - the same steps main() runs for the roster table
+    filters = [('City', 'PP-110', '', ''), ('City', '', 'Zone-07', ''), ('Sadar', '', '', 'UC-14'), ('All', '', '', '')]
+    def dashboard_filter(i):
+        roster = erp.get_current_records()
+        roster = roster[roster['status'] == 'active']
+        erp.filter_roster(roster, *filters[i % len(filters)])
+    measure(results, 'dashboard_filter', dashboard_filter, repeat, rows=len(master))
+    queries = ['ali', 'khan', 'W12', '35201', 'LE1', 'hassan raza', 'V-0']
+    measure(results, 'search_index_build', lambda i: erp.search_records('zz'), rows=len(master))
+    measure(results, 'dashboard_search', lambda i: erp.search_records(queries[i % len(queries)]), repeat, rows=len(master))
+
+    # Write paths
+    measure(results, 'log_action', lambda i: erp.log_action('BENCH', '', 'bench', '', '', '', 'admin', f'run {i}'), repeat)
+
+    def add(i):
+        place = city.iloc[rng.integers(len(city))]
+        form = {'area': 'City', 'pp_sz': place['pp_sz'], 'zone': place['zone'], 'cc_uc': place['cc_uc'],
+                'role': 'Helper', 'name': f'Bench Worker {i}', 'cnic': str(4210100000000 + i), 'phone': '03001234567',
+                'vehicle_id': '', 'vehicle_reg_no': '', 'remarks': 'benchmark'}
+        return erp.add_new_worker(form, 'admin')
+    measure(results, 'add_new_worker', add, repeat)
+
+    current = erp.get_current_records()
+    workers = current[(current['status'] == 'active') & (current['role'] != 'Supervisor') & (current['area'] == 'City')]
+    picks = workers.iloc[rng.choice(len(workers), 2 * repeat, replace=False)]
+    def transfer(i):
+        row = picks.iloc[i]
+        place = city.iloc[rng.integers(len(city))]
+        return erp.perform_transfer(row['person_id'], row['record_id'], place[['area', 'pp_sz', 'zone', 'cc_uc']].to_dict(), 'admin', 'benchmark')
+    measure(results, 'perform_transfer', transfer, repeat)
+    def edit(i):
+        row = picks.iloc[repeat + i]
+        return erp.perform_edit(row['person_id'], row['record_id'], 'phone', f'0300{7000000 + i}', 'admin', 'benchmark')
+    measure(results, 'perform_edit', edit, repeat)
+
+    def bulk(i):
+        upload = pd.DataFrame({'area': 'City', 'role': 'Sanitary Worker', 'phone': '03001234567'}, index=range(bulk_rows))
+        place = city.iloc[rng.integers(len(city), size=bulk_rows)].reset_index(drop=True)
+        upload[['pp_sz', 'zone', 'cc_uc']] = place[['pp_sz', 'zone', 'cc_uc']]
+        upload['name'] = [f'Bulk {i}-{n}' for n in range(bulk_rows)]
+        upload['cnic'] = (4310100000000 + i * bulk_rows + np.arange(bulk_rows)).astype(str)
+        buf = io.BytesIO(upload.reindex(columns=erp.MASTER_COLUMNS, fill_value='').to_csv(index=False).encode())
+        buf.name = 'bench.csv'
+        return erp.perform_bulk_upload(buf, 'admin')[0]
+    measure(results, 'perform_bulk_upload', bulk, max(1, repeat // 5), rows=bulk_rows)
+
+    # Bulk transfer / removal of bulk_rows people - City workers, so any City CC/UC has a supervisor
+    bulk_repeat = max(1, repeat // 5)
+    current = erp.get_current_records()
+    movers = current[(current['status'] == 'active') & (current['role'] != 'Supervisor') & (current['area'] == 'City')]
+    batches = np.array_split(movers['person_id'].to_numpy()[rng.permutation(len(movers))][:2 * bulk_repeat * bulk_rows], 2 * bulk_repeat)
+    def bulk_transfer(i):
+        place = city.iloc[rng.integers(len(city))]
+        return erp.perform_bulk_transfer(list(batches[i]), place[['area', 'pp_sz', 'zone', 'cc_uc']].to_dict(), 'admin', 'benchmark')[0]
+    measure(results, 'perform_bulk_transfer', bulk_transfer, bulk_repeat, rows=bulk_rows)
+    measure(results, 'perform_bulk_status', lambda i: erp.perform_bulk_status(list(batches[bulk_repeat + i]), 'removed', 'admin', 'benchmark')[0],
+            bulk_repeat, rows=bulk_rows)
+
+    # Archival - afterwards the hot file only holds current records
+    measure(results, 'archive_master', lambda i: erp.archive_master(), rows=len(master))
+    measure(results, 'hot_load_after_archive', lambda i: erp.load_cached_df(erp.MASTER_CSV), rows=len(master))
+    measure(results, 'full_history_load', lambda i: erp.load_master_history(), rows=len(master))
+
+    # As-of queries - the first builds the monthly snapshots, the rest replay from the nearest one
+    days = pd.date_range(master['updated_on'].min(), master['updated_on'].max(), freq='D')
+    measure(results, 'roster_snapshots_build', lambda i: erp.build_roster_snapshots(), rows=len(master))
+    measure(results, 'as_of_roster', lambda i: erp.as_of_roster(days[rng.integers(len(days))]), repeat, rows=len(master))
+
+    for result in results:
+        result['size'] = records
+    return results
+
+def _git(*args) -> str:
+    try:
+        return subprocess.run(['git', *args], cwd=REPO_DIR, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ''
+
+def run_worker(records: int, args) -> List[Dict]:
+    """Run one size in a child interpreter against a scratch data directory"""
+    data_dir = tempfile.mkdtemp(prefix='erp-bench-')
+    # Sync held off for the whole run - steady benchmark writes would otherwise hit the max delay and push mid-measurement
+    env = dict(os.environ, ERP_DATA_DIR=data_dir, ERP_STORAGE_BACKEND=args.backend, ERP_PERF_LOG='',
+               ERP_GIT_SYNC_DEBOUNCE='3600', ERP_GIT_SYNC_MAX_DELAY='3600', PYTHONPATH=REPO_DIR + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    try:
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', str(records), '--seed', str(args.seed),
+                               '--repeat', str(args.repeat), '--bulk-rows', str(args.bulk_rows)],
+                              env=env, stdout=subprocess.PIPE, text=True)
+        if proc.returncode != 0:
+            raise SystemExit(f"benchmark for {records} records failed (exit {proc.returncode})")
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+def measure_import(args, repeat: int = 5) -> List[Dict]:
+    """Cold `import erp_data` in fresh interpreters - also checks that importing creates no files"""
+    data_dir = tempfile.mkdtemp(prefix='erp-bench-')
+    env = dict(os.environ, ERP_DATA_DIR=data_dir, PYTHONPATH=REPO_DIR + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    code = ('import sys, time; t0 = time.perf_counter(); import erp_data; t = time.perf_counter() - t0; '
+            "print(t, ','.join(m for m in ('streamlit', 'bcrypt', 'openpyxl') if m in sys.modules))")
+    try:
+        seconds, heavy = [], set()
+        for _ in range(repeat):
+            out = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True).stdout.split()
+            seconds.append(float(out[0]))
+            heavy.update(out[1].split(',') if len(out) > 1 else [])
+        result = _summary('import_erp_data_cold', seconds)
+        result.update(size=0, files_created=sorted(os.listdir(data_dir)), heavy_modules=sorted(heavy))
+        if result['files_created'] or heavy:
+            print(f"  import side effects: files {result['files_created']}, modules {sorted(heavy)}", file=sys.stderr)
+        return [result]
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+def compare(results: List[Dict], baseline_path: str):
+    """Median ratio per (size, op) against an earlier results file - above 1 means slower now"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {(r['size'], r['op']): r for r in json.load(f)['results']}
+    print(f"{'size':>9}  {'operation':<22} {'before ms':>11} {'now ms':>11} {'ratio':>7}")
+    for result in results:
+        before = baseline.get((result['size'], result['op']))
+        if before and before['median_ms']:
+            print(f"{result['size']:>9}  {result['op']:<22} {before['median_ms']:>11.2f} {result['median_ms']:>11.2f} "
+                  f"{result['median_ms'] / before['median_ms']:>7.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10k,100k,1M', help='master rows per run, e.g. 10k,100k,1M')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=20, help='calls per timed operation (bulk upload runs repeat/5)')
+    parser.add_argument('--bulk-rows', type=int, default=1000)
+    parser.add_argument('--backend', default=os.environ.get('ERP_STORAGE_BACKEND', 'csv'), choices=['csv', 'sqlite'])
+    parser.add_argument('--output', help='write results JSON here instead of stdout')
+    parser.add_argument('--compare', help='earlier results JSON to compare medians against')
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        print(json.dumps(run_size(args.worker, args.seed, args.repeat, args.bulk_rows)))
+        return
+
+    results = measure_import(args)
+    for size in (parse_size(s) for s in args.sizes.split(',')):
+        print(f"{size} records ({args.backend})", file=sys.stderr)
+        results += run_worker(size, args)
+    report = {
+        'meta': {'commit': _git('rev-parse', 'HEAD'), 'dirty': bool(_git('status', '--porcelain', '--untracked-files=no')),
+                 'date': datetime.datetime.now().isoformat(timespec='seconds'), 'backend': args.backend, 'seed': args.seed,
+                 'repeat': args.repeat, 'bulk_rows': args.bulk_rows, 'python': platform.python_version(),
+                 'pandas': pd.__version__, 'numpy': np.__version__, 'machine': platform.platform()},
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=1)
+    elif not args.compare:
+        print(json.dumps(report, indent=1))
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,2934 @@
+"""Data layer for the ERP app - storage, caches, validation and mutations, no Streamlit"""
+import os
+import subprocess
+from typing import Optional, Dict, List, Tuple, Iterator, BinaryIO
+import datetime
+import time
+import uuid
+import io
+import tempfile
+import threading
+import queue
+import atexit
+import functools
+import types
+import collections
+import contextlib
+from concurrent.futures import Future, wait
+import sqlite3
+import json
+import csv
+import re
+from array import array
+
+# Now import the packages - bcrypt and openpyxl are imported where they are used
+import pandas as pd
+import numpy as np
+import yaml
+
+# Setup paths - GitHub repository ke andar hi files store hongi
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Data files can live elsewhere (benchmarks, scratch copies) - ERP_DATA_DIR, default next to this file
+DATA_DIR = os.path.abspath(os.environ.get('ERP_DATA_DIR', SCRIPT_DIR))
+MASTER_CSV = os.path.join(DATA_DIR, 'master.csv')
+HISTORY_CSV = os.path.join(DATA_DIR, 'history.csv')
+ARCHIVE_DIR = os.path.join(DATA_DIR, 'archive')  # cold master partitions, one CSV per month
+SNAPSHOT_DIR = os.path.join(DATA_DIR, 'snapshots')  # roster snapshots for as-of queries, built in the background
+CREDENTIALS_YAML = os.path.join(DATA_DIR, 'credentials.yaml')
+# Generated by ensure_bootstrap like the data files - never written into the checkout unless the data lives there
+SAMPLE_MASTER = os.path.join(DATA_DIR, 'sample_master.csv')
+MASTER_TEMPLATE = os.path.join(DATA_DIR, 'master_template.csv')
+HISTORY_TEMPLATE = os.path.join(DATA_DIR, 'history_template.csv')
+
+# Process-wide singletons - one instance per process, shared by every session
+_singletons = {}
+_singletons_lock = threading.RLock()
+
+def _singleton(factory):
+    """Build on first call, hand back the same object afterwards - .clear() drops it"""
+    @functools.wraps(factory)
+    def get():
+        try:
+            return _singletons[factory]
+        except KeyError:
+            pass
+        # RLock - factories call other factories (the git worker needs the store)
+        with _singletons_lock:
+            if factory not in _singletons:
+                _singletons[factory] = factory()
+            return _singletons[factory]
+    get.clear = lambda: _singletons.pop(factory, None)
+    return get
+
+# Timings - hot paths record duration, rows and bytes per operation, the Admin Panel shows p50/p95
+PERF_WINDOW = int(os.environ.get('ERP_PERF_WINDOW', '1000'))
+PERF_LOG = os.environ.get('ERP_PERF_LOG', '')
+
+class PerfRecorder:
+    """Last `window` samples per operation in memory, optionally also appended to a JSON-lines file"""
+
+    def __init__(self, window: int = PERF_WINDOW, log_path: str = PERF_LOG):
+        self.window = window
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self._samples = {}  # op -> deque of (seconds, rows, bytes)
+        self._calls = {}  # op -> calls since start, older samples included
+        self._log = None
+        self.last_error = ''  # why logging to log_path stopped - shown in the Admin Panel
+
+    def record(self, op: str, seconds: float, rows: Optional[int] = None, nbytes: Optional[int] = None):
+        with self._lock:
+            samples = self._samples.get(op)
+            if samples is None:
+                samples = self._samples[op] = collections.deque(maxlen=self.window)
+            samples.append((seconds, rows, nbytes))
+            self._calls[op] = self._calls.get(op, 0) + 1
+            if self.log_path:
+                try:
+                    if self._log is None:
+                        # Line buffered - each sample reaches the file as one complete line
+                        self._log = open(self.log_path, 'a', encoding='utf-8', buffering=1)
+                    self._log.write(json.dumps({'ts': datetime.datetime.now().isoformat(timespec='milliseconds'), 'op': op,
+                                                'ms': round(seconds * 1000, 3), 'rows': rows, 'bytes': nbytes}) + '\n')
+                except OSError as e:
+                    self.last_error = f"Perf log {self.log_path}: {e}"
+                    self.log_path = ''
+
+    def summary(self) -> pd.DataFrame:
+        """One row per operation - percentiles over the rolling window, rows/bytes averaged where known"""
+        with self._lock:
+            snapshot = {op: (list(samples), self._calls[op]) for op, samples in self._samples.items()}
+        records = []
+        for op, (samples, calls) in sorted(snapshot.items()):
+            ms = np.array([sample[0] for sample in samples]) * 1000
+            rows = [sample[1] for sample in samples if sample[1] is not None]
+            nbytes = [sample[2] for sample in samples if sample[2] is not None]
+            records.append({'operation': op, 'calls': calls, 'p50_ms': np.percentile(ms, 50), 'p95_ms': np.percentile(ms, 95),
+                            'max_ms': ms.max(), 'avg_rows': np.mean(rows) if rows else None,
+                            'avg_bytes': np.mean(nbytes) if nbytes else None})
+        return pd.DataFrame(records, columns=['operation', 'calls', 'p50_ms', 'p95_ms', 'max_ms', 'avg_rows', 'avg_bytes'])
+
+    def histogram(self, op: str, bins: int = 20) -> pd.DataFrame:
+        """Duration histogram of the window for one operation - bucket upper edge (ms) -> samples"""
+        with self._lock:
+            ms = np.array([sample[0] for sample in self._samples.get(op, ())]) * 1000
+        if not len(ms):
+            return pd.DataFrame({'samples': []})
+        counts, edges = np.histogram(ms, bins=bins)
+        return pd.DataFrame({'samples': counts}, index=pd.Index(np.round(edges[1:], 3), name='ms'))
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._calls.clear()
+
+@_singleton
+def get_perf_recorder() -> PerfRecorder:
+    return PerfRecorder()
+
+@contextlib.contextmanager
+def timed(op: str, rows: Optional[int] = None, nbytes: Optional[int] = None):
+    """Time the block as `op` - set span['rows'] / span['bytes'] inside it once they are known"""
+    span = {'rows': rows, 'bytes': nbytes}
+    t0 = time.perf_counter()
+    try:
+        yield span
+    finally:
+        get_perf_recorder().record(op, time.perf_counter() - t0, span['rows'], span['bytes'])
+
+# Data sync function - GitHub mein automatically commit karega
+GIT_SYNC_DEBOUNCE = float(os.environ.get('ERP_GIT_SYNC_DEBOUNCE', '5'))
+GIT_SYNC_MAX_DELAY = float(os.environ.get('ERP_GIT_SYNC_MAX_DELAY', '60'))  # longest a change waits for its push under steady writes
+DATA_FILES = ['master.csv', 'history.csv', 'archive']
+
+def sync_data_to_github(repo_dir: str = DATA_DIR, paths: Optional[List[str]] = None) -> Tuple[str, bool]:
+    """Auto-commit data changes to GitHub - returns (error message, empty on success; whether a commit was made)"""
+    try:
+        # Git commands to auto-commit data changes
+        with timed('git_add'):
+            # One path at a time - a path that does not exist yet must not stop the others
+            for path in paths or DATA_FILES:
+                if os.path.exists(os.path.join(repo_dir, path)):
+                    subprocess.run(['git', 'add', '-A', '--', path], cwd=repo_dir, capture_output=True)
+        with timed('git_commit'):
+            # Nothing staged is no error - earlier commits may still be waiting for their push
+            committed = subprocess.run(['git', 'diff', '--cached', '--quiet'], cwd=repo_dir, capture_output=True).returncode != 0
+            if committed:
+                commit = subprocess.run(['git', 'commit', '-m', f'Auto-update data {datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}'], 
+                                        cwd=repo_dir, capture_output=True, text=True)
+                if commit.returncode != 0:
+                    return (commit.stderr.strip() or commit.stdout.strip() or f"git commit exited with {commit.returncode}"), False
+        with timed('git_push'):
+            push = subprocess.run(['git', 'push'], cwd=repo_dir, capture_output=True, text=True)
+        if push.returncode != 0:
+            return (push.stderr.strip() or f"git push exited with {push.returncode}"), committed
+        return "", committed
+    except Exception as e:
+        return str(e), False
+
+class GitSyncWorker:
+    """Background thread that pushes data changes - a burst of writes becomes one commit"""
+
+    def __init__(self, repo_dir: str = DATA_DIR, paths: Optional[List[str]] = None, debounce: float = GIT_SYNC_DEBOUNCE,
+                 prepare=None, max_delay: float = GIT_SYNC_MAX_DELAY):
+        self.repo_dir = repo_dir
+        self.paths = paths or DATA_FILES
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.prepare = prepare
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.last_push = None
+        self.last_error = ''
+        self.commits = 0
+        self._thread = threading.Thread(target=self._run, name='git-sync', daemon=True)
+        self._thread.start()
+
+    def request(self, file_path: str = ''):
+        """Note a data change - returns immediately, the push happens in the background"""
+        with self._lock:
+            self._pending += 1
+        self._queue.put(('change', file_path))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Push everything pending right now and wait for it"""
+        done = threading.Event()
+        self._queue.put(('flush', done))
+        return done.wait(timeout)
+
+    def stop(self, timeout: Optional[float] = 30):
+        if self._thread.is_alive():
+            self._queue.put(('stop', None))
+            self._thread.join(timeout)
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {
+                'pending_changes': self._pending,
+                'last_push': self.last_push,
+                'last_error': self.last_error,
+                'commits': self.commits,
+                'running': self._thread.is_alive(),
+            }
+
+    def _run(self):
+        while True:
+            kind, arg = self._queue.get()
+            waiters = []
+            # Keep collecting until no new change arrives for one debounce interval,
+            # or max_delay after the first change - steady writes must not postpone the push forever
+            deadline = time.monotonic() + self.max_delay
+            while kind == 'change':
+                wait = min(self.debounce, deadline - time.monotonic())
+                if wait <= 0:
+                    break
+                try:
+                    kind, arg = self._queue.get(timeout=wait)
+                except queue.Empty:
+                    break
+            if kind == 'flush':
+                waiters.append(arg)
+            self._sync()
+            for done in waiters:
+                done.set()
+            if kind == 'stop':
+                return
+
+    def _sync(self):
+        with self._lock:
+            batch = self._pending
+        if not batch:
+            return
+        try:
+            if self.prepare:
+                self.prepare()
+            error, committed = sync_data_to_github(self.repo_dir, self.paths)
+        except Exception as e:
+            error, committed = str(e), False
+        with self._lock:
+            self._pending -= batch
+            if committed:
+                self.commits += 1
+            if error:
+                # Changes stay on disk and go out with the next successful push
+                self.last_error = error
+            else:
+                self.last_push = datetime.datetime.now()
+                self.last_error = ''
+
+@_singleton
+def get_git_sync_worker() -> GitSyncWorker:
+    """One sync worker per process, shared by all sessions, flushed at shutdown"""
+    store = get_store()
+    worker = GitSyncWorker(paths=store.sync_paths(), prepare=store.checkpoint)
+    atexit.register(_final_sync, worker)
+    return worker
+
+def _final_sync(worker: GitSyncWorker):
+    """At exit - the writer stops first, so rows it flushes on the way out are in the last push.
+    atexit runs handlers newest first, and the writer is usually started before this worker"""
+    writer = _singletons.get(get_write_queue.__wrapped__)
+    if writer is not None:
+        writer.stop()
+    worker.stop()
+
+# Create files if they don't exist - FIXED DOUBLE HEADER
+def create_file_if_not_exists(file_path: str, content: str):
+    if not os.path.exists(file_path):
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+# Master CSV header (SINGLE HEADER)
+MASTER_HEADER = 'person_id,record_id,area,pp_sz,zone,cc_uc,role,name,cnic,phone,vehicle_id,vehicle_reg_no,supervisor_id,status,updated_on,status_changed_on,last_transfer_on,remarks\n'
+
+# History CSV header (SINGLE HEADER)  
+HISTORY_HEADER = 'log_id,person_id,record_id,action,field,old_value,new_value,by_user,timestamp,notes\n'
+
+MASTER_COLUMNS = MASTER_HEADER.strip().split(',')
+HISTORY_COLUMNS = HISTORY_HEADER.strip().split(',')
+
+# Sample rows for sample_master.csv - FIXED DOUBLE HEADER
+SAMPLE_CONTENT = """P001,W001,City,PP-110,Zone-01,CC-001,Sanitary Worker,Bilal Ahmed,3520212345671,03001234567,,,W010,active,2025-11-01 00:00:00,,,
+P002,W002,City,PP-110,Zone-01,CC-001,Driver,Kamran Ali,3520298765439,03007654321,V-005,LEB1234,W010,active,2025-10-15 00:00:00,,,
+P002,W003,City,PP-111,Zone-02,CC-005,Driver,Kamran Ali,3520298765439,03007654321,V-005,LEB1234,W020,active,2025-11-04 00:00:00,,,Transferred from CC-001
+P003,W004,Sadar,SZ-06,Z-09,UC-140,Supervisor,Imran Khan,3520176543219,03001112222,,,,active,2025-11-05 00:00:00,,,
+P004,W005,City,PP-110,Zone-01,CC-001,Cleaner,Ahmed Khan,3520212345672,03001234568,,,W010,active,2025-11-06 00:00:00,,,
+P005,W006,Sadar,SZ-01,Z-01,UC-131,Driver,Ali Raza,3520298765440,03007654322,V-001,LEA1234,W011,active,2025-11-07 00:00:00,,,
+"""
+
+@_singleton
+def ensure_bootstrap():
+    """Create missing data files, templates and default credentials - runs once per process"""
+    # Create files if not exists - WITH SINGLE HEADER
+    create_file_if_not_exists(MASTER_CSV, MASTER_HEADER)
+    create_file_if_not_exists(HISTORY_CSV, HISTORY_HEADER)
+
+    # Create credentials.yaml if not exists
+    if not os.path.exists(CREDENTIALS_YAML):
+        import bcrypt  # only needed here and at login
+        default_creds = {
+            'users': {
+                'admin': {'password': bcrypt.hashpw('adminpass'.encode(), bcrypt.gensalt()).decode(), 'role': 'admin'},
+                'user': {'password': bcrypt.hashpw('userpass'.encode(), bcrypt.gensalt()).decode(), 'role': 'user'},
+                'arslan': {'password': bcrypt.hashpw('ArslanPass123'.encode(), bcrypt.gensalt()).decode(), 'role': 'admin'},
+                'ali': {'password': bcrypt.hashpw('AliPass456'.encode(), bcrypt.gensalt()).decode(), 'role': 'admin'},
+                'babar': {'password': bcrypt.hashpw('BabarPass789'.encode(), bcrypt.gensalt()).decode(), 'role': 'admin'}
+            }
+        }
+        with open(CREDENTIALS_YAML, 'w') as f:
+            yaml.dump(default_creds, f)
+
+    # SINGLE HEADER - sirf data content
+    create_file_if_not_exists(SAMPLE_MASTER, MASTER_HEADER + SAMPLE_CONTENT)
+
+    # Create templates - SINGLE HEADER
+    create_file_if_not_exists(MASTER_TEMPLATE, MASTER_HEADER)
+    create_file_if_not_exists(HISTORY_TEMPLATE, HISTORY_HEADER)
+
+# Administrative hierarchy - PP/SZ -> Zone -> CC/UC per area, from hierarchy.yaml
+HIERARCHY_YAML = os.path.join(SCRIPT_DIR, 'hierarchy.yaml')
+
+class Hierarchy:
+    """Frozen hierarchy index - option lists and reverse maps are built once at load"""
+
+    def __init__(self, data: Dict):
+        pp_sz, zones, cc_uc, placement = {}, {}, {}, {}
+        city = data.get('City') or {}
+        pp_sz['City'] = tuple(sorted(city))
+        for pp, zone_map in city.items():
+            zones[('City', pp)] = tuple(zone_map)
+            for zone, ccs in zone_map.items():
+                cc_uc[('City', pp, zone)] = tuple(ccs)
+                for cc in ccs:
+                    placement[cc] = ('City', pp, zone)
+            cc_uc[('City', pp, None)] = tuple(sorted({cc for ccs in zone_map.values() for cc in ccs}))
+        # Sadar zones and UCs are not tied to one SZ - any combination is valid
+        sadar = data.get('Sadar') or {}
+        pp_sz['Sadar'] = tuple(sadar.get('pp_sz', []))
+        zones[('Sadar', None)] = tuple(sadar.get('zones', []))
+        cc_uc[('Sadar', None, None)] = tuple(sadar.get('cc_uc', []))
+        for cc in cc_uc[('Sadar', None, None)]:
+            placement[cc] = ('Sadar', None, None)
+        self._pp_sz = types.MappingProxyType(pp_sz)
+        self._zones = types.MappingProxyType(zones)
+        self._cc_uc = types.MappingProxyType(cc_uc)
+        self._placement = types.MappingProxyType(placement)
+        # Reverse maps for whole-column checks - cc_uc -> area / pp_sz / zone
+        self._area_of = {cc: place[0] for cc, place in placement.items()}
+        self._pp_sz_of = {cc: place[1] for cc, place in placement.items() if place[0] == 'City'}
+        self._zone_of = {cc: place[2] for cc, place in placement.items() if place[0] == 'City'}
+
+    def pp_sz_options(self, area: str) -> Tuple[str, ...]:
+        return self._pp_sz.get(area, ())
+
+    def zone_options(self, area: str, pp_sz: Optional[str] = None) -> Tuple[str, ...]:
+        return self._zones.get((area, pp_sz if area == 'City' else None), ())
+
+    def cc_uc_options(self, area: str, pp_sz: Optional[str] = None, zone: Optional[str] = None) -> Tuple[str, ...]:
+        """CC/UCs of a zone, of a whole PP/SZ when zone is None, or of all Sadar"""
+        if area != 'City':
+            return self._cc_uc.get((area, None, None), ())
+        return self._cc_uc.get(('City', pp_sz, zone), ())
+
+    def placement(self, cc_uc: str) -> Optional[Tuple]:
+        """(area, pp_sz, zone) a CC/UC belongs to - pp_sz and zone are None for Sadar"""
+        return self._placement.get(cc_uc)
+
+    def unknown_cc_uc(self, df: pd.DataFrame) -> pd.Series:
+        """Rows whose cc_uc is not a CC/UC of their area"""
+        return df['cc_uc'].map(self._area_of) != df['area']
+
+    def misplaced(self, df: pd.DataFrame) -> pd.Series:
+        """Rows filed under a PP/SZ or Zone their cc_uc does not belong to - empty pp_sz / zone are not checked"""
+        city = (df['area'] == 'City') & ~self.unknown_cc_uc(df)
+        sadar = df['area'] == 'Sadar'
+        has_pp_sz = df['pp_sz'] != ''
+        has_zone = df['zone'] != ''
+        bad = city & has_pp_sz & (df['cc_uc'].map(self._pp_sz_of) != df['pp_sz'])
+        bad |= city & has_zone & (df['cc_uc'].map(self._zone_of) != df['zone'])
+        bad |= sadar & has_pp_sz & ~df['pp_sz'].isin(self.pp_sz_options('Sadar'))
+        bad |= sadar & has_zone & ~df['zone'].isin(self.zone_options('Sadar'))
+        return bad
+
+    def city_data(self) -> Dict:
+        """The old city_data layout - {pp_sz: {'zones': [...], 'zone_to_cc': {zone: [...]}}}"""
+        return {pp: {'zones': list(self.zone_options('City', pp)),
+                     'zone_to_cc': {zone: list(self.cc_uc_options('City', pp, zone)) for zone in self.zone_options('City', pp)}}
+                for pp in self._pp_sz['City']}
+
+def load_hierarchy(file_path: str = HIERARCHY_YAML) -> Hierarchy:
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return Hierarchy(yaml.safe_load(f) or {})
+
+@_singleton
+def get_hierarchy() -> Hierarchy:
+    """The hierarchy index, loaded on first use"""
+    return load_hierarchy()
+
+def __getattr__(name: str):
+    # HIERARCHY / city_data used to be built at import - still reachable, but loaded on first access
+    if name == 'HIERARCHY':
+        return get_hierarchy()
+    if name == 'city_data':
+        # City data for dynamic selections
+        return get_hierarchy().city_data()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Storage backend - 'csv' (default) or 'sqlite'
+STORAGE_BACKEND = os.environ.get('ERP_STORAGE_BACKEND', 'csv').strip().lower()
+SQLITE_DB = os.environ.get('ERP_SQLITE_DB', os.path.join(DATA_DIR, 'erp.db'))
+
+# Helper functions
+def _complete_tail(f, start: int, size: int) -> bool:
+    """Whether the bytes after the last newline are a whole row - a hand-edited or Excel-saved file
+    often has no newline after its last row, a torn write leaves a row cut short"""
+    f.seek(start)
+    try:
+        tail = f.read(size - start).decode('utf-8')
+    except UnicodeDecodeError:
+        return False  # cut inside a character
+    if tail.count('"') % 2:
+        return False  # cut inside a quoted value
+    if start == 0:
+        return True  # a header with no rows
+    f.seek(0)
+    header = f.readline().decode('utf-8', errors='replace')
+    return len(next(csv.reader([tail]))) == len(next(csv.reader([header])))
+
+ROW_SCAN_BYTES = 1 << 20
+_row_ends = {}  # (st_dev, st_ino) -> (size, row end) found by the last scan - later scans start from that row end
+
+def _row_end(f, start: int, size: int) -> int:
+    """Offset after the last newline in [start, size) that is outside quotes - start must be a row boundary"""
+    end = start
+    quotes = 0  # quotes since start, so a newline ends a row when the count before it is even
+    pos = start
+    f.seek(start)
+    while pos < size:
+        chunk = f.read(min(ROW_SCAN_BYTES, size - pos))
+        if not chunk:
+            break
+        total = quotes + chunk.count(b'"')
+        # Usually the chunk's last newline - walk back while it sits inside a quoted value
+        after = 0
+        i = len(chunk)
+        while True:
+            nl = chunk.rfind(b'\n', 0, i)
+            if nl == -1:
+                break
+            after += chunk.count(b'"', nl, i)
+            if (total - after) % 2 == 0:
+                end = pos + nl + 1
+                break
+            i = nl
+        quotes = total
+        pos += len(chunk)
+    return end
+
+def _valid_length(f) -> int:
+    """Byte length up to the last complete row - a newline inside a quoted value ends no row, and bytes after
+    the last row end count only if they are a whole row. Only bytes added since the previous call are scanned"""
+    info = os.fstat(f.fileno())
+    size, key = info.st_size, (info.st_dev, info.st_ino)
+    known_size, start = _row_ends.get(key, (0, 0))
+    if known_size > size:
+        start = 0  # truncated in place
+    elif start:
+        f.seek(start - 1)
+        if f.read(1) != b'\n':
+            start = 0  # rewritten in place
+    end = _row_end(f, start, size)
+    _row_ends[key] = (size, end)
+    if end < size and _complete_tail(f, end, size):
+        return size
+    return end
+
+def load_csv(file_path: str) -> pd.DataFrame:
+    if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+        source = file_path
+        with open(file_path, 'rb') as f:
+            valid = _valid_length(f)
+            if valid == 0:
+                return pd.DataFrame()
+            if valid < os.path.getsize(file_path):
+                # Torn tail from an interrupted append - ignore the partial row
+                f.seek(0)
+                source = io.BytesIO(f.read(valid))
+        df = pd.read_csv(source, dtype=str, keep_default_na=False)
+        # Double header check - agar header row duplicate hai to remove karein
+        if not df.empty and 'person_id' in df.columns and df['person_id'].str.contains('person_id').any():
+            # Remove header rows
+            df = df[~df['person_id'].str.contains('person_id', na=False)]
+        return df
+    else:
+        return pd.DataFrame()
+
+def append_csv(file_path: str, rows: pd.DataFrame):
+    """Append rows at the end of a CSV file - fsynced, a torn tail from an earlier crash is cut off first
+    and a last row with no newline after it is ended before the new rows"""
+    columns = list(rows.columns)
+    payload = rows.to_csv(index=False, header=False, lineterminator='\n').encode('utf-8')
+    created = not os.path.exists(file_path)
+    with timed('store_append', len(rows), len(payload)), open(file_path, 'wb' if created else 'r+b') as f:
+        size = f.seek(0, os.SEEK_END)
+        valid = _valid_length(f)
+        if valid < size:
+            # Drop a torn row left by a crash before appending after it
+            f.truncate(valid)
+        f.seek(valid)
+        if valid == 0:
+            f.write((','.join(columns) + '\n').encode('utf-8'))
+        else:
+            f.seek(valid - 1)
+            if f.read(1) != b'\n':
+                f.write(b'\n')
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    if created:
+        _fsync_dir(os.path.dirname(file_path))
+
+def _default_columns(file_path: str) -> List[str]:
+    return MASTER_COLUMNS if file_path == MASTER_CSV else HISTORY_COLUMNS
+
+def _file_columns(file_path: str) -> List[str]:
+    """Column order of a data file - its own header if it has one, else the default for that file"""
+    if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            header = f.readline()
+        if header.endswith('\n'):
+            return header.strip().split(',')
+    return _default_columns(file_path)
+
+def _fsync_dir(dir_path: str):
+    try:
+        fd = os.open(dir_path, os.O_RDONLY)
+    except OSError:
+        return  # Windows pe directories open nahi hoti
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class _FilePrefix(io.RawIOBase):
+    """First `limit` bytes of an open file - keeps a torn tail out of chunked reads"""
+
+    def __init__(self, f, limit: int):
+        self._f = f
+        self._left = limit
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        n = self._f.readinto(memoryview(buffer)[:self._left])
+        self._left -= n
+        return n
+
+def _as_stored(new_rows: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+    """Rows exactly as they will be stored - all columns as text, dates formatted like the CSV"""
+    rows = new_rows.reindex(columns=columns).reset_index(drop=True)
+    for col in columns:
+        if pd.api.types.is_datetime64_any_dtype(rows[col]):
+            rows[col] = rows[col].dt.strftime('%Y-%m-%d %H:%M:%S')
+        elif isinstance(rows[col].dtype, pd.CategoricalDtype):
+            rows[col] = rows[col].astype(object)
+    return rows.fillna('').astype(str)
+
+# Typed in-memory master - low-cardinality columns are categoricals (one small code per row, equality
+# filters compare codes) and updated_on is parsed once. Ids and free text stay arrow-backed strings.
+CATEGORY_COLUMNS = ['area', 'pp_sz', 'zone', 'cc_uc', 'role', 'status']
+ARROW_REBUILD_APPENDS = 1000  # appends before a cached frame's string columns are joined back into one chunk
+
+def _concat_typed(frames: List[pd.DataFrame], **kwargs) -> pd.DataFrame:
+    """pd.concat that keeps categorical columns categorical - plain concat falls back to text when categories differ.
+    New categories go after those of the largest categorical frame, so it keeps its codes and only the small ones are recoded"""
+    first = frames[0]
+    if all(list(frame.columns) == list(first.columns) and frame.dtypes.equals(first.dtypes) for frame in frames[1:]):
+        # Usual case - same categories everywhere, string columns gain chunks and only fixed-width columns are copied
+        return pd.concat(frames, **kwargs)
+    typed = {}
+    for frame in sorted(frames, key=len, reverse=True):
+        for col in frame.columns:
+            if col not in typed and isinstance(frame[col].dtype, pd.CategoricalDtype):
+                typed[col] = frame[col].cat.categories
+    if typed and len(frames) > 1:
+        frames = [frame.copy(deep=False) for frame in frames]
+        for col, categories in typed.items():
+            present = [frame for frame in frames if col in frame.columns]
+            for frame in present:
+                values = frame[col].cat.categories if isinstance(frame[col].dtype, pd.CategoricalDtype) else pd.Index(frame[col].dropna().unique())
+                categories = categories.append(values.difference(categories))
+            dtype = pd.CategoricalDtype(categories)
+            for frame in present:
+                if frame[col].dtype != dtype:
+                    frame[col] = frame[col].astype(dtype)
+    return pd.concat(frames, **kwargs)
+
+def _one_chunk(df: pd.DataFrame) -> pd.DataFrame:
+    """Arrow string columns rebuilt as a single chunk - every concat adds one, and string ops slow down with thousands"""
+    df = df.copy(deep=False)
+    for col in df.columns:
+        dtype = df[col].dtype
+        if isinstance(dtype, pd.StringDtype) and dtype.storage == 'pyarrow':
+            df[col] = pd.array(df[col].array.__arrow_array__().combine_chunks(), dtype=dtype)
+    return df
+
+HISTORY_FILTERS = ['person_id', 'action', 'by_user']
+NO_TIME = np.iinfo(np.int64).min
+
+def _time_bound(value) -> Optional[int]:
+    """Date / datetime as UTC nanoseconds, None stays None"""
+    return None if value is None else pd.Timestamp(value, tz='UTC').as_unit('ns').value
+
+class HistoryIndex:
+    """Byte offset of every history.csv row plus the filter columns - a page reads only its own rows"""
+    CHUNK_BYTES = 8 << 20
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.lock = threading.Lock()
+        self._identity = None
+        self._clear()
+
+    def _clear(self):
+        self._end = 0  # bytes indexed so far, always on a row boundary
+        self._last_row = b''
+        self.columns = None
+        self.starts = array('q')
+        self.lengths = array('q')
+        self.times = array('q')
+        self.codes = {col: array('q') for col in HISTORY_FILTERS}
+        self.values = {col: {} for col in HISTORY_FILTERS}  # value -> code
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def refresh(self):
+        """Index rows appended since the last call; rebuild if the file was replaced or rewritten"""
+        try:
+            info = os.stat(self.file_path)
+        except FileNotFoundError:
+            self._identity = None
+            self._clear()
+            return
+        with open(self.file_path, 'rb') as f:
+            identity = (info.st_dev, info.st_ino)
+            if identity != self._identity or info.st_size < self._end or not self._still_ends_with(f):
+                self._identity = identity
+                self._clear()
+            valid = _valid_length(f)
+            if self._end == 0:
+                f.seek(0)
+                header = f.readline()
+                if not header.endswith(b'\n'):
+                    return
+                self.columns = header.decode('utf-8').strip().split(',')
+                self._end = len(header)
+            size = self.CHUNK_BYTES
+            while self._end < valid:
+                f.seek(self._end)
+                data = f.read(min(size, valid - self._end))
+                at_end = self._end + len(data) >= valid
+                if at_end and not data.endswith(b'\n'):
+                    # Last row has no newline yet - the next append adds it
+                    consumed = min(self._index_chunk(data + b'\n', self._end), len(data))
+                else:
+                    consumed = self._index_chunk(data, self._end)
+                if consumed == 0:
+                    if at_end:
+                        break  # only an unterminated quoted row left
+                    size *= 2  # a single row bigger than the chunk
+                    continue
+                self._last_row = data[max(0, consumed - 256):consumed]
+                self._end += consumed
+                size = self.CHUNK_BYTES
+
+    def _still_ends_with(self, f) -> bool:
+        # reset_data_file truncates in place - the bytes before _end must be the ones indexed
+        if not self._last_row:
+            return True
+        f.seek(self._end - len(self._last_row))
+        return f.read(len(self._last_row)) == self._last_row
+
+    def _index_chunk(self, data: bytes, offset: int) -> int:
+        """Index the complete rows at the start of data, return how many bytes they cover"""
+        buf = np.frombuffer(data, dtype=np.uint8)
+        newlines = np.flatnonzero(buf == 10)
+        # A newline ends a row only outside quotes - even number of quotes before it
+        quotes = np.cumsum(buf == 34)
+        ends = newlines[quotes[newlines] % 2 == 0]
+        if len(ends) == 0:
+            return 0
+        consumed = int(ends[-1]) + 1
+        starts = np.concatenate(([0], ends[:-1] + 1))
+        lengths = ends + 1 - starts
+        keep = lengths > 1  # read_csv skips blank lines too
+        rows = pd.read_csv(io.BytesIO(data[:consumed]), header=None, names=self.columns,
+                           usecols=HISTORY_FILTERS + ['timestamp'], dtype=str, keep_default_na=False)
+        starts, lengths = starts[keep], lengths[keep]
+        if len(rows) != len(starts):
+            raise ValueError(f"Could not index {os.path.basename(self.file_path)} near byte {offset}")
+        real = (rows['person_id'] != 'person_id').to_numpy()  # stray header rows
+        rows = rows[real]
+        self.starts.extend((starts[real] + offset).tolist())
+        self.lengths.extend(lengths[real].tolist())
+        for col in HISTORY_FILTERS:
+            values = self.values[col]
+            codes, uniques = pd.factorize(rows[col])
+            mapping = np.array([values.setdefault(v, len(values)) for v in uniques], dtype=np.int64)
+            self.codes[col].extend(mapping[codes].tolist())
+        times = pd.to_datetime(rows['timestamp'], utc=True, format='ISO8601', errors='coerce').dt.as_unit('ns')
+        self.times.extend(times.array.asi8.tolist())
+        return consumed
+
+    def options(self) -> Dict[str, List[str]]:
+        return {col: sorted(v for v in self.values[col] if v) for col in ('action', 'by_user')}
+
+    def query(self, page: int, page_size: int, person_id: str = '', action: str = '', by_user: str = '',
+              start=None, end=None) -> Tuple[pd.DataFrame, int]:
+        """One page of matching rows, newest first, and the number of matches"""
+        mask = np.ones(len(self), dtype=bool)
+        if person_id:
+            needle = person_id.strip().upper()
+            codes = [code for value, code in self.values['person_id'].items() if needle in value.upper()]
+            mask &= np.isin(np.frombuffer(self.codes['person_id'], dtype=np.int64), codes)
+        for col, value in (('action', action), ('by_user', by_user)):
+            if value:
+                code = self.values[col].get(value, -1)
+                mask &= np.frombuffer(self.codes[col], dtype=np.int64) == code
+        times = np.frombuffer(self.times, dtype=np.int64)
+        if start is not None:
+            mask &= (times != NO_TIME) & (times >= _time_bound(start))
+        if end is not None:
+            mask &= (times != NO_TIME) & (times < _time_bound(end))
+        positions = np.flatnonzero(mask)[::-1]
+        selected = positions[page * page_size:(page + 1) * page_size]
+        if len(selected) == 0:
+            return pd.DataFrame(columns=self.columns or HISTORY_COLUMNS, dtype=str), len(positions)
+        parts = []
+        with open(self.file_path, 'rb') as f:
+            for pos in selected:
+                f.seek(self.starts[pos])
+                parts.append(f.read(self.lengths[pos]))
+        df = pd.read_csv(io.BytesIO(b''.join(parts)), header=None, names=self.columns, dtype=str, keep_default_na=False)
+        return df, len(positions)
+
+class CsvStore:
+    """master.csv / history.csv - appends go to the end of the file, compaction rewrites it"""
+    name = 'csv'
+
+    def __init__(self):
+        self._history_index = None
+
+    def _history(self) -> HistoryIndex:
+        if self._history_index is None:
+            self._history_index = HistoryIndex(HISTORY_CSV)
+        return self._history_index
+
+    def query_history(self, page: int = 0, page_size: int = 50, **filters) -> Tuple[pd.DataFrame, int]:
+        index = self._history()
+        with index.lock:
+            index.refresh()
+            return index.query(page, page_size, **filters)
+
+    def history_options(self) -> Dict[str, List[str]]:
+        index = self._history()
+        with index.lock:
+            index.refresh()
+            return index.options()
+
+    def columns(self, file_path: str) -> List[str]:
+        return _file_columns(file_path)
+
+    def signature(self, file_path: str) -> Optional[Tuple]:
+        try:
+            info = os.stat(file_path)
+        except FileNotFoundError:
+            return None
+        return (info.st_dev, info.st_ino, info.st_mtime_ns, info.st_size)
+
+    def generation(self, file_path: str) -> Optional[Tuple]:
+        """Changes when the file is swapped for another (replace, compaction, import) but not on appends"""
+        try:
+            info = os.stat(file_path)
+        except FileNotFoundError:
+            return None
+        return (info.st_dev, info.st_ino)
+
+    def load(self, file_path: str) -> pd.DataFrame:
+        with timed('load_df') as span:
+            df = load_csv(file_path)
+            span['rows'] = len(df)
+            span['bytes'] = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+        return df
+
+    def tail(self, file_path: str, max_bytes: int = 65536) -> pd.DataFrame:
+        """Last rows of the file, reading at most max_bytes from its end"""
+        columns = _file_columns(file_path)
+        if not os.path.exists(file_path):
+            return pd.DataFrame(columns=columns, dtype=str)
+        with open(file_path, 'rb') as f:
+            valid = _valid_length(f)
+            start = max(0, valid - max_bytes)
+            f.seek(start)
+            data = f.read(valid - start)
+        # Skip the header, or the partial row the window starts in
+        data = data[data.find(b'\n') + 1:]
+        try:
+            df = pd.read_csv(io.BytesIO(data), header=None, names=columns, dtype=str, keep_default_na=False)
+        except (pd.errors.ParserError, pd.errors.EmptyDataError):
+            return pd.DataFrame(columns=columns, dtype=str)
+        return df[df['person_id'] != 'person_id'] if 'person_id' in df.columns else df
+
+    def iter_chunks(self, file_path: str, chunk_size: int = 50000) -> Iterator[pd.DataFrame]:
+        """The whole file, chunk_size rows at a time"""
+        columns = _file_columns(file_path)
+        if not os.path.exists(file_path):
+            return
+        with open(file_path, 'rb') as f:
+            valid = _valid_length(f)
+            f.seek(0)
+            source = io.BufferedReader(_FilePrefix(f, valid))
+            try:
+                reader = pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=chunk_size)
+            except pd.errors.EmptyDataError:
+                return
+            with reader:
+                for chunk in reader:
+                    if 'person_id' in chunk.columns:
+                        chunk = chunk[chunk['person_id'] != 'person_id']
+                    yield chunk.reindex(columns=columns, fill_value='')
+
+    def append(self, file_path: str, rows: pd.DataFrame):
+        append_csv(file_path, rows)
+
+    def compact(self, file_path: str) -> int:
+        """Rewrite the file without torn rows or stray headers (temp file, fsync, rename)"""
+        return self.replace(file_path, load_csv(file_path))
+
+    def replace(self, file_path: str, df: pd.DataFrame) -> int:
+        """Swap the whole file for these rows in one step (temp file, fsync, rename)"""
+        df = df.reindex(columns=_file_columns(file_path), fill_value='')
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+                df.to_csv(f, index=False, lineterminator='\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        _fsync_dir(os.path.dirname(file_path))
+        return len(df)
+
+    def reset(self, file_path: str):
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(','.join(_default_columns(file_path)) + '\n')
+
+    def sync_paths(self) -> List[str]:
+        return DATA_FILES
+
+    def checkpoint(self):
+        pass
+
+def _quoted(columns) -> str:
+    return ', '.join(f'"{col}"' for col in columns)
+
+class SqliteStore:
+    """Same tables in one SQLite file - WAL journal, indexed lookup columns, CSV import/export"""
+    name = 'sqlite'
+    INDEXES = {
+        'master': ['person_id', 'cnic', 'cc_uc', 'record_id'],
+        'history': ['person_id', 'record_id', 'action', 'by_user', 'timestamp'],
+    }
+
+    def __init__(self, db_path: str = SQLITE_DB):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._init_schema()
+
+    @staticmethod
+    def table(file_path: str) -> str:
+        return 'master' if file_path == MASTER_CSV else 'history'
+
+    def columns(self, file_path: str) -> List[str]:
+        return _default_columns(file_path)
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections belong to the thread that opened them
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=FULL')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._conn()
+        with conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            fresh = conn.execute("SELECT value FROM meta WHERE key = 'schema'").fetchone() is None
+            for file_path in (MASTER_CSV, HISTORY_CSV):
+                table = self.table(file_path)
+                cols = ', '.join(f'"{col}" TEXT NOT NULL DEFAULT \'\'' for col in self.columns(file_path))
+                conn.execute(f'CREATE TABLE IF NOT EXISTS {table} ({cols})')
+                for col in self.INDEXES[table]:
+                    conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_{col} ON {table} ("{col}")')
+                conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES (?, '0')", (f'generation_{table}',))
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('schema', '1')")
+        if fresh:
+            # First start on SQLite - bring over whatever the CSV files already hold
+            for file_path in (MASTER_CSV, HISTORY_CSV):
+                if os.path.exists(file_path):
+                    self.import_csv(file_path)
+
+    def _bump_generation(self, conn: sqlite3.Connection, table: str):
+        conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = ?", (f'generation_{table}',))
+
+    def signature(self, file_path: str) -> Optional[Tuple]:
+        table = self.table(file_path)
+        conn = self._conn()
+        max_rowid = conn.execute(f'SELECT MAX(rowid) FROM {table}').fetchone()[0]
+        generation = conn.execute("SELECT value FROM meta WHERE key = ?", (f'generation_{table}',)).fetchone()[0]
+        return (self.db_path, table, generation, max_rowid)
+
+    def generation(self, file_path: str) -> Tuple:
+        """Changes when the table is replaced or reset but not on appends"""
+        table = self.table(file_path)
+        value = self._conn().execute("SELECT value FROM meta WHERE key = ?", (f'generation_{table}',)).fetchone()[0]
+        return (self.db_path, table, value)
+
+    def load(self, file_path: str) -> pd.DataFrame:
+        columns = self.columns(file_path)
+        with timed('load_df') as span:
+            df = pd.read_sql_query(f'SELECT {_quoted(columns)} FROM {self.table(file_path)} ORDER BY rowid', self._conn())
+            span['rows'] = len(df)
+        return df.astype(str) if not df.empty else pd.DataFrame(columns=columns, dtype=str)
+
+    def tail(self, file_path: str, rows: int = 1000) -> pd.DataFrame:
+        columns = self.columns(file_path)
+        query = f'SELECT {_quoted(columns)} FROM {self.table(file_path)} ORDER BY rowid DESC LIMIT ?'
+        df = pd.read_sql_query(query, self._conn(), params=(rows,))
+        return df.iloc[::-1].astype(str) if not df.empty else pd.DataFrame(columns=columns, dtype=str)
+
+    def query_history(self, page: int = 0, page_size: int = 50, person_id: str = '', action: str = '',
+                      by_user: str = '', start=None, end=None) -> Tuple[pd.DataFrame, int]:
+        where, params = [], []
+        if person_id:
+            where.append('person_id LIKE ?')
+            params.append(f'%{person_id.strip()}%')
+        for col, value in (('action', action), ('by_user', by_user)):
+            if value:
+                where.append(f'"{col}" = ?')
+                params.append(value)
+        # Timestamps are ISO strings, so text comparison orders them
+        if start is not None:
+            where.append('timestamp >= ?')
+            params.append(pd.Timestamp(start).strftime('%Y-%m-%dT%H:%M:%S'))
+        if end is not None:
+            where.append('timestamp < ?')
+            params.append(pd.Timestamp(end).strftime('%Y-%m-%dT%H:%M:%S'))
+        clause = f' WHERE {" AND ".join(where)}' if where else ''
+        conn = self._conn()
+        total = conn.execute(f'SELECT COUNT(*) FROM history{clause}', params).fetchone()[0]
+        columns = self.columns(HISTORY_CSV)
+        query = f'SELECT {_quoted(columns)} FROM history{clause} ORDER BY rowid DESC LIMIT ? OFFSET ?'
+        df = pd.read_sql_query(query, conn, params=params + [page_size, page * page_size])
+        return (df.astype(str) if not df.empty else pd.DataFrame(columns=columns, dtype=str)), total
+
+    def history_options(self) -> Dict[str, List[str]]:
+        conn = self._conn()
+        return {col: [row[0] for row in conn.execute(
+                    f'SELECT DISTINCT "{col}" FROM history WHERE "{col}" != \'\' ORDER BY "{col}"')]
+                for col in ('action', 'by_user')}
+
+    def append(self, file_path: str, rows: pd.DataFrame):
+        table = self.table(file_path)
+        columns = list(rows.columns)
+        sql = f'INSERT INTO {table} ({_quoted(columns)}) VALUES ({", ".join("?" * len(columns))})'
+        conn = self._conn()
+        with timed('store_append', len(rows)), conn:
+            conn.executemany(sql, rows.itertuples(index=False, name=None))
+
+    def compact(self, file_path: str) -> int:
+        conn = self._conn()
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        conn.execute('VACUUM')
+        return conn.execute(f'SELECT COUNT(*) FROM {self.table(file_path)}').fetchone()[0]
+
+    def reset(self, file_path: str):
+        table = self.table(file_path)
+        conn = self._conn()
+        with conn:
+            conn.execute(f'DELETE FROM {table}')
+            self._bump_generation(conn, table)
+
+    def import_csv(self, file_path: str, csv_path: Optional[str] = None) -> int:
+        """Replace a table with the contents of a CSV file (master.csv layout by default)"""
+        return self.replace(file_path, load_csv(csv_path or file_path))
+
+    def replace(self, file_path: str, df: pd.DataFrame) -> int:
+        """Swap the whole table for these rows in one transaction"""
+        df = _as_stored(df, self.columns(file_path))
+        table = self.table(file_path)
+        conn = self._conn()
+        with conn:
+            conn.execute(f'DELETE FROM {table}')
+            conn.executemany(
+                f'INSERT INTO {table} ({_quoted(df.columns)}) VALUES ({", ".join("?" * len(df.columns))})',
+                df.itertuples(index=False, name=None))
+            self._bump_generation(conn, table)
+        return len(df)
+
+    def iter_chunks(self, file_path: str, chunk_size: int = 50000) -> Iterator[pd.DataFrame]:
+        """The whole table in insertion order, chunk_size rows at a time"""
+        query = f'SELECT {_quoted(self.columns(file_path))} FROM {self.table(file_path)} ORDER BY rowid'
+        for chunk in pd.read_sql_query(query, self._conn(), chunksize=chunk_size):
+            yield chunk.astype(str)
+
+    def export_csv(self, file_path: str, csv_path: Optional[str] = None, chunk_size: int = 50000) -> int:
+        """Write a table out in the CSV layout, chunk by chunk"""
+        total = 0
+        with open(csv_path or file_path, 'w', encoding='utf-8', newline='') as f:
+            f.write(','.join(self.columns(file_path)) + '\n')
+            for chunk in self.iter_chunks(file_path, chunk_size):
+                chunk.to_csv(f, index=False, header=False, lineterminator='\n')
+                total += len(chunk)
+        return total
+
+    def sync_paths(self) -> List[str]:
+        return [os.path.relpath(self.db_path, DATA_DIR), os.path.relpath(ARCHIVE_DIR, DATA_DIR)]
+
+    def checkpoint(self):
+        # Fold the WAL into the main file so the pushed copy is complete
+        self._conn().execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+@_singleton
+def get_store():
+    """Storage backend picked by ERP_STORAGE_BACKEND"""
+    ensure_bootstrap()
+    if STORAGE_BACKEND == 'sqlite':
+        return SqliteStore()
+    if STORAGE_BACKEND != 'csv':
+        raise ValueError(f"Unknown ERP_STORAGE_BACKEND '{STORAGE_BACKEND}' - use 'csv' or 'sqlite'.")
+    return CsvStore()
+
+# Cold archive - superseded and removed master records, moved out of the hot file by archive_master()
+ARCHIVE_KEYS = ['person_id', 'cnic', 'record_id']
+
+class MasterArchive:
+    """Month partitions (archive/master-YYYY-MM.csv by updated_on) - read only for full history and lookups"""
+
+    def __init__(self, archive_dir: str = ARCHIVE_DIR):
+        self.archive_dir = archive_dir
+        self._lock = threading.Lock()
+        self._keys = {}  # partition path -> ((mtime_ns, size), person_id/cnic/record_id of its rows)
+
+    def partition_path(self, month: str) -> str:
+        return os.path.join(self.archive_dir, f'master-{month}.csv')
+
+    def partitions(self) -> List[str]:
+        try:
+            names = os.listdir(self.archive_dir)
+        except FileNotFoundError:
+            return []
+        return sorted(os.path.join(self.archive_dir, name) for name in names
+                      if name.startswith('master-') and name.endswith('.csv'))
+
+    def partitions_between(self, start: Optional[pd.Timestamp], end: pd.Timestamp) -> List[str]:
+        """Partitions that can hold updated_on in [start, end) - with no start, the undated one too"""
+        first = start.strftime('%Y-%m') if start is not None else ''
+        last = (end - pd.Timedelta(microseconds=1)).strftime('%Y-%m')
+        paths = []
+        for path in self.partitions():
+            month = os.path.basename(path)[len('master-'):-len('.csv')]
+            if (month == 'undated' and start is None) or first <= month <= last:
+                paths.append(path)
+        return paths
+
+    def append(self, rows: pd.DataFrame) -> List[str]:
+        """Add rows to the partitions of their month - returns the partitions written"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        months = pd.to_datetime(rows['updated_on'], errors='coerce').dt.strftime('%Y-%m').fillna('undated')
+        written = []
+        for month, part in rows.groupby(months.to_numpy(), sort=True):
+            path = self.partition_path(month)
+            append_csv(path, part)
+            written.append(path)
+        return written
+
+    def keys(self, path: str) -> pd.DataFrame:
+        """Lookup columns of one partition, re-read only after the partition changes"""
+        try:
+            info = os.stat(path)
+        except FileNotFoundError:
+            return pd.DataFrame(columns=ARCHIVE_KEYS, dtype=str)
+        stamp = (info.st_mtime_ns, info.st_size)
+        with self._lock:
+            cached = self._keys.get(path)
+            if cached is None or cached[0] != stamp:
+                keys = load_csv(path).reindex(columns=ARCHIVE_KEYS, fill_value='')
+                cached = self._keys[path] = (stamp, keys)
+            return cached[1]
+
+    def load(self, column: str = '', values=(), paths: Optional[List[str]] = None) -> pd.DataFrame:
+        """Cold records in month order - all of them, or only rows whose column is in values"""
+        parts = []
+        for path in self.partitions() if paths is None else paths:
+            if column and not self.keys(path)[column].isin(values).any():
+                continue  # Partition does not hold any of them - not read
+            part = load_csv(path).reindex(columns=MASTER_COLUMNS, fill_value='')
+            parts.append(part[part[column].isin(values)] if column else part)
+        if not parts:
+            return pd.DataFrame(columns=MASTER_COLUMNS, dtype=str)
+        # A crash between archiving and rewriting the hot file can archive a row twice
+        return pd.concat(parts, ignore_index=True).drop_duplicates('record_id').reset_index(drop=True)
+
+    def column_values(self, column: str) -> pd.Series:
+        parts = [self.keys(path)[column] for path in self.partitions()]
+        return pd.concat(parts, ignore_index=True) if parts else pd.Series(dtype=str)
+
+    def clear(self):
+        for path in self.partitions():
+            os.remove(path)
+        with self._lock:
+            self._keys.clear()
+
+@_singleton
+def get_archive() -> MasterArchive:
+    return MasterArchive()
+
+# Single writer - all mutations from all sessions run one at a time on one thread
+WRITE_BATCH_WINDOW = float(os.environ.get('ERP_WRITE_BATCH_WINDOW', '0.02'))
+WRITE_BATCH_MAX = 200
+_writer_local = threading.local()
+
+class WriteQueue:
+    """Writer thread - requests arriving close together share one append per data file"""
+
+    def __init__(self, batch_window: float = WRITE_BATCH_WINDOW, batch_max: int = WRITE_BATCH_MAX):
+        self.batch_window = batch_window
+        self.batch_max = batch_max
+        self._queue = queue.Queue()
+        self.batches = 0
+        self.requests = 0
+        self._thread = threading.Thread(target=self._run, name='erp-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        future = Future()
+        self._queue.put((future, fn, args, kwargs))
+        return future
+
+    def stop(self, timeout: Optional[float] = 30):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def _run(self):
+        _writer_local.is_writer = True
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.batch_max:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._execute(batch)
+                    return
+                batch.append(item)
+            self._execute(batch)
+
+    def _execute(self, batch: List[Tuple]):
+        cache = get_data_cache()
+        results = []
+        # Sessions keep reading while the requests run - the cache lock is taken only where the cached
+        # snapshot and the store change together (pending rows, the flush)
+        _writer_local.batch = pending = {}
+        try:
+            for future, fn, args, kwargs in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                marks = {file_path: (parts, len(parts)) for file_path, parts in pending.items()}
+                try:
+                    results.append((future, fn(*args, **kwargs), None))
+                except Exception as e:
+                    self._discard(pending, marks)
+                    results.append((future, None, e))
+        finally:
+            _writer_local.batch = None
+        with cache.lock:
+            try:
+                store = get_store()
+                for file_path, parts in pending.items():
+                    store.append(file_path, pd.concat(parts, ignore_index=True))
+                    cache.mark_flushed(file_path)
+            except Exception as e:
+                # Snapshot holds rows that never reached disk - reload from the store
+                cache.invalidate()
+                for future, _, _ in results:
+                    future.set_exception(e)
+                return
+        for file_path in pending:
+            get_git_sync_worker().request(file_path)
+        self.batches += 1
+        self.requests += len(results)
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    @staticmethod
+    def _discard(pending: Dict[str, List[pd.DataFrame]], marks: Dict[str, Tuple[List, int]]):
+        """Drop the rows a failed request queued - marks holds each file's parts from before it ran"""
+        cache = get_data_cache()
+        for file_path, parts in list(pending.items()):
+            before, keep = marks.get(file_path, (None, 0))
+            # A list other than the marked one was started after a mid-request flush - all of it is the request's
+            keep = keep if parts is before else 0
+            if len(parts) > keep:
+                del parts[keep:]
+                cache.discard_pending(file_path, keep)
+            if not parts:
+                del pending[file_path]
+
+def _flush_pending(file_path: str):
+    """Write out rows this write batch still holds for file_path"""
+    batch = getattr(_writer_local, 'batch', None)
+    if batch and batch.get(file_path):
+        cache = get_data_cache()
+        # A reader between the append and mark_flushed would reload the file and add the pending rows twice
+        with cache.lock:
+            try:
+                get_store().append(file_path, pd.concat(batch.pop(file_path), ignore_index=True))
+            except Exception:
+                # The rows never reached the store - nor may the snapshot keep them
+                cache.invalidate(file_path)
+                raise
+            cache.mark_flushed(file_path)
+
+@_singleton
+def get_write_queue() -> WriteQueue:
+    queue_ = WriteQueue()
+    atexit.register(queue_.stop)
+    return queue_
+
+def serialized_write(fn):
+    """Run a mutation on the writer thread and hand its result back to the calling session"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if getattr(_writer_local, 'is_writer', False):
+            return fn(*args, **kwargs)
+        return get_write_queue().submit(fn, *args, **kwargs).result()
+    return wrapper
+
+def load_df(file_path: str) -> pd.DataFrame:
+    return get_store().load(file_path)
+
+def append_rows(new_rows: pd.DataFrame, file_path: str):
+    """Append rows to a data table - cost depends on the new rows only, not the table size"""
+    store = get_store()
+    rows = _as_stored(new_rows, store.columns(file_path))
+    if file_path == MASTER_CSV:
+        get_snapshots().note_append(rows)
+    cache = get_data_cache()
+    batch = getattr(_writer_local, 'batch', None)
+    if batch is not None:
+        # Inside the writer thread - buffer until the batch is flushed
+        cache.apply_pending(file_path, rows)
+        batch.setdefault(file_path, []).append(rows)
+        return
+    with cache.lock:
+        before = store.signature(file_path)
+        store.append(file_path, rows)
+        # Cached frame and views catch up from the appended rows only
+        cache.apply_append(file_path, before, rows)
+
+    # Auto-sync to GitHub in the background
+    get_git_sync_worker().request(file_path)
+
+@serialized_write
+def compact_file(file_path: str) -> int:
+    """Compact a data table - CSV files are rewritten clean, SQLite is vacuumed"""
+    _flush_pending(file_path)
+    rows = get_store().compact(file_path)
+    get_data_cache().invalidate(file_path)
+    get_git_sync_worker().request(file_path)
+    return rows
+
+@serialized_write
+def archive_master() -> Dict:
+    """Move superseded and removed master records to the cold partitions - the hot file keeps current records"""
+    _flush_pending(MASTER_CSV)
+    store = get_store()
+    # Raw text, so archived rows are stored exactly as they were written
+    raw = load_df(MASTER_CSV).reset_index(drop=True)
+    if raw.empty:
+        return {'archived': 0, 'current': 0, 'partitions': []}
+    parsed = raw[['person_id']].assign(updated_on=pd.to_datetime(raw['updated_on'], errors='coerce'))
+    latest = CurrentRecordView._order(parsed).drop_duplicates('person_id', keep='last').index
+    keep = raw.index.isin(latest) & (raw['status'] != 'removed')
+    if keep.all():
+        return {'archived': 0, 'current': len(raw), 'partitions': []}
+    # Cold copy first - a crash before the rewrite only leaves rows in both places
+    written = get_archive().append(raw[~keep])
+    store.replace(MASTER_CSV, raw[keep])
+    get_data_cache().invalidate(MASTER_CSV)
+    get_git_sync_worker().request(MASTER_CSV)
+    return {'archived': int((~keep).sum()), 'current': int(keep.sum()),
+            'partitions': [os.path.basename(path) for path in written]}
+
+@serialized_write
+def reset_data_file(file_path: str):
+    # Rows still waiting in this write batch would be wiped by the reset anyway
+    (getattr(_writer_local, 'batch', None) or {}).pop(file_path, None)
+    cache = get_data_cache()
+    with cache.lock:
+        get_store().reset(file_path)
+        cache.invalidate(file_path)
+
+class CurrentRecordView:
+    """Latest record per person_id, kept up to date from appended rows instead of recomputed.
+    People whose latest record is removed are left out of the frame, archived or not - label() still finds them"""
+    requires = ()
+
+    PATCH_MAX = 64  # superseded rows cut out of the materialized frame one slice each - more and it is filtered instead
+
+    def __init__(self, df: pd.DataFrame):
+        self._latest = {}  # person_id -> (updated_on, row label, removed)
+        self._frame = None  # materialized current rows in label order, patched on append
+        self._dropped = []  # labels no longer current since _frame was built or patched
+        self._added = []  # labels that became current since then
+        self._patches = 0
+        self._apply(df)
+
+    @staticmethod
+    def _order(df: pd.DataFrame) -> pd.DataFrame:
+        # Oldest first, unparseable dates oldest of all, ties go to the row appended last
+        return df[['person_id', 'updated_on']].sort_values('updated_on', kind='stable', na_position='first')
+
+    def _apply(self, rows: pd.DataFrame):
+        if rows.empty or 'person_id' not in rows.columns:
+            return
+        latest = self._order(rows).drop_duplicates('person_id', keep='last')
+        removed = rows.loc[latest.index, 'status'].eq('removed') if 'status' in rows.columns else np.zeros(len(latest), dtype=bool)
+        for person_id, updated_on, label, gone in zip(latest['person_id'], latest['updated_on'], latest.index, removed):
+            current = self._latest.get(person_id)
+            if current is None or pd.isna(current[0]) or (not pd.isna(updated_on) and updated_on >= current[0]):
+                self._latest[person_id] = (updated_on, label, gone)
+                if self._frame is not None:
+                    if current is not None and not current[2]:
+                        self._dropped.append(current[1])
+                    if not gone:
+                        self._added.append(label)
+
+    def apply(self, df: pd.DataFrame, new_rows: pd.DataFrame):
+        self._apply(new_rows)
+
+    def label(self, person_id: str) -> Optional[int]:
+        current = self._latest.get(person_id)
+        return current[1] if current else None
+
+    def frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        if self._frame is None:
+            labels = np.fromiter((label for _, label, gone in self._latest.values() if not gone), dtype=np.int64)
+            self._frame = df.loc[np.sort(labels)]
+        elif self._added or self._dropped:
+            self._frame = self._patch(df)
+        self._dropped, self._added = [], []
+        return self._frame
+
+    def _patch(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Frame with the superseded rows cut out and the new current rows added at the end"""
+        added = set(self._added)
+        gone = np.sort(np.fromiter(set(self._dropped) - added, dtype=np.int64))
+        # Labels become current in append order, so rows added since the last patch go after all others
+        new = df.loc[sorted(added - set(self._dropped))]
+        frame = self._frame
+        if len(gone) > self.PATCH_MAX:
+            frame = frame[~frame.index.isin(gone)]
+            pieces = [frame]
+        else:
+            positions = np.searchsorted(frame.index.to_numpy(), gone)
+            bounds = np.concatenate(([0], positions + 1))
+            ends = np.concatenate((positions, [len(frame)]))
+            # Slices share the cached arrays - nothing is copied until the concat
+            pieces = [frame.iloc[start:end] for start, end in zip(bounds, ends) if end > start]
+        frame = _concat_typed(pieces + [new]) if pieces else new
+        self._patches += 1
+        if self._patches % ARROW_REBUILD_APPENDS == 0:
+            frame = _one_chunk(frame)
+        return frame
+
+class SupervisorIndex:
+    """Active supervisor per CC/UC and record_id -> person, built from the current-record view"""
+    requires = (CurrentRecordView,)
+
+    def __init__(self, df: pd.DataFrame, current: CurrentRecordView):
+        self._current = current
+        self._df = df
+        self._person_of = {}  # record_id -> person_id
+        self._by_cc_uc = {}  # cc_uc -> {person_id: updated_on} of active supervisors
+        self._sup_cc_uc = {}  # person_id -> cc_uc they supervise
+        self.apply(df, df)
+
+    def apply(self, df: pd.DataFrame, new_rows: pd.DataFrame):
+        self._df = df
+        if new_rows.empty:
+            return
+        self._person_of.update(zip(new_rows['record_id'], new_rows['person_id']))
+        persons = new_rows['person_id'].unique()
+        rows = df.loc[[self._current.label(person_id) for person_id in persons], ['role', 'status', 'cc_uc', 'updated_on']]
+        for person_id, role, status, cc_uc, updated_on in zip(persons, rows['role'], rows['status'], rows['cc_uc'], rows['updated_on']):
+            old_cc_uc = self._sup_cc_uc.pop(person_id, None)
+            if old_cc_uc is not None:
+                self._by_cc_uc[old_cc_uc].pop(person_id, None)
+            if role == 'Supervisor' and status == 'active':
+                updated_on = updated_on if pd.notna(updated_on) else pd.Timestamp.min
+                self._by_cc_uc.setdefault(cc_uc, {})[person_id] = updated_on
+                self._sup_cc_uc[person_id] = cc_uc
+
+    def supervisor_for(self, cc_uc: str) -> str:
+        sups = self._by_cc_uc.get(cc_uc)
+        if not sups:
+            return ""
+        # Several active supervisors on one CC/UC - most recently updated wins
+        person_id = max(sups, key=sups.get)
+        return self._df.at[self._current.label(person_id), 'record_id']
+
+    def supervisor_map(self) -> Dict[str, str]:
+        return {cc_uc: self.supervisor_for(cc_uc) for cc_uc, sups in self._by_cc_uc.items() if sups}
+
+    def is_active_supervisor(self, record_id: str) -> bool:
+        person_id = self._person_of.get(record_id)
+        if person_id is None:
+            return False
+        return person_id in self._sup_cc_uc
+
+HEADCOUNT_KEYS = ['area', 'pp_sz', 'zone', 'cc_uc', 'role', 'status']
+STATUS_KEY = HEADCOUNT_KEYS.index('status')
+
+class HeadcountRollup:
+    """People per (area, pp_sz, zone, cc_uc, role, status) of their current record - counters move as records are appended.
+    Removed people are not counted, same as the current roster"""
+    requires = (CurrentRecordView,)
+
+    def __init__(self, df: pd.DataFrame, current: CurrentRecordView):
+        self._current = current
+        self._key_of = {}  # person_id -> key of their current record
+        self._counts = {}  # key -> people
+        self._table = None
+        self.apply(df, df)
+
+    def apply(self, df: pd.DataFrame, new_rows: pd.DataFrame):
+        if new_rows.empty:
+            return
+        persons = new_rows['person_id'].unique()
+        rows = df.loc[[self._current.label(person_id) for person_id in persons], HEADCOUNT_KEYS]
+        for person_id, key in zip(persons, rows.fillna('').itertuples(index=False, name=None)):
+            if key[STATUS_KEY] == 'removed':
+                key = None
+            old = self._key_of.get(person_id)
+            if old == key:
+                continue
+            if old is not None:
+                self._counts[old] -= 1
+                if not self._counts[old]:
+                    del self._counts[old]
+            if key is None:
+                del self._key_of[person_id]
+                continue
+            self._counts[key] = self._counts.get(key, 0) + 1
+            self._key_of[person_id] = key
+        self._table = None
+
+    def counts(self) -> pd.DataFrame:
+        """One row per key with its headcount - as many rows as distinct keys, not people"""
+        if self._table is None:
+            self._table = pd.DataFrame([key + (n,) for key, n in self._counts.items()], columns=HEADCOUNT_KEYS + ['count'])
+        return self._table
+
+SEARCH_FIELDS = ['name', 'record_id', 'cnic', 'vehicle_reg_no']
+
+class SearchIndex:
+    """Trigram index over the distinct name/record_id/cnic/vehicle values of the master"""
+    requires = ()
+
+    def __init__(self, df: pd.DataFrame):
+        self._values = []  # value id -> lowercase value
+        self._value_id = {}  # lowercase value -> value id
+        self._rows = []  # value id -> row labels having that value in a search field
+        self._grams = {}  # trigram -> value ids containing it
+        if df.empty:
+            return
+        stacked = pd.concat([df[col].astype(str).str.lower() for col in SEARCH_FIELDS])
+        labels = np.tile(df.index.to_numpy(), len(SEARCH_FIELDS))
+        codes, uniques = pd.factorize(stacked)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        for code, value in enumerate(uniques):
+            if value:
+                vid = self._add_value(value)
+                self._rows[vid].extend(labels[order[bounds[code]:bounds[code + 1]]].tolist())
+
+    @staticmethod
+    def _trigrams(value: str) -> set:
+        return {value[i:i + 3] for i in range(len(value) - 2)}
+
+    def _add_value(self, value: str) -> int:
+        vid = len(self._values)
+        self._values.append(value)
+        self._value_id[value] = vid
+        self._rows.append(array('q'))
+        for gram in self._trigrams(value):
+            self._grams.setdefault(gram, array('q')).append(vid)
+        return vid
+
+    def apply(self, df: pd.DataFrame, new_rows: pd.DataFrame):
+        for col in SEARCH_FIELDS:
+            for label, value in zip(new_rows.index, new_rows[col].astype(str).str.lower()):
+                if value:
+                    vid = self._value_id.get(value)
+                    if vid is None:
+                        vid = self._add_value(value)
+                    self._rows[vid].append(label)
+
+    def search(self, query: str) -> np.ndarray:
+        """Row labels where any search field contains query (case-insensitive substring)"""
+        query = query.lower()
+        if len(query) < 3:
+            candidates = range(len(self._values))
+        else:
+            postings = [self._grams.get(gram) for gram in self._trigrams(query)]
+            if any(p is None for p in postings):
+                return np.empty(0, dtype=np.int64)
+            # Rarest trigram gives the candidates, the substring check weeds out false hits
+            candidates = min(postings, key=len)
+        matches = [self._rows[vid] for vid in candidates if query in self._values[vid]]
+        if not matches:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate([np.frombuffer(rows, dtype=np.int64) for rows in matches]))
+
+CNIC_INDEX_FOLD = 50000  # keys added since the build before they are folded into the lookup table
+
+class CnicIndex:
+    """CNIC -> person_id over the master and its archive - the most recent record carrying a CNIC wins.
+    Archiving rewrites the master, so the cache entry and this index are rebuilt whenever the archive changes."""
+    requires = ()
+    key = 'cnic'
+
+    def __init__(self, df: pd.DataFrame):
+        archive = get_archive()
+        # Partitions in month order, then the hot file in append order
+        pairs = pd.concat([archive.keys(path)[[self.key, 'person_id']] for path in archive.partitions()] +
+                          [df[[self.key, 'person_id']]], ignore_index=True)
+        pairs = pairs[pairs[self.key] != ''].drop_duplicates(self.key, keep='last')
+        self._people = pd.Series(pairs['person_id'].to_numpy(), index=pairs[self.key].to_numpy())
+        self._added = {}
+
+    def apply(self, df: pd.DataFrame, new_rows: pd.DataFrame):
+        rows = new_rows[new_rows[self.key] != '']
+        self._added.update(zip(rows[self.key], rows['person_id']))
+        if len(self._added) > CNIC_INDEX_FOLD:
+            added = pd.Series(self._added)
+            self._people = pd.concat([self._people[~self._people.index.isin(added.index)], added])
+            self._added = {}
+
+    def lookup(self, values: pd.Series) -> pd.Series:
+        """person_id for each key value, '' where the value is not known"""
+        found = values.map(self._people)
+        if self._added:
+            found = values.map(self._added).fillna(found)
+        return found.fillna('').astype(str)
+
+class RecordIdIndex(CnicIndex):
+    """record_id -> person_id over the master and its archive - same upkeep as CnicIndex"""
+    key = 'record_id'
+
+class _CacheEntry:
+    def __init__(self, signature: Optional[Tuple], df: pd.DataFrame):
+        self.signature = signature
+        self.df = df
+        self.views = {}
+        self.appends = 0
+
+class DataCache:
+    """Parsed data files shared by all sessions - a file is re-read only when it changes on disk"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._entries = {}  # file_path -> _CacheEntry
+        self._pending = {}  # file_path -> rows of the current write batch not yet in the store
+
+    @staticmethod
+    def signature(file_path: str) -> Optional[Tuple]:
+        """Identity of the stored data - file identity/mtime/size, or SQLite row high-water mark"""
+        return get_store().signature(file_path)
+
+    @staticmethod
+    def _parse(file_path: str, df: pd.DataFrame, like: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """Typed frame of stored text - with `like`, categoricals take its categories where the values allow"""
+        if df.columns.empty:
+            df = pd.DataFrame(columns=_file_columns(file_path), dtype=str)
+        df = df.reset_index(drop=True)
+        if 'updated_on' in df.columns:
+            with timed('parse_updated_on', len(df)):
+                df['updated_on'] = pd.to_datetime(df['updated_on'], errors='coerce')
+        if file_path == MASTER_CSV:
+            for col in CATEGORY_COLUMNS:
+                if col in df.columns:
+                    dtype = like[col].dtype if like is not None and col in like.columns else None
+                    codes = dtype.categories.get_indexer(df[col]) if isinstance(dtype, pd.CategoricalDtype) else None
+                    if codes is not None and (codes >= 0).all():
+                        df[col] = pd.Categorical.from_codes(codes, dtype=dtype)
+                    else:
+                        df[col] = df[col].astype('category')
+        return df
+
+    def _entry(self, file_path: str) -> _CacheEntry:
+        sig = self.signature(file_path)
+        entry = self._entries.get(file_path)
+        if entry is None or entry.signature != sig:
+            entry = _CacheEntry(sig, self._parse(file_path, load_df(file_path)))
+            for rows in self._pending.get(file_path, []):
+                self._extend(file_path, entry, rows)
+            self._entries[file_path] = entry
+        return entry
+
+    def get(self, file_path: str) -> pd.DataFrame:
+        """Read-only view of the file - callers must not modify it in place"""
+        with self.lock:
+            # Shallow copy - adding or replacing columns never touches the cached frame
+            return self._entry(file_path).df.copy(deep=False)
+
+    def view(self, file_path: str, view_cls):
+        """Derived view of the current snapshot, built on first use - call under self.lock"""
+        entry = self._entry(file_path)
+        view = entry.views.get(view_cls)
+        if view is None:
+            # Dependencies are registered first, so appends reach them first
+            deps = [self.view(file_path, dep) for dep in view_cls.requires]
+            view = entry.views[view_cls] = view_cls(entry.df, *deps)
+        return view
+
+    def current_records(self, file_path: str = '') -> pd.DataFrame:
+        file_path = file_path or MASTER_CSV
+        with self.lock:
+            return self.view(file_path, CurrentRecordView).frame(self._entries[file_path].df).copy(deep=False)
+
+    def latest_record(self, person_id: str) -> Optional[pd.Series]:
+        with self.lock:
+            label = self.view(MASTER_CSV, CurrentRecordView).label(person_id)
+            return None if label is None else self._entries[MASTER_CSV].df.loc[label]
+
+    def latest_records(self, person_ids) -> pd.DataFrame:
+        """Hot latest record of each person found - removed people included, unlike current_records"""
+        with self.lock:
+            view = self.view(MASTER_CSV, CurrentRecordView)
+            labels = [label for label in map(view.label, person_ids) if label is not None]
+            return self._entries[MASTER_CSV].df.loc[labels]
+
+    @classmethod
+    def _extend(cls, file_path: str, entry: _CacheEntry, new_rows: pd.DataFrame):
+        new_rows = cls._parse(file_path, new_rows, entry.df)
+        new_rows.index = pd.RangeIndex(len(entry.df), len(entry.df) + len(new_rows))
+        entry.df = _concat_typed([entry.df, new_rows]) if not entry.df.empty else new_rows
+        entry.appends += 1
+        if entry.appends % ARROW_REBUILD_APPENDS == 0:
+            entry.df = _one_chunk(entry.df)
+        for view in entry.views.values():
+            view.apply(entry.df, new_rows)
+
+    def apply_append(self, file_path: str, before: Optional[Tuple], new_rows: pd.DataFrame):
+        """Bring a cached snapshot forward by rows we just appended, else drop it"""
+        with self.lock:
+            entry = self._entries.get(file_path)
+            if entry is None or entry.signature != before or list(new_rows.columns) != list(entry.df.columns):
+                self._entries.pop(file_path, None)
+                return
+            self._extend(file_path, entry, new_rows)
+            entry.signature = self.signature(file_path)
+
+    def apply_pending(self, file_path: str, new_rows: pd.DataFrame):
+        """Show rows of an unflushed write batch right away - they reach the store when the batch is flushed"""
+        with self.lock:
+            entry = self._entries.get(file_path)
+            if entry is not None and list(new_rows.columns) != list(entry.df.columns):
+                raise ValueError(f"Column mismatch for {os.path.basename(file_path)}")
+            self._pending.setdefault(file_path, []).append(new_rows)
+            # Files nobody has loaded stay unloaded - the rows are added if they get loaded mid-batch
+            if entry is not None:
+                self._extend(file_path, entry, new_rows)
+
+    def mark_flushed(self, file_path: str):
+        """Pending rows are on disk now - the snapshot matches the store again"""
+        with self.lock:
+            self._pending.pop(file_path, None)
+            entry = self._entries.get(file_path)
+            if entry is not None:
+                entry.signature = self.signature(file_path)
+
+    def discard_pending(self, file_path: str, keep: int):
+        """Forget pending rows after the first `keep` parts - the snapshot is rebuilt from the store and the rest"""
+        with self.lock:
+            del self._pending.get(file_path, [])[keep:]
+            self._entries.pop(file_path, None)
+
+    def invalidate(self, file_path: Optional[str] = None):
+        with self.lock:
+            if file_path is None:
+                self._entries.clear()
+                self._pending.clear()
+            else:
+                self._entries.pop(file_path, None)
+                self._pending.pop(file_path, None)
+
+@_singleton
+def get_data_cache() -> DataCache:
+    return DataCache()
+
+def load_cached_df(file_path: str) -> pd.DataFrame:
+    """Like load_df, from the shared cache, with updated_on already parsed"""
+    return get_data_cache().get(file_path)
+
+def get_current_records() -> pd.DataFrame:
+    """Current roster - the latest record of every person not removed"""
+    return get_data_cache().current_records()
+
+def get_latest_record(person_id: str) -> Optional[pd.Series]:
+    return get_data_cache().latest_record(person_id)
+
+def load_master_history() -> pd.DataFrame:
+    """Every master version - the archived ones first, then the hot file. Reads all cold partitions"""
+    cold = get_archive().load()
+    hot = load_cached_df(MASTER_CSV)
+    if cold.empty:
+        return hot
+    return _concat_typed([DataCache._parse(MASTER_CSV, cold), hot], ignore_index=True)
+
+def _in_range(times: pd.Series, start: Optional[pd.Timestamp], end: pd.Timestamp) -> np.ndarray:
+    # Undated rows count as older than anything
+    in_range = times.isna() | (times < end) if start is None else (times >= start) & (times < end)
+    return in_range.to_numpy()
+
+def _master_between(start: Optional[pd.Timestamp], end: pd.Timestamp) -> pd.DataFrame:
+    """Master versions with start <= updated_on < end, cold ones first - no start means everything before end"""
+    archive = get_archive()
+    cold = DataCache._parse(MASTER_CSV, archive.load(paths=archive.partitions_between(start, end)))
+    hot = load_cached_df(MASTER_CSV)
+    return _concat_typed([df[_in_range(df['updated_on'], start, end)] for df in (cold, hot)], ignore_index=True)
+
+def find_person_records(cnic: str = '', person_id: str = '') -> pd.DataFrame:
+    """Master records with this CNIC (or person_id), oldest first - only partitions holding them are read"""
+    column, value = ('cnic', cnic) if cnic else ('person_id', person_id)
+    hot = load_cached_df(MASTER_CSV)
+    hot = hot[hot[column] == value]
+    cold = get_archive().load(column, [value])
+    if cold.empty:
+        return hot
+    return _concat_typed([DataCache._parse(MASTER_CSV, cold), hot], ignore_index=True)
+
+def query_history(page: int = 0, page_size: int = 50, **filters) -> Tuple[pd.DataFrame, int]:
+    """One page of history, newest first, straight from the store - filters: person_id (partial),
+    action, by_user, start / end (dates, end exclusive)"""
+    with timed('history_query') as span:
+        df, total = get_store().query_history(page, page_size, **filters)
+        span['rows'] = len(df)
+    return df, total
+
+def history_filter_options() -> Dict[str, List[str]]:
+    return get_store().history_options()
+
+def get_headcounts() -> pd.DataFrame:
+    """Headcount per (area, pp_sz, zone, cc_uc, role, status) of the current roster"""
+    cache = get_data_cache()
+    with cache.lock:
+        return cache.view(MASTER_CSV, HeadcountRollup).counts()
+
+def headcount_summary(counts: pd.DataFrame, by: str) -> pd.DataFrame:
+    """Headcounts grouped by one column, a column per status plus Total"""
+    if counts.empty:
+        return pd.DataFrame(columns=['Total'])
+    summary = counts.pivot_table(index=by, columns='status', values='count', aggfunc='sum', fill_value=0)
+    summary.columns.name = None
+    summary['Total'] = summary.sum(axis=1)
+    return summary.sort_values('Total', ascending=False)
+
+def filter_roster(df: pd.DataFrame, area: str, pp_sz: str, zone: str, cc_uc: str) -> pd.DataFrame:
+    """Dashboard location filters - exact area, partial PP/SZ, Zone and CC/UC"""
+    if area != 'All':
+        df = df[df['area'] == area]
+    if pp_sz:
+        df = df[df['pp_sz'].str.contains(pp_sz, case=False, na=False, regex=False)]
+    if zone:
+        df = df[df['zone'].str.contains(zone, case=False, na=False, regex=False)]
+    if cc_uc:
+        df = df[df['cc_uc'].str.contains(cc_uc, case=False, na=False, regex=False)]
+    return df
+
+# Point-in-time roster - snapshots every SNAPSHOT_MONTHS months, later versions replayed on top
+SNAPSHOT_MONTHS = int(os.environ.get('ERP_SNAPSHOT_MONTHS', '1'))
+SNAPSHOT_CACHE = 2  # snapshot frames kept in memory
+
+class RosterSnapshots:
+    """Active roster (latest record per person, removed people left out) as of 00:00 on each snapshot date"""
+
+    def __init__(self, snapshot_dir: str = SNAPSHOT_DIR):
+        self.snapshot_dir = snapshot_dir
+        self.lock = threading.RLock()
+        self.build_lock = threading.Lock()  # one builder at a time - queries do not wait for it
+        self.version = 0  # bumped when snapshots are dropped, a build started before that is abandoned
+        self.last_error = ''
+        self._frames = collections.OrderedDict()  # cutoff -> loaded roster, most recent use last
+        self._builder = None
+        self._build_wanted = False
+
+    def path(self, cutoff: pd.Timestamp) -> str:
+        return os.path.join(self.snapshot_dir, f"roster-{cutoff:%Y-%m-%d}.csv")
+
+    def cutoffs(self) -> List[pd.Timestamp]:
+        try:
+            names = os.listdir(self.snapshot_dir)
+        except FileNotFoundError:
+            return []
+        return sorted(pd.Timestamp(name[len('roster-'):-len('.csv')]) for name in names
+                      if name.startswith('roster-') and name.endswith('.csv'))
+
+    def load(self, cutoff: pd.Timestamp) -> pd.DataFrame:
+        with self.lock:
+            roster = self._frames.pop(cutoff, None)
+            if roster is None:
+                roster = DataCache._parse(MASTER_CSV, load_csv(self.path(cutoff)).reindex(columns=MASTER_COLUMNS, fill_value=''))
+            self._keep(cutoff, roster)
+            return roster
+
+    def _keep(self, cutoff: pd.Timestamp, roster: pd.DataFrame):
+        self._frames[cutoff] = roster
+        while len(self._frames) > SNAPSHOT_CACHE:
+            self._frames.popitem(last=False)
+
+    def save(self, cutoff: pd.Timestamp, roster: pd.DataFrame):
+        # Not fsynced - a lost snapshot is simply built again
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        temp_path = self.path(cutoff) + '.tmp'
+        _as_stored(roster, MASTER_COLUMNS).to_csv(temp_path, index=False, lineterminator='\n')
+        os.replace(temp_path, self.path(cutoff))
+        with self.lock:
+            # The newest snapshot serves most queries - kept in memory instead of read back
+            self._frames.pop(cutoff, None)
+            self._keep(cutoff, roster)
+
+    def due(self, cutoffs: Optional[List[pd.Timestamp]] = None) -> bool:
+        """Whether a snapshot is missing - none yet, or a period has passed since the newest one"""
+        cutoffs = self.cutoffs() if cutoffs is None else cutoffs
+        return not cutoffs or cutoffs[-1] + pd.DateOffset(months=SNAPSHOT_MONTHS) <= pd.Timestamp.now()
+
+    def request_build(self):
+        """Build the due snapshots on a background thread - returns immediately"""
+        with self.lock:
+            self._build_wanted = True
+            if self._builder is None:
+                self._builder = threading.Thread(target=self._build_loop, name='roster-snapshots', daemon=True)
+                self._builder.start()
+
+    def building(self) -> bool:
+        with self.lock:
+            return self._builder is not None
+
+    def _build_loop(self):
+        while True:
+            with self.lock:
+                if not self._build_wanted:
+                    self._builder = None
+                    return
+                self._build_wanted = False
+            try:
+                build_roster_snapshots()
+                self.last_error = ''
+            except Exception as e:
+                self.last_error = str(e)
+
+    def drop_after(self, when: Optional[pd.Timestamp] = None):
+        """Remove snapshots taken after `when` (all of them with no `when`) - they no longer match the master"""
+        with self.lock:
+            self.version += 1
+            for cutoff in self.cutoffs():
+                if when is None or cutoff > when:
+                    os.remove(self.path(cutoff))
+                    self._frames.pop(cutoff, None)
+
+    def note_append(self, rows: pd.DataFrame):
+        """Rows dated before the newest snapshot make it stale - the usual append is dated now and costs a listdir"""
+        cutoffs = self.cutoffs()
+        if not cutoffs or rows.empty:
+            return
+        times = pd.to_datetime(rows['updated_on'], errors='coerce')
+        if times.isna().any():
+            self.drop_after()
+        elif times.min() < cutoffs[-1]:
+            self.drop_after(times.min())
+        elif not self.due(cutoffs):
+            return
+        # Dropped or newly due snapshots are built now, not by the next query
+        self.request_build()
+
+@_singleton
+def get_snapshots() -> RosterSnapshots:
+    return RosterSnapshots()
+
+def _replay(base: Optional[pd.DataFrame], versions: pd.DataFrame) -> pd.DataFrame:
+    """Roster after applying newer versions to base - same latest-record rule as CurrentRecordView"""
+    rows = versions if base is None else _concat_typed([base, versions], ignore_index=True)
+    latest = CurrentRecordView._order(rows).drop_duplicates('person_id', keep='last').index
+    rows = rows.loc[latest.sort_values()]
+    return rows[rows['status'] != 'removed'].reset_index(drop=True)
+
+def _first_data_month() -> Optional[pd.Timestamp]:
+    months = [os.path.basename(path)[len('master-'):-len('.csv')] for path in get_archive().partitions()]
+    starts = [pd.Timestamp(month + '-01') for month in months if month != 'undated']
+    hot_first = load_cached_df(MASTER_CSV)['updated_on'].min()
+    if not pd.isna(hot_first):
+        starts.append(hot_first.to_period('M').to_timestamp())
+    return min(starts) if starts else None
+
+def build_roster_snapshots(until: Optional[pd.Timestamp] = None) -> int:
+    """Write the snapshots that are due, each from the previous one plus the versions in between.
+    Queries keep running meanwhile - if snapshots are dropped mid-build, the rest of the build is abandoned"""
+    snapshots = get_snapshots()
+    until = until or pd.Timestamp.now()
+    step = pd.DateOffset(months=SNAPSHOT_MONTHS)
+    with snapshots.build_lock:
+        with snapshots.lock:
+            version = snapshots.version
+            done = snapshots.cutoffs()
+            roster = snapshots.load(done[-1]) if done else None
+        start = done[-1] if done else _first_data_month()
+        if start is None:
+            return 0
+        due = [cutoff for cutoff in pd.date_range(start + step, until, freq=f'{SNAPSHOT_MONTHS}MS') if cutoff > start]
+        if not due:
+            return 0
+        built = 0
+        with timed('build_snapshots', len(due)):
+            previous = done[-1] if done else None
+            versions = _master_between(previous, due[-1])
+            for cutoff in due:
+                roster = _replay(roster, versions[_in_range(versions['updated_on'], previous, cutoff)])
+                with snapshots.lock:
+                    if snapshots.version != version:
+                        break
+                    snapshots.save(cutoff, roster)
+                built += 1
+                previous = cutoff
+    return built
+
+def as_of_roster(date) -> pd.DataFrame:
+    """Active roster at the end of `date` - the nearest earlier snapshot plus the master versions after it.
+    Missing snapshots are built in the background, this query replays from whatever exists already"""
+    cutoff = pd.Timestamp(date).normalize() + pd.Timedelta(days=1)
+    snapshots = get_snapshots()
+    with timed('as_of_roster') as span:
+        with snapshots.lock:
+            cutoffs = snapshots.cutoffs()
+            base_cutoff = max((c for c in cutoffs if c <= cutoff), default=None)
+            base = snapshots.load(base_cutoff) if base_cutoff is not None else None
+        if snapshots.due(cutoffs):
+            snapshots.request_build()
+        roster = _replay(base, _master_between(base_cutoff, cutoff))
+        span['rows'] = len(roster)
+    return roster
+
+def roster_headcounts(roster: pd.DataFrame) -> pd.DataFrame:
+    """Same table as get_headcounts, counted from any roster frame"""
+    counts = roster.groupby(HEADCOUNT_KEYS, observed=True, dropna=False).size().reset_index(name='count')
+    return pd.concat([_as_stored(counts, HEADCOUNT_KEYS), counts['count']], axis=1)
+
+def search_frame(df: pd.DataFrame, query: str) -> pd.DataFrame:
+    """Rows of any frame matching the search box - a plain scan, for frames the index does not cover"""
+    query = query.lower()
+    hit = np.zeros(len(df), dtype=bool)
+    for col in SEARCH_FIELDS:
+        hit |= df[col].astype(str).str.lower().str.contains(query, regex=False).to_numpy()
+    return df[hit]
+
+def search_records(query: str) -> np.ndarray:
+    """Master row labels matching the Dashboard search box"""
+    cache = get_data_cache()
+    with timed('dashboard_search') as span, cache.lock:
+        labels = cache.view(MASTER_CSV, SearchIndex).search(query)
+        span['rows'] = len(labels)
+    return labels
+
+# Export - files are written only when a download button is clicked, one chunk at a time
+EXPORT_CHUNK_ROWS = 50000
+EXPORT_FORMATS = {
+    'CSV': ('csv', 'text/csv'),
+    'XLSX': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+def frame_chunks(df: pd.DataFrame, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+def write_export(chunks: Iterator[pd.DataFrame], columns: List[str], fmt: str = 'csv') -> BinaryIO:
+    """Write chunks to a temp file as CSV or XLSX and return it rewound for reading"""
+    out = tempfile.TemporaryFile()
+    if fmt == 'csv':
+        text = io.TextIOWrapper(out, encoding='utf-8', newline='')
+        pd.DataFrame(columns=columns).to_csv(text, index=False, lineterminator='\n')
+        for chunk in chunks:
+            chunk.to_csv(text, index=False, header=False, lineterminator='\n')
+        text.flush()
+        text.detach()
+    elif fmt == 'xlsx':
+        import openpyxl  # only when someone exports xlsx
+        # write_only keeps just the current row in memory
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet('Export')
+        sheet.append(columns)
+        for chunk in chunks:
+            cells = chunk.astype(object).where(chunk.notna(), None)
+            for row in cells.itertuples(index=False, name=None):
+                sheet.append(row)
+        workbook.save(out)
+    else:
+        raise ValueError(f"Unknown export format '{fmt}'")
+    out.seek(0)
+    return out
+
+def export_frame(df: pd.DataFrame, fmt: str = 'csv') -> BinaryIO:
+    return write_export(frame_chunks(df), list(df.columns), fmt)
+
+def export_data_file(file_path: str, fmt: str = 'csv') -> BinaryIO:
+    """A data file straight from the store, without loading it whole"""
+    store = get_store()
+    return write_export(store.iter_chunks(file_path, EXPORT_CHUNK_ROWS), store.columns(file_path), fmt)
+
+def generate_person_id() -> str:
+    return f"P{uuid.uuid4().hex[:8].upper()}"
+
+def generate_person_ids(count: int, existing: Optional[pd.Series] = None) -> List[str]:
+    """Contiguous block of person ids starting at a random base, checked against existing ids"""
+    taken = set(existing) if existing is not None else set()
+    while True:
+        base = uuid.uuid4().int % (0x100000000 - count)
+        ids = [f"P{n:08X}" for n in range(base, base + count)]
+        if not taken.intersection(ids):
+            return ids
+
+def max_id_number(values: pd.Series, prefix: str) -> int:
+    """Largest N among ids like W0042 / H0042"""
+    ids = values.str.extract(rf'{prefix}(\d+)', expand=False).dropna()
+    return int(ids.astype(int).max()) if not ids.empty else 0
+
+def max_record_number(df: pd.DataFrame) -> int:
+    if df.empty or 'record_id' not in df.columns:
+        return 0
+    return max_id_number(df['record_id'], 'W')
+
+# Sequence state - last record_id / log_id number handed out
+SEQUENCE_STATE = os.path.join(DATA_DIR, '.erp_sequences.json')
+SEQUENCES = {'record_id': (MASTER_CSV, 'W'), 'log_id': (HISTORY_CSV, 'H')}
+
+class SequenceAllocator:
+    """Durable high-water marks for record_id and log_id - allocating a block is O(1)"""
+
+    def __init__(self, state_path: str = SEQUENCE_STATE):
+        self.state_path = state_path
+        self._lock = threading.Lock()
+        self._high = {}  # name -> last number handed out
+        self._generations = {}  # name -> store generation _high was checked against
+
+    def _load_state(self) -> Dict:
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_state(self):
+        state = {**self._load_state(), **self._high}
+        # Not fsynced - after a crash the tail check below finds anything newer
+        temp_path = self.state_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(temp_path, self.state_path)
+
+    def _high_water(self, name: str) -> int:
+        file_path, prefix = SEQUENCES[name]
+        store = get_store()
+        generation = store.generation(file_path)
+        if name not in self._high or self._generations.get(name) != generation:
+            saved = self._load_state().get(name)
+            tail = store.tail(file_path)
+            tail_max = max_id_number(tail[name], prefix) if name in tail.columns else 0
+            if saved is None or tail_max > saved or name in self._high:
+                # Missing or stale state, or the data was swapped (import, archive) - one full scan recovers the real maximum
+                df = load_cached_df(file_path)
+                saved = max(saved or 0, max_id_number(df[name], prefix) if name in df.columns else 0)
+                if file_path == MASTER_CSV:
+                    # Archived records keep their ids - the highest one may be cold by now
+                    saved = max(saved, max_id_number(get_archive().column_values(name), prefix))
+            # Never lower within a run - ids handed out before the swap stay taken
+            self._high[name] = max(self._high.get(name, 0), saved)
+            self._generations[name] = generation
+        return self._high[name]
+
+    def reserve(self, name: str, count: int = 1, at_least: int = 0) -> int:
+        """First number of a block of count fresh numbers, all above at_least"""
+        with self._lock:
+            start = max(self._high_water(name), at_least) + 1
+            self._high[name] = start + count - 1
+            self._save_state()
+            return start
+
+    def observe(self, name: str, number: int):
+        """Record a number assigned outside the allocator (e.g. ids in an uploaded file)"""
+        with self._lock:
+            if number > self._high_water(name):
+                self._high[name] = number
+                self._save_state()
+
+@_singleton
+def get_sequence_allocator() -> SequenceAllocator:
+    return SequenceAllocator()
+
+def generate_record_id() -> str:
+    return generate_record_ids(1)[0]
+
+def generate_record_ids(count: int, start_after: int = 0) -> List[str]:
+    """Contiguous block of record ids"""
+    start = get_sequence_allocator().reserve('record_id', count, start_after)
+    return [f"W{n:04d}" for n in range(start, start + count)]
+
+def generate_log_id() -> str:
+    return generate_log_ids(1)[0]
+
+def generate_log_ids(count: int) -> List[str]:
+    start = get_sequence_allocator().reserve('log_id', count)
+    return [f"H{n:04d}" for n in range(start, start + count)]
+
+# Validation rules - each one runs over whole columns, failures come back as report rows
+AREAS = ['City', 'Sadar']
+CNIC_PATTERN = r'\d{13}'
+PHONE_PATTERN = r'\d{11}'
+AREA_PATTERNS = {
+    'pp_sz': {'City': r'PP-\d{3}', 'Sadar': r'SZ-\d{2}'},
+    'cc_uc': {'City': r'(?:CC|RW)-.*', 'Sadar': r'UC-\d{3}'},
+}
+DATE_COLUMNS = ['updated_on', 'status_changed_on', 'last_transfer_on']
+REQUIRED_COLUMNS = ['cnic', 'phone', 'area', 'pp_sz', 'cc_uc']
+VALIDATION_REPORT_COLUMNS = ['row', 'column', 'rule', 'value', 'message']
+
+def _fails_pattern(pattern: str):
+    return lambda df, col: ~df[col].str.fullmatch(pattern)
+
+def _fails_area_pattern(df: pd.DataFrame, col: str) -> pd.Series:
+    # Rows with an unknown area are left to the area rule
+    bad = pd.Series(False, index=df.index)
+    for area, pattern in AREA_PATTERNS[col].items():
+        bad |= (df['area'] == area) & ~df[col].str.fullmatch(pattern)
+    return bad
+
+def _fails_date(df: pd.DataFrame, col: str) -> pd.Series:
+    parsed = pd.to_datetime(df[col], errors='coerce', format='ISO8601')
+    retry = parsed.isna()
+    if retry.any():
+        # Anything pd.to_datetime understands is accepted, the fast ISO pass just goes first
+        retry[retry] = pd.to_datetime(df.loc[retry, col], errors='coerce', format='mixed').isna()
+    return retry
+
+def _fails_vehicle(df: pd.DataFrame, col: str) -> pd.Series:
+    return (df[col] != 'Driver') & ((df['vehicle_id'] != '') | (df['vehicle_reg_no'] != ''))
+
+# (column, rule, message, check) - check(df, column) marks failing rows, in the order errors are reported
+VALIDATION_RULES = [
+    ('cnic', 'cnic_format', "Invalid CNIC: Must be 13 digits.", _fails_pattern(CNIC_PATTERN)),
+    ('phone', 'phone_format', "Invalid Phone: Must be 11 digits.", _fails_pattern(PHONE_PATTERN)),
+    ('area', 'area_value', "Invalid Area: Must be City or Sadar.", lambda df, col: ~df[col].isin(AREAS)),
+    ('pp_sz', 'pp_sz_format', "Invalid PP/SZ format.", _fails_area_pattern),
+    ('cc_uc', 'cc_uc_format', "Invalid CC/UC format.", _fails_area_pattern),
+    ('cc_uc', 'cc_uc_known', "Unknown CC/UC for this area.",
+     lambda df, col: df['area'].isin(AREAS) & ~_fails_area_pattern(df, col) & get_hierarchy().unknown_cc_uc(df)),
+    ('cc_uc', 'hierarchy', "CC/UC does not belong to the selected PP/SZ and Zone.",
+     lambda df, col: get_hierarchy().misplaced(df)),
+    ('role', 'vehicle_driver_only', "Only Drivers can have vehicles.", _fails_vehicle),
+] + [(col, 'date_format', f"Invalid date in {col}.", _fails_date) for col in DATE_COLUMNS]
+
+def validate_frame(df: pd.DataFrame, required=(), columns=None) -> pd.DataFrame:
+    """Run the validation rules over df - one report row per failure, row numbers are df.index + 1.
+    Empty values pass unless their column is in required; columns limits which rules run."""
+    df = _as_stored(df, MASTER_COLUMNS).set_axis(df.index)
+    failures = []
+    for col, rule, message, check in VALIDATION_RULES:
+        if columns is not None and col not in columns:
+            continue
+        empty = df[col] == ''
+        bad = empty if col in required else pd.Series(False, index=df.index)
+        if not empty.all():
+            bad = bad | (~empty & check(df, col))
+        if bad.any():
+            failures.append(pd.DataFrame({'row': df.index[bad] + 1, 'column': col, 'rule': rule,
+                                          'value': df.loc[bad, col], 'message': message}))
+    if not failures:
+        return pd.DataFrame(columns=VALIDATION_REPORT_COLUMNS)
+    return pd.concat(failures, ignore_index=True).sort_values('row', kind='stable', ignore_index=True)
+
+def first_error(report: pd.DataFrame) -> str:
+    return report['message'].iloc[0] if not report.empty else ""
+
+# Single values from the forms - checked against the same patterns without building a frame
+def validate_cnic(cnic: str) -> bool:
+    return re.fullmatch(CNIC_PATTERN, cnic or '') is not None
+
+def validate_phone(phone: str) -> bool:
+    return re.fullmatch(PHONE_PATTERN, phone or '') is not None
+
+def validate_date(date_str: Optional[str]) -> bool:
+    # No ISO pass first - it only pays off on whole columns
+    return not date_str or not pd.isna(pd.to_datetime(date_str, errors='coerce', format='mixed'))
+
+def validate_pp_sz(pp_sz: str, area: str) -> bool:
+    return area in AREAS and re.fullmatch(AREA_PATTERNS['pp_sz'][area], pp_sz or '') is not None
+
+def validate_cc_uc(cc_uc: str, area: str) -> bool:
+    placement = get_hierarchy().placement(cc_uc)
+    return placement is not None and placement[0] == area
+
+def get_supervisor_for_cc_uc(cc_uc: str) -> str:
+    cache = get_data_cache()
+    with cache.lock:
+        return cache.view(MASTER_CSV, SupervisorIndex).supervisor_for(cc_uc)
+
+def get_supervisor_map() -> Dict[str, str]:
+    """cc_uc -> record_id of its active supervisor"""
+    cache = get_data_cache()
+    with cache.lock:
+        return cache.view(MASTER_CSV, SupervisorIndex).supervisor_map()
+
+def is_supervisor_exists(supervisor_id: str) -> bool:
+    if not supervisor_id:
+        return True
+    cache = get_data_cache()
+    with cache.lock:
+        return cache.view(MASTER_CSV, SupervisorIndex).is_active_supervisor(supervisor_id)
+
+def person_ids_of_cnics(cnics: pd.Series) -> pd.Series:
+    """person_id already holding each CNIC (archive included), '' for unknown CNICs - one hash join"""
+    cache = get_data_cache()
+    with cache.lock:
+        return cache.view(MASTER_CSV, CnicIndex).lookup(cnics)
+
+def person_ids_of_records(record_ids: pd.Series) -> pd.Series:
+    """person_id owning each record_id (archive included), '' for record_ids not on file"""
+    cache = get_data_cache()
+    with cache.lock:
+        return cache.view(MASTER_CSV, RecordIdIndex).lookup(record_ids)
+
+def log_action(person_id: str, record_id: str, action: str, field: str, old_value: str, new_value: str, by_user: str, notes: str):
+    log_actions([{
+        'person_id': person_id, 'record_id': record_id, 'action': action, 'field': field,
+        'old_value': old_value, 'new_value': new_value, 'by_user': by_user, 'notes': notes
+    }])
+
+@serialized_write
+def log_actions(entries: List[Dict]):
+    """Write many history entries with consecutive log ids in a single write"""
+    if not entries:
+        return
+    new_logs = pd.DataFrame(entries, columns=HISTORY_COLUMNS).fillna('')
+    new_logs['log_id'] = generate_log_ids(len(new_logs))
+    new_logs['timestamp'] = datetime.datetime.utcnow().isoformat() + 'Z'
+    append_rows(new_logs, HISTORY_CSV)
+
+@serialized_write
+def add_new_worker(form_data: Dict, by_user: str) -> str:
+    # Validate
+    error = first_error(validate_frame(pd.DataFrame([form_data]), required=REQUIRED_COLUMNS))
+    if error:
+        return error
+    
+    # Auto set updated_on
+    updated_on = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    
+    # Auto set supervisor_id
+    if form_data['role'] == 'Supervisor':
+        # Check if already exists
+        if get_supervisor_for_cc_uc(form_data['cc_uc']):
+            return "Already a supervisor for this CC/UC."
+        supervisor_id = ''
+    else:
+        supervisor_id = get_supervisor_for_cc_uc(form_data['cc_uc'])
+        if not supervisor_id:
+            return "No supervisor found for this CC/UC."
+        if not is_supervisor_exists(supervisor_id):
+            return "Supervisor not active."
+    
+    # Check for existing person by CNIC - removed people in the archive keep their person_id too
+    person_id = person_ids_of_cnics(pd.Series([form_data['cnic']])).iloc[0] or generate_person_id()
+    
+    record_id = generate_record_id()
+    new_row = pd.DataFrame({
+        'person_id': [person_id],
+        'record_id': [record_id],
+        'area': [form_data['area']],
+        'pp_sz': [form_data['pp_sz']],
+        'zone': [form_data['zone']],
+        'cc_uc': [form_data['cc_uc']],
+        'role': [form_data['role']],
+        'name': [form_data['name']],
+        'cnic': [form_data['cnic']],
+        'phone': [form_data['phone']],
+        'vehicle_id': [form_data['vehicle_id']],
+        'vehicle_reg_no': [form_data['vehicle_reg_no']],
+        'supervisor_id': [supervisor_id],
+        'status': ['active'],
+        'updated_on': [updated_on],
+        'status_changed_on': [''],
+        'last_transfer_on': [''],
+        'remarks': [form_data['remarks']]
+    })
+    append_rows(new_row, MASTER_CSV)
+    log_action(person_id, record_id, 'add', '', '', '', by_user, form_data['remarks'])
+    return ""
+
+@serialized_write
+def perform_transfer(person_id: str, old_record_id: str, new_data: Dict, by_user: str, notes: str) -> str:
+    master_df = load_cached_df(MASTER_CSV)
+    now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    date_today = datetime.date.today().isoformat()
+    
+    old_row = master_df[(master_df['person_id'] == person_id) & (master_df['record_id'] == old_record_id)].iloc[0]
+    
+    # Validate new data
+    placement = ['area', 'pp_sz', 'cc_uc']
+    error = first_error(validate_frame(pd.DataFrame([new_data]), required=placement, columns=placement))
+    if error:
+        return error
+    
+    # Auto set new supervisor_id based on new cc_uc
+    if old_row['role'] == 'Supervisor':
+        if get_supervisor_for_cc_uc(new_data['cc_uc']) and old_row['cc_uc'] != new_data['cc_uc']:
+            return "Already a supervisor for the new CC/UC."
+        new_supervisor_id = ''
+    else:
+        new_supervisor_id = get_supervisor_for_cc_uc(new_data['cc_uc'])
+        if not new_supervisor_id:
+            return "No supervisor found for the new CC/UC."
+    
+    new_record_id = generate_record_id()
+    new_row = pd.DataFrame({
+        'person_id': [person_id],
+        'record_id': [new_record_id],
+        'area': [new_data['area']],
+        'pp_sz': [new_data['pp_sz']],
+        'zone': [new_data['zone']],
+        'cc_uc': [new_data['cc_uc']],
+        'role': [old_row['role']],
+        'name': [old_row['name']],
+        'cnic': [old_row['cnic']],
+        'phone': [old_row['phone']],
+        'vehicle_id': [old_row['vehicle_id']],
+        'vehicle_reg_no': [old_row['vehicle_reg_no']],
+        'supervisor_id': [new_supervisor_id],
+        'status': ['active'],
+        'updated_on': [now],
+        'status_changed_on': [''],
+        'last_transfer_on': [date_today],
+        'remarks': [f"Transferred from {old_row['cc_uc']}. {notes}"]
+    })
+    append_rows(new_row, MASTER_CSV)
+    entries = [{'person_id': person_id, 'record_id': new_record_id, 'action': 'transfer', 'field': 'cc_uc',
+                'old_value': old_row['cc_uc'], 'new_value': new_data['cc_uc'], 'by_user': by_user, 'notes': notes}]
+    if old_row['pp_sz'] != new_data['pp_sz']:
+        entries.append({'person_id': person_id, 'record_id': new_record_id, 'action': 'transfer', 'field': 'pp_sz',
+                        'old_value': old_row['pp_sz'], 'new_value': new_data['pp_sz'], 'by_user': by_user, 'notes': notes})
+    log_actions(entries)
+    return ""
+
+@serialized_write
+def perform_remove(person_id: str, record_id: str, by_user: str, notes: str):
+    master_df = load_cached_df(MASTER_CSV)
+    now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    date_today = datetime.date.today().isoformat()
+    old_row = master_df[(master_df['person_id'] == person_id) & (master_df['record_id'] == record_id)].iloc[0]
+    new_record_id = generate_record_id()
+    new_row = old_row.copy()
+    new_row['status'] = 'removed'
+    new_row['status_changed_on'] = date_today
+    new_row['updated_on'] = now
+    new_row['remarks'] = notes
+    new_row['record_id'] = new_record_id
+    append_rows(pd.DataFrame([new_row]), MASTER_CSV)
+    log_action(person_id, new_record_id, 'remove', 'status', 'active', 'removed', by_user, notes)
+
+@serialized_write
+def perform_edit(person_id: str, record_id: str, field: str, new_value: str, by_user: str, notes: str) -> str:
+    master_df = load_cached_df(MASTER_CSV)
+    now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    old_row = master_df[(master_df['person_id'] == person_id) & (master_df['record_id'] == record_id)].iloc[0]
+    old_value = old_row[field]
+    if old_value == new_value:
+        return "No change in value."
+    new_row = old_row.copy()
+    new_row[field] = new_value
+    # Only the edited field is checked - older rows may not meet every rule
+    required = [field] if field in REQUIRED_COLUMNS else []
+    error = first_error(validate_frame(pd.DataFrame([new_row]), required=required, columns=[field]))
+    if error:
+        return error
+    new_record_id = generate_record_id()
+    new_row['updated_on'] = now
+    new_row['remarks'] = f"Edited {field} from {old_value} to {new_value}. {notes}"
+    new_row['record_id'] = new_record_id
+    append_rows(pd.DataFrame([new_row]), MASTER_CSV)
+    log_action(person_id, new_record_id, 'edit', field, old_value, new_value, by_user, notes)
+    return ""
+
+# Bulk transfer / status change - one validation pass, one master append and one history write per batch
+STATUSES = ['active', 'removed']
+BULK_SKIP_COLUMNS = ['person_id', 'reason']
+
+def latest_people(person_ids) -> pd.DataFrame:
+    """Latest record of each person on file - removed people included, archived or not"""
+    rows = get_data_cache().latest_records(person_ids)
+    missing = sorted(set(person_ids) - set(rows['person_id']) - {''})
+    if missing:
+        # Removed people whose records are all archived
+        cold = DataCache._parse(MASTER_CSV, get_archive().load('person_id', missing))
+        cold = cold.loc[CurrentRecordView._order(cold).drop_duplicates('person_id', keep='last').index]
+        rows = _concat_typed([rows, cold], ignore_index=True)
+    return rows
+
+def _bulk_people(person_ids) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Latest record of each requested person in request order, archived people included,
+    plus a skip report for ids not found"""
+    ids = pd.Series(list(person_ids), dtype=str).str.strip()
+    ids = ids[ids != ''].drop_duplicates().tolist()
+    rows = latest_people(ids)
+    order = pd.Index(ids).get_indexer(rows['person_id'])
+    rows = rows.iloc[np.argsort(order, kind='stable')].reset_index(drop=True)
+    found = set(rows['person_id'])
+    unknown = [person_id for person_id in ids if person_id not in found]
+    return rows, pd.DataFrame({'person_id': unknown, 'reason': "No records found for this Person ID."}, columns=BULK_SKIP_COLUMNS)
+
+def _skip(reasons: pd.Series, mask: pd.Series, reason: str):
+    # First reason found for a person is the one reported
+    reasons[mask & (reasons == '')] = reason
+
+def _bulk_result(rows: pd.DataFrame, reasons: pd.Series, skipped: pd.DataFrame) -> pd.DataFrame:
+    return pd.concat([skipped, pd.DataFrame({'person_id': rows.loc[reasons != '', 'person_id'], 'reason': reasons[reasons != '']})],
+                     ignore_index=True)
+
+def _new_versions(rows: pd.DataFrame, now: str) -> pd.DataFrame:
+    new_rows = _as_stored(rows, MASTER_COLUMNS)
+    new_rows['record_id'] = generate_record_ids(len(new_rows))
+    new_rows['updated_on'] = now
+    return new_rows
+
+@serialized_write
+def perform_bulk_transfer(person_ids: List[str], new_data: Dict, by_user: str, notes: str) -> Tuple[str, pd.DataFrame]:
+    """Transfer many people to one CC/UC - returns (error, skipped people with the reason)"""
+    now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    date_today = datetime.date.today().isoformat()
+    placement = ['area', 'pp_sz', 'cc_uc']
+    error = first_error(validate_frame(pd.DataFrame([new_data]), required=placement, columns=placement))
+    if error:
+        return error, pd.DataFrame(columns=BULK_SKIP_COLUMNS)
+
+    with timed('bulk_transfer', len(person_ids)):
+        rows, skipped = _bulk_people(person_ids)
+        reasons = pd.Series('', index=rows.index)
+        _skip(reasons, rows['status'] != 'active', "No active record for this person.")
+        _skip(reasons, rows['cc_uc'] == new_data['cc_uc'], "Already at this CC/UC.")
+        # Supervisor resolved once - with none at the target, the first supervisor in the batch takes the CC/UC
+        supervisor_id = get_supervisor_for_cc_uc(new_data['cc_uc'])
+        supervisors = (rows['role'] == 'Supervisor') & (reasons == '')
+        _skip(reasons, supervisors & (bool(supervisor_id) | (supervisors.cumsum() > 1)), "Already a supervisor for the new CC/UC.")
+        incoming = (rows['role'] == 'Supervisor') & (reasons == '')
+        if not supervisor_id and not incoming.any():
+            _skip(reasons, rows['role'] != 'Supervisor', "No supervisor found for the new CC/UC.")
+        skipped = _bulk_result(rows, reasons, skipped)
+        moving = rows[reasons == '']
+        if moving.empty:
+            return "Nobody in the selection can be transferred.", skipped
+
+        new_rows = _new_versions(moving, now)
+        if incoming.any():
+            supervisor_id = new_rows.loc[incoming[reasons == ''].to_numpy(), 'record_id'].iloc[0]
+        new_rows['supervisor_id'] = np.where(new_rows['role'] == 'Supervisor', '', supervisor_id)
+        for col in ['area', 'pp_sz', 'zone', 'cc_uc']:
+            new_rows[col] = new_data[col]
+        new_rows['status'] = 'active'
+        new_rows['status_changed_on'] = ''
+        new_rows['last_transfer_on'] = date_today
+        new_rows['remarks'] = ("Transferred from " + moving['cc_uc'].astype(str) + f". {notes}").to_numpy()
+        append_rows(new_rows, MASTER_CSV)
+
+        old = _as_stored(moving, MASTER_COLUMNS)
+        entries = [{'person_id': person_id, 'record_id': record_id, 'action': 'transfer', 'field': 'cc_uc',
+                    'old_value': old_value, 'new_value': new_data['cc_uc'], 'by_user': by_user, 'notes': notes}
+                   for person_id, record_id, old_value in zip(new_rows['person_id'], new_rows['record_id'], old['cc_uc'])]
+        entries += [{'person_id': person_id, 'record_id': record_id, 'action': 'transfer', 'field': 'pp_sz',
+                     'old_value': old_value, 'new_value': new_data['pp_sz'], 'by_user': by_user, 'notes': notes}
+                    for person_id, record_id, old_value in zip(new_rows['person_id'], new_rows['record_id'], old['pp_sz'])
+                    if old_value != new_data['pp_sz']]
+        log_actions(entries)
+    return "", skipped
+
+@serialized_write
+def perform_bulk_status(person_ids: List[str], status: str, by_user: str, notes: str) -> Tuple[str, pd.DataFrame]:
+    """Remove or reactivate many people - returns (error, skipped people with the reason)"""
+    now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    date_today = datetime.date.today().isoformat()
+    if status not in STATUSES:
+        return f"Invalid Status: Must be one of {', '.join(STATUSES)}.", pd.DataFrame(columns=BULK_SKIP_COLUMNS)
+
+    with timed('bulk_status', len(person_ids)):
+        rows, skipped = _bulk_people(person_ids)
+        reasons = pd.Series('', index=rows.index)
+        _skip(reasons, rows['status'] == status, f"Already {status}.")
+        supervisor_ids = pd.Series('', index=rows.index)
+        if status == 'active':
+            # Coming back - supervisors resolved once for every CC/UC, one supervisor per CC/UC
+            sup_map = get_supervisor_map()
+            supervisors = (rows['role'] == 'Supervisor') & (reasons == '')
+            _skip(reasons, supervisors & (rows['cc_uc'].isin(sup_map.keys()) | rows['cc_uc'].where(supervisors).duplicated()),
+                  "Already a supervisor for this CC/UC.")
+            supervisor_ids = rows['cc_uc'].astype(str).map(sup_map).fillna('')
+            _skip(reasons, (rows['role'] != 'Supervisor') & (supervisor_ids == ''), "No supervisor found for this CC/UC.")
+        skipped = _bulk_result(rows, reasons, skipped)
+        changing = rows[reasons == '']
+        if changing.empty:
+            return f"Nobody in the selection can be set to {status}.", skipped
+
+        new_rows = _new_versions(changing, now)
+        if status == 'active':
+            new_rows['supervisor_id'] = supervisor_ids[reasons == ''].to_numpy()
+        old_status = _as_stored(changing, MASTER_COLUMNS)['status']
+        new_rows['status'] = status
+        new_rows['status_changed_on'] = date_today
+        new_rows['remarks'] = notes
+        append_rows(new_rows, MASTER_CSV)
+        action = 'remove' if status == 'removed' else 'status'
+        log_actions([{'person_id': person_id, 'record_id': record_id, 'action': action, 'field': 'status',
+                      'old_value': old_value, 'new_value': status, 'by_user': by_user, 'notes': notes}
+                     for person_id, record_id, old_value in zip(new_rows['person_id'], new_rows['record_id'], old_status)])
+    return "", skipped
+# YEH NAYA FUNCTION ADD KAREIN - LINE 400 KE AAS-PAAS
+@serialized_write
+def remove_all_data(confirmation_code: str, by_user: str) -> str:
+    """Remove all data with confirmation code"""
+    if confirmation_code != "REX9797":
+        return "Invalid confirmation code. Data deletion aborted."
+    
+    try:
+        # Clear master (only keep header)
+        reset_data_file(MASTER_CSV)
+        
+        # Clear history (only keep header)
+        reset_data_file(HISTORY_CSV)
+
+        # Archived records and roster snapshots too
+        get_archive().clear()
+        get_snapshots().drop_after()
+        
+        # Log the action
+        log_action('SYSTEM', 'SYSTEM', 'remove_all', 'all_data', 'all', 'empty', by_user, 'All data removed by admin')
+        
+        # Sync to GitHub
+        get_git_sync_worker().request(MASTER_CSV)
+        
+        return "All data has been successfully removed. System reset to initial state."
+    except Exception as e:
+        return f"Error removing data: {str(e)}"
+        
+# Bulk upload - read, validate and stage fixed-size batches, then commit the staged rows batch by batch
+UPLOAD_BATCH_ROWS = 5000
+
+def _cell_text(value) -> str:
+    """Excel cell as text, the way pd.read_excel(dtype=str) gives it"""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def iter_upload_batches(uploaded_file, batch_rows: int = UPLOAD_BATCH_ROWS) -> Iterator[Tuple[pd.DataFrame, float]]:
+    """Uploaded CSV / XLSX as (batch, fraction of the file read) - batch index is the 0-based data row"""
+    if uploaded_file.name.endswith('.csv'):
+        size = max(1, uploaded_file.seek(0, os.SEEK_END))
+        uploaded_file.seek(0)
+        with pd.read_csv(uploaded_file, dtype=str, keep_default_na=False, chunksize=batch_rows) as reader:
+            for batch in reader:
+                yield batch, min(1.0, uploaded_file.tell() / size)
+    elif uploaded_file.name.endswith('.xlsx'):
+        import openpyxl  # only when someone uploads xlsx
+        # read_only streams the sheet XML instead of building every cell object up front
+        workbook = openpyxl.load_workbook(uploaded_file, read_only=True, data_only=True)
+        try:
+            sheet = workbook.active
+            total = max(1, (sheet.max_row or 1) - 1)
+            rows = sheet.iter_rows(values_only=True)
+            header = [_cell_text(h) or f'Unnamed: {i}' for i, h in enumerate(next(rows, ()))]
+            batch, positions = [], []
+            for position, row in enumerate(rows):
+                if all(value is None for value in row):
+                    continue
+                batch.append([_cell_text(value) for value in row[:len(header)]])
+                positions.append(position)
+                if len(batch) == batch_rows:
+                    yield pd.DataFrame(batch, columns=header, index=positions), min(1.0, (position + 1) / total)
+                    batch, positions = [], []
+            if batch:
+                yield pd.DataFrame(batch, columns=header, index=positions), 1.0
+        finally:
+            workbook.close()
+    else:
+        raise ValueError("Unsupported file type. Only CSV and XLSX allowed.")
+
+def stage_bulk_rows(upload_df: pd.DataFrame, timings: Optional[Dict] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Normalize, fill defaults and validate one batch - the report numbers rows by the batch index"""
+    if timings is None:
+        timings = {}
+
+    t0 = time.perf_counter()
+    upload_df = upload_df.fillna('').astype(str)
+    # Add missing columns with empty values
+    upload_df = upload_df.reindex(columns=MASTER_COLUMNS, fill_value='')
+    timings['normalize'] = timings.get('normalize', 0.0) + time.perf_counter() - t0
+
+    # Defaults - updated_on to current time, remarks "Bulk upload", status active
+    t0 = time.perf_counter()
+    current_time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    upload_df.loc[upload_df['updated_on'] == '', 'updated_on'] = current_time
+    upload_df.loc[upload_df['remarks'] == '', 'remarks'] = 'Bulk upload'
+    upload_df.loc[upload_df['status'] == '', 'status'] = 'active'
+    timings['defaults'] = timings.get('defaults', 0.0) + time.perf_counter() - t0
+
+    # Validations (empty values are allowed) - reported, the rows are still stored
+    t0 = time.perf_counter()
+    report = validate_frame(upload_df)
+    timings['validate'] = timings.get('validate', 0.0) + time.perf_counter() - t0
+    return upload_df, report
+
+def allocate_bulk_rows(upload_df: pd.DataFrame, master_df: pd.DataFrame, uploaded_sups: Dict[str, str],
+                       timings: Optional[Dict] = None) -> pd.DataFrame:
+    """Person / record ids and supervisors for one staged batch - call on the writer thread"""
+    if timings is None:
+        timings = {}
+    upload_df = upload_df.reset_index(drop=True)
+
+    # One block of ids for all rows that need them
+    t0 = time.perf_counter()
+    missing_pid = upload_df['person_id'] == ''
+    if missing_pid.any():
+        existing = pd.concat([master_df.get('person_id', pd.Series(dtype=str)), get_archive().column_values('person_id'),
+                              upload_df['person_id']])
+        # Rows sharing a CNIC are one person, rows without a CNIC are a person each
+        cnic = upload_df.loc[missing_pid, 'cnic']
+        codes, uniques = pd.factorize(cnic.where(cnic != '', '#' + cnic.index.astype(str)))
+        new_ids = np.array(generate_person_ids(len(uniques), existing), dtype=object)
+        upload_df.loc[missing_pid, 'person_id'] = new_ids[codes]
+    missing_rid = upload_df['record_id'] == ''
+    # Ids given in the file are taken - new ones start above them
+    get_sequence_allocator().observe('record_id', max_record_number(upload_df))
+    if missing_rid.any():
+        upload_df.loc[missing_rid, 'record_id'] = generate_record_ids(int(missing_rid.sum()))
+    timings['allocate_ids'] = timings.get('allocate_ids', 0.0) + time.perf_counter() - t0
+
+    # Supervisor per CC/UC - master index plus supervisors in this same upload
+    t0 = time.perf_counter()
+    new_sups = upload_df[(upload_df['role'] == 'Supervisor') & (upload_df['status'] == 'active')]
+    uploaded_sups.update(zip(new_sups['cc_uc'], new_sups['record_id']))
+    needs_sup = (upload_df['supervisor_id'] == '') & (upload_df['role'] != 'Supervisor')
+    if needs_sup.any():
+        sup_map = {**get_supervisor_map(), **uploaded_sups}
+        upload_df.loc[needs_sup, 'supervisor_id'] = upload_df.loc[needs_sup, 'cc_uc'].map(sup_map).fillna('')
+    timings['supervisors'] = timings.get('supervisors', 0.0) + time.perf_counter() - t0
+    return upload_df
+
+# Upload rows against the people already on file - columns compared with the person's latest record, removed or not
+DIFF_COLUMNS = ['area', 'pp_sz', 'zone', 'cc_uc', 'role', 'name', 'cnic', 'phone', 'vehicle_id', 'vehicle_reg_no', 'status']
+UPLOAD_DIFF_COLUMNS = ['row', 'person_id', 'name', 'cnic', 'change', 'fields']
+UPLOAD_CHANGES = ['new', 'changed', 'unchanged', 'conflict']
+
+def match_upload_people(upload_df: pd.DataFrame) -> pd.DataFrame:
+    """Blank person_ids filled from the CNIC index - CNICs nobody holds yet stay blank"""
+    blank = upload_df['person_id'] == ''
+    if blank.any():
+        upload_df.loc[blank, 'person_id'] = person_ids_of_cnics(upload_df.loc[blank, 'cnic']).to_numpy()
+    return upload_df
+
+def _cnic_clash(upload_df: pd.DataFrame) -> pd.Series:
+    """Rows whose person_id is not the person already holding their CNIC"""
+    owner = person_ids_of_cnics(upload_df['cnic'])
+    return (upload_df['person_id'] != '') & (owner != '') & (owner != upload_df['person_id'])
+
+def check_upload_cnics(upload_df: pd.DataFrame, seen: set) -> pd.DataFrame:
+    """CNIC conflicts as validation report rows - a CNIC repeated in the upload (seen holds the earlier batches'),
+    or a row whose person_id differs from the person holding its CNIC"""
+    cnic = upload_df['cnic']
+    filled = cnic != ''
+    repeated = filled & (cnic.duplicated() | cnic.isin(seen))
+    clash = _cnic_clash(upload_df)
+    seen.update(cnic[filled])
+    failures = [pd.DataFrame({'row': upload_df.index[bad] + 1, 'column': 'cnic', 'rule': rule, 'value': cnic[bad], 'message': message})
+                for bad, rule, message in ((repeated, 'cnic_duplicate', "CNIC appears more than once in the upload."),
+                                           (clash, 'cnic_conflict', "CNIC belongs to another person - the row is not stored."))
+                if bad.any()]
+    if not failures:
+        return pd.DataFrame(columns=VALIDATION_REPORT_COLUMNS)
+    return pd.concat(failures, ignore_index=True)
+
+def _record_clash(upload_df: pd.DataFrame, exists: pd.Series) -> pd.Series:
+    """Rows of new people carrying a record_id already on file, or one an earlier row of the batch carries.
+    People on file get a fresh record_id anyway"""
+    record_id = upload_df['record_id'].where(~exists & (upload_df['record_id'] != ''))
+    taken = person_ids_of_records(record_id.fillna('')) != ''
+    return record_id.notna() & (taken | record_id.duplicated())
+
+def check_upload_records(upload_df: pd.DataFrame, exists: pd.Series, seen: set) -> pd.Series:
+    """Rows of new people whose record_id is already on file or repeated in the upload (seen holds the earlier batches')"""
+    record_id = upload_df['record_id']
+    new = ~exists & (record_id != '')
+    clash = _record_clash(upload_df, exists) | (new & record_id.isin(seen))
+    seen.update(record_id[new])
+    return clash
+
+def _compare_with_latest(upload_df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """(latest values, differs) of DIFF_COLUMNS per upload row - latest values are NaN for people not on file"""
+    latest = latest_people(upload_df['person_id'].unique())
+    old = _as_stored(latest, MASTER_COLUMNS).set_index('person_id')[DIFF_COLUMNS].reindex(upload_df['person_id'])
+    old.index = upload_df.index
+    return old, upload_df[DIFF_COLUMNS].ne(old)
+
+def _changes(upload_df: pd.DataFrame, old: pd.DataFrame, differs: pd.DataFrame) -> pd.DataFrame:
+    exists = old['status'].notna()
+    change = np.select([_cnic_clash(upload_df) | _record_clash(upload_df, exists), ~exists, differs.any(axis=1)],
+                       ['conflict', 'new', 'changed'], 'unchanged')
+    fields = differs.astype(object).dot(pd.Series([f'{col}, ' for col in DIFF_COLUMNS], index=DIFF_COLUMNS)).str.rstrip(', ')
+    return pd.DataFrame({'change': change, 'fields': fields.where(change == 'changed', '')}, index=old.index)
+
+def preview_bulk_upload(uploaded_file, timings: Optional[Dict] = None, on_progress=None,
+                        batch_rows: int = UPLOAD_BATCH_ROWS) -> Dict:
+    """Read, validate and diff the file batch by batch - nothing is stored yet.
+    Returns {'error', 'report', 'diff', 'rows', 'staging'}; confirm_bulk_upload stores it, discard_bulk_upload drops it"""
+    if timings is None:
+        timings = {}
+    if on_progress is None:
+        on_progress = lambda fraction, text: None
+    reports = [pd.DataFrame(columns=VALIDATION_REPORT_COLUMNS)]
+    diffs = [pd.DataFrame(columns=UPLOAD_DIFF_COLUMNS)]
+    preview = {'error': '', 'rows': 0, 'staging': tempfile.TemporaryFile('w+', encoding='utf-8', newline='')}
+    try:
+        t0 = time.perf_counter()
+        seen_cnics, seen_records = set(), set()
+        for batch, fraction in iter_upload_batches(uploaded_file, batch_rows):
+            batch, report = stage_bulk_rows(batch, timings)
+            batch.to_csv(preview['staging'], index=False, header=preview['rows'] == 0, lineterminator='\n')
+            t1 = time.perf_counter()
+            report = pd.concat([report, check_upload_cnics(batch, seen_cnics)], ignore_index=True)
+            if not report.empty:
+                reports.append(report.sort_values('row', kind='stable'))
+            # Staged as uploaded - the commit matches people again against the master of that moment
+            matched = match_upload_people(batch.copy())
+            old, differs = _compare_with_latest(matched)
+            diff = _changes(matched, old, differs)
+            clash = check_upload_records(matched, old['status'].notna(), seen_records)
+            if clash.any():
+                diff.loc[clash, ['change', 'fields']] = ['conflict', '']
+                reports.append(pd.DataFrame({'row': batch.index[clash] + 1, 'column': 'record_id', 'rule': 'record_conflict',
+                                             'value': matched.loc[clash, 'record_id'],
+                                             'message': "record_id is already taken - the row is not stored."}))
+            diffs.append(pd.concat([pd.DataFrame({'row': batch.index + 1}, index=batch.index),
+                                    matched[['person_id', 'name', 'cnic']], diff], axis=1))
+            timings['diff'] = timings.get('diff', 0.0) + time.perf_counter() - t1
+            preview['rows'] += len(batch)
+            on_progress(fraction, f"Checked {preview['rows']} rows")
+        timings['read'] = time.perf_counter() - t0
+        if preview['rows'] == 0:
+            preview['error'] = "The uploaded file has no rows."
+    except Exception as e:
+        preview['error'] = f"Error: {str(e)}"
+    preview['report'] = pd.concat(reports, ignore_index=True)
+    preview['diff'] = pd.concat(diffs, ignore_index=True)
+    if preview['error']:
+        discard_bulk_upload(preview)
+    return preview
+
+def discard_bulk_upload(preview: Dict):
+    preview['staging'].close()
+
+def _staged_batches(staging, batch_rows: int) -> Iterator[pd.DataFrame]:
+    staging.seek(0)
+    with pd.read_csv(staging, dtype=str, keep_default_na=False, chunksize=batch_rows) as reader:
+        yield from reader
+
+@serialized_write
+def commit_bulk_upload(staging, by_user: str, timings: Optional[Dict] = None, progress: Optional[Dict] = None,
+                       batch_rows: int = UPLOAD_BATCH_ROWS) -> Dict:
+    """Store the rows staged by preview_bulk_upload, one batch at a time - unchanged and conflicting rows are not stored.
+    Returns the number of rows of each kind in UPLOAD_CHANGES"""
+    if timings is None:
+        timings = {}
+    if progress is None:
+        progress = {}
+    progress['committed'] = 0
+    counts = dict.fromkeys(UPLOAD_CHANGES, 0)
+    uploaded_sups = {}
+    # Supervisors first, so workers anywhere in the file can be assigned to them
+    for supervisors in (True, False):
+        for batch in _staged_batches(staging, batch_rows):
+            batch = batch[(batch['role'] == 'Supervisor') == supervisors]
+            if batch.empty:
+                continue
+
+            # Diffed again here - the master may have changed since the preview, and earlier batches are in it now
+            t0 = time.perf_counter()
+            batch = match_upload_people(batch.copy())
+            old, differs = _compare_with_latest(batch)
+            change = _changes(batch, old, differs)['change']
+            for name, n in change.value_counts().items():
+                counts[name] += int(n)
+            keep = change.isin(['new', 'changed']).to_numpy()
+            progress['committed'] += int((~keep).sum())
+            batch, old, differs, change = (frame[keep].reset_index(drop=True) for frame in (batch, old, differs, change))
+            # A person on file (removed or archived too) gets a new version with a fresh record_id and the commit time,
+            # even if the file carries older ones - a re-uploaded export would otherwise store a record_id twice
+            # and sort behind edits made since
+            known = change == 'changed'
+            batch.loc[known, 'record_id'] = ''
+            batch.loc[known, 'updated_on'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            timings['diff'] = timings.get('diff', 0.0) + time.perf_counter() - t0
+            if batch.empty:
+                continue
+            batch = allocate_bulk_rows(batch, load_cached_df(MASTER_CSV), uploaded_sups, timings)
+
+            t0 = time.perf_counter()
+            append_rows(batch, MASTER_CSV)
+            _flush_pending(MASTER_CSV)
+            timings['write_master'] = timings.get('write_master', 0.0) + time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            added = batch[change == 'new']
+            entries = [{'person_id': person_id, 'record_id': record_id, 'action': 'add', 'by_user': by_user, 'notes': 'Bulk upload'}
+                       for person_id, record_id in zip(added['person_id'], added['record_id'])]
+            edited = differs & (change == 'changed').to_numpy()[:, None]
+            for col in DIFF_COLUMNS:
+                rows = edited[col].to_numpy()
+                entries += [{'person_id': person_id, 'record_id': record_id, 'action': 'edit', 'field': col, 'old_value': old_value,
+                             'new_value': new_value, 'by_user': by_user, 'notes': 'Bulk upload'}
+                            for person_id, record_id, old_value, new_value
+                            in zip(batch.loc[rows, 'person_id'], batch.loc[rows, 'record_id'], old.loc[rows, col], batch.loc[rows, col])]
+            log_actions(entries)
+            _flush_pending(HISTORY_CSV)
+            timings['write_history'] = timings.get('write_history', 0.0) + time.perf_counter() - t0
+            progress['committed'] += len(batch)
+    return counts
+
+def confirm_bulk_upload(preview: Dict, by_user: str, timings: Optional[Dict] = None, on_progress=None,
+                        batch_rows: int = UPLOAD_BATCH_ROWS) -> Tuple[str, Dict]:
+    """Store a previewed upload - returns (error, number of rows of each kind in UPLOAD_CHANGES)"""
+    if timings is None:
+        timings = {}
+    if on_progress is None:
+        on_progress = lambda fraction, text: None
+    counts = dict.fromkeys(UPLOAD_CHANGES, 0)
+    try:
+        # Reading and validation happened in the preview, only the commit waits for the writer thread
+        t0 = time.perf_counter()
+        staged = preview['rows']
+        progress = {'committed': 0}
+        future = get_write_queue().submit(commit_bulk_upload, preview['staging'], by_user, timings, progress, batch_rows)
+        while not wait([future], timeout=0.25).done:
+            on_progress(progress['committed'] / staged, f"Saved {progress['committed']} of {staged} rows")
+        counts = future.result()
+        timings['commit'] = time.perf_counter() - t0
+        on_progress(1.0, f"Saved {staged} rows")
+        return "", counts
+    except Exception as e:
+        return f"Error: {str(e)}", counts
+    finally:
+        discard_bulk_upload(preview)
+
+def perform_bulk_upload(uploaded_file, by_user: str, timings: Optional[Dict] = None, on_progress=None,
+                        batch_rows: int = UPLOAD_BATCH_ROWS) -> Tuple[str, pd.DataFrame]:
+    """Preview and store in one go - returns (error, validation report). on_progress(fraction, text) reports both phases"""
+    if on_progress is None:
+        on_progress = lambda fraction, text: None
+    preview = preview_bulk_upload(uploaded_file, timings, lambda fraction, text: on_progress(0.5 * fraction, text), batch_rows)
+    if preview['error']:
+        return preview['error'], preview['report']
+    error, _ = confirm_bulk_upload(preview, by_user, timings, lambda fraction, text: on_progress(0.5 + 0.5 * fraction, text), batch_rows)
+    return error, preview['report']
+
+# Authentication - parsed credentials are kept until credentials.yaml changes on disk
+_credentials = {}
+_credentials_lock = threading.Lock()
+
+def load_credentials() -> Dict:
+    ensure_bootstrap()
+    stat = os.stat(CREDENTIALS_YAML)
+    key = (stat.st_mtime_ns, stat.st_size)
+    with _credentials_lock:
+        if _credentials.get('key') != key:
+            with open(CREDENTIALS_YAML, 'r') as f:
+                _credentials.update(key=key, creds=yaml.safe_load(f))
+        return _credentials['creds']
+
+def check_password(password: str, hashed: str) -> bool:
+    import bcrypt  # only needed here and for the default credentials
+    with timed('bcrypt_check'):
+        return bcrypt.checkpw(password.encode(), hashed.encode())
@@ -1,538 +1,20 @@
-import os
-import sys
-import subprocess
-from typing import Optional, Dict
 import datetime
-import uuid
-import tempfile
-import shutil
 
-# Now import the packages
 import streamlit as st
-import pandas as pd
-import yaml
-import bcrypt
-from streamlit.runtime.scriptrunner import get_script_run_ctx
 
-# Setup paths - GitHub repository ke andar hi files store hongi
-SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-MASTER_CSV = os.path.join(SCRIPT_DIR, 'master.csv')
-HISTORY_CSV = os.path.join(SCRIPT_DIR, 'history.csv')
-CREDENTIALS_YAML = os.path.join(SCRIPT_DIR, 'credentials.yaml')
-SAMPLE_MASTER = os.path.join(SCRIPT_DIR, 'sample_master.csv')
-MASTER_TEMPLATE = os.path.join(SCRIPT_DIR, 'master_template.csv')
-HISTORY_TEMPLATE = os.path.join(SCRIPT_DIR, 'history_template.csv')
-
-# Data sync function - GitHub mein automatically commit karega
-def sync_data_to_github():
-    """Auto-commit data changes to GitHub"""
-    try:
-        # Git commands to auto-commit data changes
-        subprocess.run(['git', 'add', 'master.csv', 'history.csv'], cwd=SCRIPT_DIR, capture_output=True)
-        subprocess.run(['git', 'commit', '-m', f'Auto-update data {datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}'], 
-                      cwd=SCRIPT_DIR, capture_output=True)
-        subprocess.run(['git', 'push'], cwd=SCRIPT_DIR, capture_output=True)
-    except Exception as e:
-        print(f"GitHub sync warning: {e}")
-
-# Create files if they don't exist - FIXED DOUBLE HEADER
-def create_file_if_not_exists(file_path: str, content: str):
-    if not os.path.exists(file_path):
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(content)
-
-# Master CSV header (SINGLE HEADER)
-MASTER_HEADER = 'person_id,record_id,area,pp_sz,zone,cc_uc,role,name,cnic,phone,vehicle_id,vehicle_reg_no,supervisor_id,status,updated_on,status_changed_on,last_transfer_on,remarks\n'
-
-# History CSV header (SINGLE HEADER)  
-HISTORY_HEADER = 'log_id,person_id,record_id,action,field,old_value,new_value,by_user,timestamp,notes\n'
-
-# Create files if not exists - WITH SINGLE HEADER
-create_file_if_not_exists(MASTER_CSV, MASTER_HEADER)
-create_file_if_not_exists(HISTORY_CSV, HISTORY_HEADER)
-
-# Create credentials.yaml if not exists
-if not os.path.exists(CREDENTIALS_YAML):
-    default_creds = {
-        'users': {
-            'admin': {'password': bcrypt.hashpw('adminpass'.encode(), bcrypt.gensalt()).decode(), 'role': 'admin'},
-            'user': {'password': bcrypt.hashpw('userpass'.encode(), bcrypt.gensalt()).decode(), 'role': 'user'},
-            'arslan': {'password': bcrypt.hashpw('ArslanPass123'.encode(), bcrypt.gensalt()).decode(), 'role': 'admin'},
-            'ali': {'password': bcrypt.hashpw('AliPass456'.encode(), bcrypt.gensalt()).decode(), 'role': 'admin'},
-            'babar': {'password': bcrypt.hashpw('BabarPass789'.encode(), bcrypt.gensalt()).decode(), 'role': 'admin'}
-        }
-    }
-    with open(CREDENTIALS_YAML, 'w') as f:
-        yaml.dump(default_creds, f)
-
-# Create sample_master.csv - FIXED DOUBLE HEADER
-SAMPLE_CONTENT = """P001,W001,City,PP-110,Zone-01,CC-001,Sanitary Worker,Bilal Ahmed,3520212345671,03001234567,,,W010,active,2025-11-01 00:00:00,,,
-P002,W002,City,PP-110,Zone-01,CC-001,Driver,Kamran Ali,3520298765439,03007654321,V-005,LEB1234,W010,active,2025-10-15 00:00:00,,,
-P002,W003,City,PP-111,Zone-02,CC-005,Driver,Kamran Ali,3520298765439,03007654321,V-005,LEB1234,W020,active,2025-11-04 00:00:00,,,Transferred from CC-001
-P003,W004,Sadar,SZ-06,Z-09,UC-140,Supervisor,Imran Khan,3520176543219,03001112222,,,,active,2025-11-05 00:00:00,,,
-P004,W005,City,PP-110,Zone-01,CC-001,Cleaner,Ahmed Khan,3520212345672,03001234568,,,W010,active,2025-11-06 00:00:00,,,
-P005,W006,Sadar,SZ-01,Z-01,UC-131,Driver,Ali Raza,3520298765440,03007654322,V-001,LEA1234,W011,active,2025-11-07 00:00:00,,,
-"""
-# SINGLE HEADER - sirf data content
-create_file_if_not_exists(SAMPLE_MASTER, MASTER_HEADER + SAMPLE_CONTENT)
-
-# Create templates - SINGLE HEADER
-create_file_if_not_exists(MASTER_TEMPLATE, MASTER_HEADER)
-create_file_if_not_exists(HISTORY_TEMPLATE, HISTORY_HEADER)
-
-# City data for dynamic selections
-city_data = {
-    'PP-110': {
-        'zones': ['Zone-01', 'Zone-02', 'ZONE-03', 'Zone-04', 'Zone-05', 'Road Wing'],
-        'zone_to_cc': {
-            'Zone-01': ['CC-136', 'CC-137', 'CC-144', 'CC-145'],
-            'Zone-02': ['CC-134', 'CC-143', 'CC-146', 'CC-147'],
-            'ZONE-03': ['CC-133', 'CC-135', 'CC-148', 'CC-149'],
-            'Zone-04': ['CC-006', 'CC-138', 'CC-139', 'CC-140'],
-            'Zone-05': ['CC-141', 'CC-142', 'CC-152', 'CC-150'],
-            'Road Wing': ['RW-1']
-        }
-    },
-    'PP-111': {
-        'zones': ['Zone-06', 'Zone-07', 'Night', 'Zone-08', 'Zone-09', 'Zone-10', 'Zone-11', 'Road Wing'],
-        'zone_to_cc': {
-            'Zone-06': ['CC-151', 'CC-153', 'CC-154', 'CC-156'],
-            'Zone-07': ['CC-001A', 'CC-001B', 'CC-003', 'CC-157'],
-            'Night': ['CC-001 (Night)'],
-            'Zone-08': ['CC-002', 'CC-020', 'CC-021', 'CC-029'],
-            'Zone-09': ['CC-024', 'CC-025', 'CC-026', 'CC-027'],
-            'Zone-10': ['CC-022', 'CC-030', 'CC-051', 'CC-052'],
-            'Zone-11': ['CC-121', 'CC-122', 'CC-123', 'CC-124', 'CC-155'],
-            'Road Wing': ['RW-02', 'RW-03']
-        }
-    },
-    'PP-112': {
-        'zones': ['Zone-12', 'Zone-13', 'Zone-14', 'Zone-15', 'Road Wing'],
-        'zone_to_cc': {
-            'Zone-12': ['CC-126', 'CC-130', 'CC-131', 'CC-132'],
-            'Zone-13': ['CC-125', 'CC-127', 'CC-128', 'CC-129'],
-            'Zone-14': ['CC-117', 'CC-118', 'CC-119', 'CC-120'],
-            'Zone-15': ['CC-112', 'CC-113', 'CC-114', 'CC-115', 'CC-116'],
-            'Road Wing': ['RW-4', 'RW-5']
-        }
-    },
-    'PP-113': {
-        'zones': ['Zone-16', 'Zone-17', 'Zone-18', 'Zone-19', 'Zone-20', 'Zone-21', 'Road Wing'],
-        'zone_to_cc': {
-            'Zone-16': ['CC-108', 'CC-109', 'CC-110', 'CC-111'],
-            'Zone-17': ['CC-104', 'CC-105', 'CC-106', 'CC-107'],
-            'Zone-18': ['CC-101', 'CC-102', 'CC-103'],
-            'Zone-19': ['CC-095', 'CC-096', 'CC-097', 'CC-100', 'CC-098'],
-            'Zone-20': ['CC-079', 'CC-092', 'CC-093', 'CC-094'],
-            'Zone-21': ['CC-072', 'CC-073', 'CC-074', 'CC-078'],
-            'Road Wing': ['RW-6', 'RW-7']
-        }
-    },
-    'PP-114': {
-        'zones': ['Zone-22', 'Zone-23', 'Zone-24', 'Zone-25', 'Zone-26', 'Zone-27', 'Road Wing'],
-        'zone_to_cc': {
-            'Zone-22': ['CC-075', 'CC-076', 'CC-077', 'CC-081'],
-            'Zone-23': ['CC-082', 'CC-083', 'CC-087', 'CC-088'],
-            'Zone-24': ['CC-080', 'CC-089', 'CC-090', 'CC-091'],
-            'Zone-25': ['CC-099', 'CC-084', 'CC-085', 'CC-086'],
-            'Zone-26': ['CC-066', 'CC-067', 'CC-068', 'CC-069'],
-            'Zone-27': ['CC-053', 'CC-054', 'CC-070', 'CC-071'],
-            'Road Wing': ['RW-8', 'RW-9']
-        }
-    },
-    'PP-115': {
-        'zones': ['Zone-28', 'Zone-29', 'Zone-30', 'Zone-31', 'Road Wing'],
-        'zone_to_cc': {
-            'Zone-28': ['CC-058', 'CC-063', 'CC-064', 'CC-065'],
-            'Zone-29': ['CC-055', 'CC-056', 'CC-057', 'CC-060'],
-            'Zone-30': ['CC-046', 'CC-059', 'CC-061', 'CC-062'],
-            'Zone-31': ['CC-047', 'CC-048', 'CC-049', 'CC-050'],
-            'Road Wing': ['RW-10', 'RW-11']
-        }
-    },
-    'PP-116': {
-        'zones': ['Zone-32', 'Zone-33', 'Zone-35', 'Zone-34', 'Road Wing'],
-        'zone_to_cc': {
-            'Zone-32': ['CC-040', 'CC-041', 'CC-042', 'CC-043'],
-            'Zone-33': ['CC-038', 'CC-039', 'CC-044', 'CC-045'],
-            'Zone-35': ['CC-028', 'CC-031', 'CC-032', 'CC-033'],
-            'Zone-34': ['CC-034', 'CC-035', 'CC-036', 'CC-037'],
-            'Road Wing': ['RW-12', 'RW-13A', 'RW-13B']
-        }
-    },
-    'PP-117': {
-        'zones': ['Zone-36', 'Zone-37', 'Zone-38', 'Zone-39', 'Road Wing'],
-        'zone_to_cc': {
-            'Zone-36': ['CC-017', 'CC-018', 'CC-019', 'CC-023'],
-            'Zone-37': ['CC-013', 'CC-014', 'CC-015', 'CC-016'],
-            'Zone-38': ['CC-008', 'CC-009', 'CC-011', 'CC-012'],
-            'Zone-39': ['CC-004', 'CC-005', 'CC-007', 'CC-010'],
-            'Road Wing': ['RW-14', 'RW-15', 'RW-16']
-        }
-    },
-}
-
-# Helper functions
-def load_df(file_path: str) -> pd.DataFrame:
-    if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-        df = pd.read_csv(file_path, dtype=str, keep_default_na=False)
-        # Double header check - agar header row duplicate hai to remove karein
-        if not df.empty and 'person_id' in df.columns and df['person_id'].str.contains('person_id').any():
-            # Remove header rows
-            df = df[~df['person_id'].str.contains('person_id', na=False)]
-        return df
-    else:
-        return pd.DataFrame()
-
-def atomic_append_df(df: pd.DataFrame, new_rows: pd.DataFrame, file_path: str):
-    combined = pd.concat([df, new_rows], ignore_index=True)
-    temp_file = tempfile.NamedTemporaryFile(delete=False, mode='w', encoding='utf-8')
-    combined.to_csv(temp_file, index=False)
-    temp_file.close()
-    shutil.move(temp_file.name, file_path)
-    
-    # Auto-sync to GitHub after data changes
-    try:
-        sync_data_to_github()
-    except:
-        pass  # GitHub sync optional hai
-
-def generate_person_id() -> str:
-    return f"P{uuid.uuid4().hex[:8].upper()}"
-
-def generate_record_id(df: pd.DataFrame) -> str:
-    master_df = load_df(MASTER_CSV)  # Existing master file se ID generate karein
-    max_id = 0
-    if not master_df.empty and 'record_id' in master_df.columns:
-        # Extract numeric part from existing record_ids
-        ids = master_df['record_id'].str.extract(r'W(\d+)', expand=False).dropna()
-        if not ids.empty:
-            ids = ids.astype(int)
-            max_id = ids.max()
-    return f"W{max_id + 1:04d}"
-
-def generate_log_id(df: pd.DataFrame) -> str:
-    max_id = 0
-    if not df.empty and 'log_id' in df.columns:
-        ids = df['log_id'].str.extract(r'H(\d+)', expand=False).dropna().astype(int)
-        if not ids.empty:
-            max_id = ids.max()
-    return f"H{max_id + 1:04d}"
-
-def validate_cnic(cnic: str) -> bool:
-    return len(str(cnic)) == 13 and str(cnic).isdigit()
-
-def validate_phone(phone: str) -> bool:
-    return len(str(phone)) == 11 and str(phone).isdigit()
-
-def validate_date(date_str: Optional[str]) -> bool:
-    if not date_str:
-        return True
-    try:
-        pd.to_datetime(date_str)
-        return True
-    except ValueError:
-        return False
-
-def validate_pp_sz(pp_sz: str, area: str) -> bool:
-    if area == 'City' and pp_sz.startswith('PP-') and pp_sz[3:].isdigit() and len(pp_sz[3:]) == 3:
-        return True
-    if area == 'Sadar' and pp_sz.startswith('SZ-') and pp_sz[3:].isdigit() and len(pp_sz[3:]) == 2:
-        return True
-    return False
-
-def validate_cc_uc(cc_uc: str, area: str) -> bool:
-    if area == 'City':
-        return cc_uc.startswith('CC-') or cc_uc.startswith('RW-')
-    if area == 'Sadar' and cc_uc.startswith('UC-') and cc_uc[3:].isdigit() and len(cc_uc[3:]) == 3:
-        return True
-    return False
-
-def get_supervisor_for_cc_uc(cc_uc: str, master_df: pd.DataFrame) -> str:
-    master_df['updated_on'] = pd.to_datetime(master_df['updated_on'], errors='coerce')
-    sups = master_df[(master_df['role'] == 'Supervisor') & (master_df['status'] == 'active') & (master_df['cc_uc'] == cc_uc)]
-    if sups.empty:
-        return ""
-    latest_idx = sups['updated_on'].idxmax()
-    return sups.loc[latest_idx, 'record_id']
-
-def is_supervisor_exists(supervisor_id: str, master_df: pd.DataFrame) -> bool:
-    if not supervisor_id:
-        return True
-    master_df['updated_on'] = pd.to_datetime(master_df['updated_on'], errors='coerce')
-    sup_rows = master_df[master_df['record_id'] == supervisor_id]
-    if sup_rows.empty:
-        return False
-    sup_person_id = sup_rows['person_id'].iloc[0]
-    latest_idx = master_df[master_df['person_id'] == sup_person_id]['updated_on'].idxmax()
-    latest_row = master_df.loc[latest_idx]
-    return latest_row['status'] == 'active' and latest_row['role'] == 'Supervisor'
-
-def log_action(person_id: str, record_id: str, action: str, field: str, old_value: str, new_value: str, by_user: str, notes: str):
-    history_df = load_df(HISTORY_CSV)
-    log_id = generate_log_id(history_df)
-    timestamp = datetime.datetime.utcnow().isoformat() + 'Z'
-    new_log = pd.DataFrame({
-        'log_id': [log_id],
-        'person_id': [person_id],
-        'record_id': [record_id],
-        'action': [action],
-        'field': [field],
-        'old_value': [old_value],
-        'new_value': [new_value],
-        'by_user': [by_user],
-        'timestamp': [timestamp],
-        'notes': [notes]
-    })
-    atomic_append_df(history_df, new_log, HISTORY_CSV)
-
-def add_new_worker(form_data: Dict, by_user: str) -> str:
-    master_df = load_df(MASTER_CSV)
-    
-    # Validate
-    if not validate_cnic(form_data['cnic']):
-        return "Invalid CNIC: Must be 13 digits."
-    if not validate_phone(form_data['phone']):
-        return "Invalid Phone: Must be 11 digits."
-    if form_data['area'] not in ['City', 'Sadar']:
-        return "Invalid Area: Must be City or Sadar."
-    if not validate_pp_sz(form_data['pp_sz'], form_data['area']):
-        return "Invalid PP/SZ format."
-    if not validate_cc_uc(form_data['cc_uc'], form_data['area']):
-        return "Invalid CC/UC format."
-    if form_data['role'] != 'Driver' and (form_data['vehicle_id'] or form_data['vehicle_reg_no']):
-        return "Only Drivers can have vehicles."
-    
-    # Auto set updated_on
-    updated_on = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    
-    # Auto set supervisor_id
-    if form_data['role'] == 'Supervisor':
-        # Check if already exists
-        master_df['updated_on'] = pd.to_datetime(master_df['updated_on'], errors='coerce')
-        existing_sups = master_df[(master_df['role'] == 'Supervisor') & (master_df['status'] == 'active') & (master_df['cc_uc'] == form_data['cc_uc'])]
-        if not existing_sups.empty:
-            return "Already a supervisor for this CC/UC."
-        supervisor_id = ''
-    else:
-        supervisor_id = get_supervisor_for_cc_uc(form_data['cc_uc'], master_df)
-        if not supervisor_id:
-            return "No supervisor found for this CC/UC."
-        if not is_supervisor_exists(supervisor_id, master_df):
-            return "Supervisor not active."
-    
-    # Check for existing person by CNIC
-    existing = master_df[master_df['cnic'] == form_data['cnic']]
-    person_id = existing['person_id'].iloc[0] if not existing.empty else generate_person_id()
-    
-    record_id = generate_record_id(master_df)
-    new_row = pd.DataFrame({
-        'person_id': [person_id],
-        'record_id': [record_id],
-        'area': [form_data['area']],
-        'pp_sz': [form_data['pp_sz']],
-        'zone': [form_data['zone']],
-        'cc_uc': [form_data['cc_uc']],
-        'role': [form_data['role']],
-        'name': [form_data['name']],
-        'cnic': [form_data['cnic']],
-        'phone': [form_data['phone']],
-        'vehicle_id': [form_data['vehicle_id']],
-        'vehicle_reg_no': [form_data['vehicle_reg_no']],
-        'supervisor_id': [supervisor_id],
-        'status': ['active'],
-        'updated_on': [updated_on],
-        'status_changed_on': [''],
-        'last_transfer_on': [''],
-        'remarks': [form_data['remarks']]
-    })
-    atomic_append_df(master_df, new_row, MASTER_CSV)
-    log_action(person_id, record_id, 'add', '', '', '', by_user, form_data['remarks'])
-    return ""
-
-def perform_transfer(person_id: str, old_record_id: str, new_data: Dict, by_user: str, notes: str):
-    master_df = load_df(MASTER_CSV)
-    now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    date_today = datetime.date.today().isoformat()
-    
-    master_df['updated_on'] = pd.to_datetime(master_df['updated_on'], errors='coerce')
-    old_row = master_df[(master_df['person_id'] == person_id) & (master_df['record_id'] == old_record_id)].iloc[0]
-    
-    # Validate new data
-    if not validate_pp_sz(new_data['pp_sz'], new_data['area']):
-        st.error("Invalid PP/SZ format.")
-        return
-    if not validate_cc_uc(new_data['cc_uc'], new_data['area']):
-        st.error("Invalid CC/UC format.")
-        return
-    
-    # Auto set new supervisor_id based on new cc_uc
-    if old_row['role'] == 'Supervisor':
-        existing_sups = master_df[(master_df['role'] == 'Supervisor') & (master_df['status'] == 'active') & (master_df['cc_uc'] == new_data['cc_uc'])]
-        if not existing_sups.empty and old_row['cc_uc'] != new_data['cc_uc']:
-            st.error("Already a supervisor for the new CC/UC.")
-            return
-        new_supervisor_id = ''
-    else:
-        new_supervisor_id = get_supervisor_for_cc_uc(new_data['cc_uc'], master_df)
-        if not new_supervisor_id:
-            st.error("No supervisor found for the new CC/UC.")
-            return
-    
-    new_record_id = generate_record_id(master_df)
-    new_row = pd.DataFrame({
-        'person_id': [person_id],
-        'record_id': [new_record_id],
-        'area': [new_data['area']],
-        'pp_sz': [new_data['pp_sz']],
-        'zone': [new_data['zone']],
-        'cc_uc': [new_data['cc_uc']],
-        'role': [old_row['role']],
-        'name': [old_row['name']],
-        'cnic': [old_row['cnic']],
-        'phone': [old_row['phone']],
-        'vehicle_id': [old_row['vehicle_id']],
-        'vehicle_reg_no': [old_row['vehicle_reg_no']],
-        'supervisor_id': [new_supervisor_id],
-        'status': ['active'],
-        'updated_on': [now],
-        'status_changed_on': [''],
-        'last_transfer_on': [date_today],
-        'remarks': [f"Transferred from {old_row['cc_uc']}. {notes}"]
-    })
-    atomic_append_df(master_df, new_row, MASTER_CSV)
-    log_action(person_id, new_record_id, 'transfer', 'cc_uc', old_row['cc_uc'], new_data['cc_uc'], by_user, notes)
-    if old_row['pp_sz'] != new_data['pp_sz']:
-        log_action(person_id, new_record_id, 'transfer', 'pp_sz', old_row['pp_sz'], new_data['pp_sz'], by_user, notes)
-
-def perform_remove(person_id: str, record_id: str, by_user: str, notes: str):
-    master_df = load_df(MASTER_CSV)
-    now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    date_today = datetime.date.today().isoformat()
-    old_row = master_df[(master_df['person_id'] == person_id) & (master_df['record_id'] == record_id)].iloc[0]
-    new_record_id = generate_record_id(master_df)
-    new_row = old_row.copy()
-    new_row['status'] = 'removed'
-    new_row['status_changed_on'] = date_today
-    new_row['updated_on'] = now
-    new_row['remarks'] = notes
-    new_row['record_id'] = new_record_id
-    atomic_append_df(master_df, pd.DataFrame([new_row]), MASTER_CSV)
-    log_action(person_id, new_record_id, 'remove', 'status', 'active', 'removed', by_user, notes)
-
-def perform_edit(person_id: str, record_id: str, field: str, new_value: str, by_user: str, notes: str) -> str:
-    master_df = load_df(MASTER_CSV)
-    now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    old_row = master_df[(master_df['person_id'] == person_id) & (master_df['record_id'] == record_id)].iloc[0]
-    old_value = old_row[field]
-    if old_value == new_value:
-        return "No change in value."
-    if field == 'cnic' and not validate_cnic(new_value):
-        return "Invalid CNIC: Must be 13 digits."
-    new_record_id = generate_record_id(master_df)
-    new_row = old_row.copy()
-    new_row[field] = new_value
-    new_row['updated_on'] = now
-    new_row['remarks'] = f"Edited {field} from {old_value} to {new_value}. {notes}"
-    new_row['record_id'] = new_record_id
-    atomic_append_df(master_df, pd.DataFrame([new_row]), MASTER_CSV)
-    log_action(person_id, new_record_id, 'edit', field, old_value, new_value, by_user, notes)
-    return ""
-# YEH NAYA FUNCTION ADD KAREIN - LINE 400 KE AAS-PAAS
-def remove_all_data(confirmation_code: str, by_user: str) -> str:
-    """Remove all data with confirmation code"""
-    if confirmation_code != "REX9797":
-        return "Invalid confirmation code. Data deletion aborted."
-    
-    try:
-        # Clear master.csv (only keep header)
-        with open(MASTER_CSV, 'w', encoding='utf-8') as f:
-            f.write(MASTER_HEADER)
-        
-        # Clear history.csv (only keep header)
-        with open(HISTORY_CSV, 'w', encoding='utf-8') as f:
-            f.write(HISTORY_HEADER)
-        
-        # Log the action
-        log_action('SYSTEM', 'SYSTEM', 'remove_all', 'all_data', 'all', 'empty', by_user, 'All data removed by admin')
-        
-        # Sync to GitHub
-        sync_data_to_github()
-        
-        return "All data has been successfully removed. System reset to initial state."
-    except Exception as e:
-        return f"Error removing data: {str(e)}"
-        
-def perform_bulk_upload(uploaded_file, by_user: str):
-    try:
-        if uploaded_file.name.endswith('.csv'):
-            upload_df = pd.read_csv(uploaded_file, dtype=str, keep_default_na=False)
-        elif uploaded_file.name.endswith('.xlsx'):
-            # Excel file ke liye proper handling
-            upload_df = pd.read_excel(uploaded_file, dtype=str, keep_default_na=False)
-            # NaN values ko empty string se replace karein
-            upload_df = upload_df.fillna('')
-        else:
-            return "Unsupported file type. Only CSV and XLSX allowed."
-        
-        required_cols = ['person_id', 'record_id', 'area', 'pp_sz', 'zone', 'cc_uc', 'role', 'name', 'cnic', 'phone', 'vehicle_id', 'vehicle_reg_no', 'supervisor_id', 'status', 'updated_on', 'status_changed_on', 'last_transfer_on', 'remarks']
-        
-        # Add missing columns with empty values
-        for col in required_cols:
-            if col not in upload_df.columns:
-                upload_df[col] = ''
-        
-        warnings = []
-        current_time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        for idx, row in upload_df.iterrows():
-            # Auto-generate person_id if empty
-            if pd.isna(row['person_id']) or row['person_id'] == '':
-                upload_df.at[idx, 'person_id'] = generate_person_id()
-            
-            # Auto-generate record_id if empty
-            if pd.isna(row['record_id']) or row['record_id'] == '':
-                upload_df.at[idx, 'record_id'] = generate_record_id(upload_df)
-            
-            # Set updated_on to current time if empty
-            if pd.isna(row['updated_on']) or row['updated_on'] == '':
-                upload_df.at[idx, 'updated_on'] = current_time
-            
-            # Set remarks to "Bulk upload" if empty
-            if pd.isna(row['remarks']) or row['remarks'] == '':
-                upload_df.at[idx, 'remarks'] = 'Bulk upload'
-            
-            # Set status to active if empty
-            if pd.isna(row['status']) or row['status'] == '':
-                upload_df.at[idx, 'status'] = 'active'
-            
-            # Validations
-            cnic_value = str(row['cnic']) if not pd.isna(row['cnic']) else ''
-            phone_value = str(row['phone']) if not pd.isna(row['phone']) else ''
-            
-            if cnic_value and not validate_cnic(cnic_value):
-                warnings.append(f"Row {idx+1}: Invalid CNIC.")
-            if phone_value and not validate_phone(phone_value):
-                warnings.append(f"Row {idx+1}: Invalid Phone.")
-        
-        master_df = load_df(MASTER_CSV)
-        atomic_append_df(master_df, upload_df, MASTER_CSV)
-        
-        # Log actions for each row
-        for idx, row in upload_df.iterrows():
-            log_action(row['person_id'], row['record_id'], 'add', '', '', '', by_user, 'Bulk upload')
-        
-        if warnings:
-            return "\n".join(warnings)
-        return ""
-    except Exception as e:
-        return f"Error: {str(e)}"
+# Data layer - storage, caches, validation and mutations live in erp_data (no Streamlit there)
+from erp_data import (
+    EXPORT_FORMATS, HISTORY_CSV, MASTER_CSV, SNAPSHOT_MONTHS, STATUSES, UPLOAD_CHANGES,
+    add_new_worker, archive_master, as_of_roster, build_roster_snapshots, check_password, compact_file,
+    confirm_bulk_upload, discard_bulk_upload, ensure_bootstrap, export_data_file, export_frame, filter_roster,
+    find_person_records, get_archive, get_current_records, get_data_cache, get_git_sync_worker, get_headcounts,
+    get_hierarchy, get_latest_record, get_perf_recorder, get_snapshots, get_store, headcount_summary,
+    history_filter_options, load_credentials, load_master_history, perform_bulk_status, perform_bulk_transfer,
+    perform_edit, perform_remove, perform_transfer, preview_bulk_upload, query_history, remove_all_data,
+    roster_headcounts, search_frame, search_records, timed,
+)
 
 # Authentication
-def load_credentials() -> Dict:
-    with open(CREDENTIALS_YAML, 'r') as f:
-        return yaml.safe_load(f)
-
 def login():
     st.title("Login")
     username = st.text_input("Username")
@@ -540,7 +22,7 @@ def login():
     if st.button("Login"):
         creds = load_credentials()
         if username in creds['users']:
-            if bcrypt.checkpw(password.encode(), creds['users'][username]['password'].encode()):
+            if check_password(password, creds['users'][username]['password']):
                 st.session_state['user'] = username
                 st.session_state['role'] = creds['users'][username]['role']
                 st.success("Logged in!")
@@ -550,9 +32,45 @@ def login():
         else:
             st.error("Invalid credentials")
 
+def bulk_change_form(person_ids, user, hierarchy, key, confirm=False):
+    """Transfer or status change for many people at once - used by the Dashboard and the Admin Panel
+    confirm=True makes the user type the head count before acting (the whole filtered roster, nothing picked)"""
+    person_ids = list(dict.fromkeys(person_ids))
+    ready = bool(person_ids)
+    if confirm and ready:
+        st.warning(f"No rows are picked in the table - this acts on all {len(person_ids)} people the filters match.")
+        typed = st.text_input(f"Type {len(person_ids)} to confirm", key=f"{key}_confirm")
+        ready = typed.strip() == str(len(person_ids))
+    action = st.radio("Bulk Action", ['Transfer', 'Change Status'], horizontal=True, key=f"{key}_action")
+    notes = st.text_input("Notes/Remarks", key=f"{key}_notes")
+    result = None
+    if action == 'Transfer':
+        new_area = st.selectbox("New Area", ['City', 'Sadar'], key=f"{key}_area")
+        new_pp_sz = st.selectbox("New PP/SZ", hierarchy.pp_sz_options(new_area), key=f"{key}_pp_sz")
+        new_zone = st.selectbox("New Zone", hierarchy.zone_options(new_area, new_pp_sz), key=f"{key}_zone")
+        new_cc_uc = st.selectbox("New CC/UC", hierarchy.cc_uc_options(new_area, new_pp_sz, new_zone), key=f"{key}_cc_uc")
+        if st.button(f"Transfer {len(person_ids)} People", key=f"{key}_transfer", disabled=not ready):
+            new_data = {'area': new_area, 'pp_sz': new_pp_sz, 'zone': new_zone, 'cc_uc': new_cc_uc}
+            result = perform_bulk_transfer(person_ids, new_data, user, notes)
+    else:
+        new_status = st.selectbox("New Status", STATUSES, index=None, placeholder="Pick a status", key=f"{key}_status")
+        if st.button(f"Set {len(person_ids)} People to {new_status or '...'}", key=f"{key}_set_status",
+                     disabled=not ready or new_status is None):
+            result = perform_bulk_status(person_ids, new_status, user, notes)
+    if result is not None:
+        error, skipped = result
+        if error:
+            st.error(error)
+        else:
+            st.success(f"Updated {len(person_ids) - len(skipped)} people.")
+        if not skipped.empty:
+            st.warning(f"{len(skipped)} people were skipped.")
+            st.dataframe(skipped, hide_index=True)
+
 # Main App
 # Main App
 def main():
+    ensure_bootstrap()
     if 'user' not in st.session_state:
         login()
         return
@@ -563,10 +81,7 @@ def main():
     st.sidebar.title(f"Welcome, {user} ({role})")
     page = st.sidebar.selectbox("Page", ["Dashboard"] + (["Admin Panel", "History"] if role == 'admin' else []))
     
-    master_df = load_df(MASTER_CSV)
-    history_df = load_df(HISTORY_CSV)
-    
-    master_df['updated_on'] = pd.to_datetime(master_df['updated_on'], errors='coerce')
+    hierarchy = get_hierarchy()
     
     if page == "Dashboard":
         st.title("Dashboard")
@@ -579,19 +94,11 @@ def main():
             zone = st.text_input("Zone")
             cc_uc = st.text_input("CC/UC")
         elif area == 'City':
-            pp_sz_options = sorted(city_data.keys())
-            pp_sz = st.selectbox("PP/SZ", ['All'] + pp_sz_options)
+            pp_sz = st.selectbox("PP/SZ", ('All',) + hierarchy.pp_sz_options('City'))
             if pp_sz != 'All':
-                zone_options = city_data[pp_sz]['zones']
-                zone = st.selectbox("Zone", ['All'] + zone_options)
-                cc_uc_options = []
-                if zone != 'All':
-                    cc_uc_options = city_data[pp_sz]['zone_to_cc'].get(zone, [])
-                else:
-                    for z in zone_options:
-                        cc_uc_options += city_data[pp_sz]['zone_to_cc'].get(z, [])
-                    cc_uc_options = sorted(set(cc_uc_options))
-                cc_uc = st.selectbox("CC/UC", ['All'] + cc_uc_options)
+                zone = st.selectbox("Zone", ('All',) + hierarchy.zone_options('City', pp_sz))
+                cc_uc_options = hierarchy.cc_uc_options('City', pp_sz, None if zone == 'All' else zone)
+                cc_uc = st.selectbox("CC/UC", ('All',) + cc_uc_options)
                 if cc_uc == 'All':
                     cc_uc = ''
                 if zone == 'All':
@@ -601,52 +108,117 @@ def main():
                 zone = st.text_input("Zone")
                 cc_uc = st.text_input("CC/UC")
         else:  # Sadar
-            pp_sz_options = [f"SZ-{i:02d}" for i in range(1, 12)]
-            pp_sz = st.selectbox("PP/SZ", ['All'] + pp_sz_options)
+            pp_sz = st.selectbox("PP/SZ", ('All',) + hierarchy.pp_sz_options('Sadar'))
             if pp_sz == 'All':
                 pp_sz = ''
             zone = st.text_input("Zone")
-            cc_uc_options = [f"UC-{i:03d}" for i in range(131, 190)]
-            cc_uc = st.selectbox("CC/UC", ['All'] + cc_uc_options)
+            cc_uc = st.selectbox("CC/UC", ('All',) + hierarchy.cc_uc_options('Sadar'))
             if cc_uc == 'All':
                 cc_uc = ''
         search = st.text_input("Search (name/id/cnic/vehicle)")
+        as_of = st.date_input("As of date", value=None, max_value=datetime.date.today(),
+                              help="Roster as it stood at the end of this day - leave empty for today")
+        current_only = st.checkbox("Current roster only", value=True, disabled=as_of is not None,
+                                   help="Show each person's latest record, removed people left out, instead of every version")
+        
+        roster_df = as_of_roster(as_of) if as_of else None
+        counts = get_headcounts() if roster_df is None else roster_headcounts(roster_df)
+        if role != 'admin':
+            counts = counts[counts['status'] == 'active']
+        counts = filter_roster(counts, area, pp_sz, zone, cc_uc)
+        with st.expander(f"Headcount summary - {int(counts['count'].sum())} people", expanded=False):
+            # Drill down - group by the level below the deepest filter picked above
+            levels = ['area', 'pp_sz', 'zone', 'cc_uc', 'role', 'status']
+            picked = [level for level, value in (('area', area != 'All'), ('pp_sz', pp_sz), ('zone', zone), ('cc_uc', cc_uc)) if value]
+            default = min(levels.index(picked[-1]) + 1, len(levels) - 1) if picked else 0
+            by = st.radio("Group by", levels, index=default, horizontal=True,
+                          format_func=lambda level: {'pp_sz': 'PP/SZ', 'cc_uc': 'CC/UC'}.get(level, level.title()))
+            st.dataframe(headcount_summary(counts, by))
         
-        filtered = master_df if role == 'admin' else master_df[master_df['status'] == 'active']
-        if area != 'All':
-            filtered = filtered[filtered['area'] == area]
-        if pp_sz:
-            filtered = filtered[filtered['pp_sz'].str.contains(pp_sz, case=False, na=False)]
-        if zone:
-            filtered = filtered[filtered['zone'].str.contains(zone, case=False, na=False)]
-        if cc_uc:
-            filtered = filtered[filtered['cc_uc'].str.contains(cc_uc, case=False, na=False)]
-        if search:
-            filtered = filtered[
-                filtered['name'].str.contains(search, case=False, na=False) |
-                filtered['record_id'].str.contains(search, case=False, na=False) |
-                filtered['cnic'].str.contains(search, case=False, na=False) |
-                filtered['vehicle_reg_no'].str.contains(search, case=False, na=False)
-            ]
+        # Full history also reads the archived versions - the search index only covers the current roster
+        indexed = roster_df is None and current_only
+        if roster_df is None:
+            roster_df = get_current_records() if current_only else load_master_history()
+        with timed('dashboard_filter', len(roster_df)):
+            filtered = roster_df if role == 'admin' else roster_df[roster_df['status'] == 'active']
+            filtered = filter_roster(filtered, area, pp_sz, zone, cc_uc)
+            if search:
+                filtered = filtered[filtered.index.isin(search_records(search))] if indexed else search_frame(filtered, search)
         
-        st.dataframe(filtered)
+        if role == 'admin':
+            # Rows picked in the table, or everyone the filters match
+            picked = st.dataframe(filtered, on_select="rerun", selection_mode="multi-row", key="roster_table").selection.rows
+            selection = filtered.iloc[picked] if picked else filtered
+            with st.expander(f"Bulk change - {selection['person_id'].nunique()} people", expanded=False):
+                bulk_change_form(selection['person_id'], user, hierarchy, "dashboard_bulk", confirm=not picked)
+        else:
+            st.dataframe(filtered)
         
-        if st.download_button("Export CSV", filtered.to_csv(index=False), "export.csv"):
+        export_format = st.radio("Export format", list(EXPORT_FORMATS), horizontal=True)
+        ext, mime = EXPORT_FORMATS[export_format]
+        if st.download_button(f"Export {export_format}", lambda: export_frame(filtered, ext), f"export.{ext}", mime=mime):
             pass
     
     elif page == "Admin Panel" and role == 'admin':
         st.title("Admin Panel")
-        tab = st.tabs(["Bulk Upload", "Add New", "Edit/Transfer/Remove", "Remove All Data"])
+        tab = st.tabs(["Bulk Upload", "Add New", "Edit/Transfer/Remove", "Bulk Change", "Remove All Data", "Maintenance", "Performance"])
         
         with tab[0]:
             st.subheader("Bulk Upload")
             uploaded = st.file_uploader("Upload master file", type=["csv", "xlsx"])
-            if uploaded and st.button("Validate & Upload"):
-                error = perform_bulk_upload(uploaded, user)
-                if error:
-                    st.error(error)
+            if uploaded and st.button("Validate & Preview"):
+                if 'upload_preview' in st.session_state:
+                    discard_bulk_upload(st.session_state.pop('upload_preview'))
+                timings = {}
+                progress_bar = st.progress(0.0, text="Reading file...")
+                preview = preview_bulk_upload(uploaded, timings, on_progress=lambda fraction, text: progress_bar.progress(fraction, text=text))
+                if preview['error']:
+                    st.error(preview['error'])
                 else:
-                    st.success("Uploaded successfully!")
+                    # Staged rows wait here until the upload is confirmed or cancelled
+                    st.session_state['upload_preview'] = preview
+                if timings:
+                    st.caption("Stage timings: " + ", ".join(f"{stage} {secs:.2f}s" for stage, secs in timings.items()))
+                # Kept for the filters below, which rerun the page
+                st.session_state['upload_report'] = preview['report']
+            preview = st.session_state.get('upload_preview')
+            if preview is not None:
+                diff = preview['diff']
+                changes = diff['change'].value_counts()
+                for col, change in zip(st.columns(len(UPLOAD_CHANGES)), UPLOAD_CHANGES):
+                    col.metric(change.title(), int(changes.get(change, 0)))
+                st.caption("Only new and changed rows are stored. People are matched by person_id, or by CNIC when person_id is empty.")
+                shown_changes = st.multiselect("Show rows", UPLOAD_CHANGES, default=['new', 'changed', 'conflict'])
+                st.dataframe(diff[diff['change'].isin(shown_changes)], hide_index=True)
+                col1, col2 = st.columns(2)
+                if col1.button("Confirm Upload"):
+                    del st.session_state['upload_preview']
+                    timings = {}
+                    progress_bar = st.progress(0.0, text="Saving...")
+                    error, counts = confirm_bulk_upload(preview, user, timings, on_progress=lambda fraction, text: progress_bar.progress(fraction, text=text))
+                    if error:
+                        st.error(error)
+                    else:
+                        st.success(f"Uploaded {counts['new']} new and {counts['changed']} changed rows; "
+                                   f"skipped {counts['unchanged']} unchanged and {counts['conflict']} conflicting rows.")
+                    st.caption("Stage timings: " + ", ".join(f"{stage} {secs:.2f}s" for stage, secs in timings.items()))
+                if col2.button("Cancel Upload"):
+                    discard_bulk_upload(st.session_state.pop('upload_preview'))
+                    st.info("Upload cancelled - nothing was stored.")
+            report = st.session_state.get('upload_report')
+            if report is not None and not report.empty:
+                st.warning(f"{len(report)} validation issues in {report['row'].nunique()} rows - rows with CNIC or record_id conflicts are not stored, the others still are.")
+                col1, col2 = st.columns(2)
+                columns_filter = col1.multiselect("Column", sorted(report['column'].unique()))
+                rules_filter = col2.multiselect("Rule", sorted(report['rule'].unique()))
+                shown = report
+                if columns_filter:
+                    shown = shown[shown['column'].isin(columns_filter)]
+                if rules_filter:
+                    shown = shown[shown['rule'].isin(rules_filter)]
+                st.dataframe(shown, hide_index=True)
+                if st.download_button("Download Validation Report", lambda: export_frame(shown, 'csv'), "validation_report.csv", mime="text/csv"):
+                    pass
         
         with tab[1]:
             st.subheader("Add New Worker")
@@ -656,20 +228,9 @@ def main():
             cc_uc = ''
             vehicle_id = ''
             vehicle_reg_no = ''
-            if area == 'City':
-                pp_sz_options = sorted(city_data.keys())
-                pp_sz = st.selectbox("PP/SZ", pp_sz_options)
-                zone_options = city_data.get(pp_sz, {}).get('zones', [])
-                zone = st.selectbox("Zone", zone_options)
-                cc_uc_options = city_data.get(pp_sz, {}).get('zone_to_cc', {}).get(zone, [])
-                cc_uc = st.selectbox("CC/UC", cc_uc_options)
-            else:
-                pp_sz_options = [f"SZ-{i:02d}" for i in range(1, 12)]
-                pp_sz = st.selectbox("PP/SZ", pp_sz_options)
-                zone_options = [f"Z-{i:02d}" for i in range(1, 21)]
-                zone = st.selectbox("Zone", zone_options)
-                cc_uc_options = [f"UC-{i:03d}" for i in range(131, 190)]
-                cc_uc = st.selectbox("CC/UC", cc_uc_options)
+            pp_sz = st.selectbox("PP/SZ", hierarchy.pp_sz_options(area))
+            zone = st.selectbox("Zone", hierarchy.zone_options(area, pp_sz))
+            cc_uc = st.selectbox("CC/UC", hierarchy.cc_uc_options(area, pp_sz, zone))
             role = st.selectbox("Role", ['Sanitary Worker', 'Helper', 'Zonal Officer', 'Supervisor', 'Driver', 'Cleaner', 'Data Entry Operator', 'Assistant Manager'])
             name = st.text_input("Name")
             cnic = st.text_input("CNIC (13 digits)")
@@ -696,18 +257,19 @@ def main():
             input_value = st.text_input("CNIC/Person ID to Modify")
             if input_value:
                 if len(str(input_value)) == 13 and str(input_value).isdigit():
-                    person_records = master_df[master_df['cnic'] == str(input_value)]
+                    person_records = find_person_records(cnic=str(input_value))
                 else:
-                    person_records = master_df[master_df['person_id'] == input_value]
+                    person_records = find_person_records(person_id=input_value)
                 if person_records.empty:
                     st.error("No records found for the provided CNIC or Person ID.")
                 else:
                     person_id = person_records['person_id'].iloc[0]
-                    latest_idx = person_records['updated_on'].idxmax()
-                    last_update = person_records.loc[latest_idx, 'updated_on']
-                    st.write(f"Last Update: {last_update}")
+                    latest_row = get_latest_record(person_id)
+                    if latest_row is None:
+                        # Only archived records left - the person was removed
+                        latest_row = person_records.iloc[-1]
+                    st.write(f"Last Update: {latest_row['updated_on']}")
                     st.dataframe(person_records)
-                    latest_row = person_records.loc[latest_idx]
                     if latest_row['status'] == 'active':
                         record_id = latest_row['record_id']
                         action = st.selectbox("Action", ['Transfer', 'Remove', 'Edit'])
@@ -718,24 +280,16 @@ def main():
                             new_pp_sz = ''
                             new_zone = ''
                             new_cc_uc = ''
-                            if new_area == 'City':
-                                new_pp_sz_options = sorted(city_data.keys())
-                                new_pp_sz = st.selectbox("New PP/SZ", new_pp_sz_options)
-                                new_zone_options = city_data.get(new_pp_sz, {}).get('zones', [])
-                                new_zone = st.selectbox("New Zone", new_zone_options)
-                                new_cc_uc_options = city_data.get(new_pp_sz, {}).get('zone_to_cc', {}).get(new_zone, [])
-                                new_cc_uc = st.selectbox("New CC/UC", new_cc_uc_options)
-                            else:
-                                new_pp_sz_options = [f"SZ-{i:02d}" for i in range(1, 12)]
-                                new_pp_sz = st.selectbox("New PP/SZ", new_pp_sz_options)
-                                new_zone_options = [f"Z-{i:02d}" for i in range(1, 21)]
-                                new_zone = st.selectbox("New Zone", new_zone_options)
-                                new_cc_uc_options = [f"UC-{i:03d}" for i in range(131, 190)]
-                                new_cc_uc = st.selectbox("New CC/UC", new_cc_uc_options)
+                            new_pp_sz = st.selectbox("New PP/SZ", hierarchy.pp_sz_options(new_area))
+                            new_zone = st.selectbox("New Zone", hierarchy.zone_options(new_area, new_pp_sz))
+                            new_cc_uc = st.selectbox("New CC/UC", hierarchy.cc_uc_options(new_area, new_pp_sz, new_zone))
                             if st.button("Confirm Transfer"):
                                 new_data = {'area': new_area, 'pp_sz': new_pp_sz, 'zone': new_zone, 'cc_uc': new_cc_uc}
-                                perform_transfer(person_id, record_id, new_data, user, notes)
-                                st.success("Transferred!")
+                                error = perform_transfer(person_id, record_id, new_data, user, notes)
+                                if error:
+                                    st.error(error)
+                                else:
+                                    st.success("Transferred!")
                         
                         elif action == 'Remove':
                             if st.button("Confirm Remove"):
@@ -755,6 +309,11 @@ def main():
                         st.error("No active record for this person.")
         
         with tab[3]:
+            st.subheader("Bulk Transfer / Status Change")
+            pasted = st.text_area("Person IDs (one per line or comma separated)")
+            bulk_change_form(pasted.replace(',', '\n').split(), user, hierarchy, "admin_bulk")
+        
+        with tab[4]:
             st.subheader("🚨 Remove All Data")
             st.warning("**DANGER ZONE**: This will permanently delete ALL data from the system. This action cannot be undone!")
             
@@ -775,11 +334,119 @@ def main():
                         st.info("The system has been reset to initial state. All data is removed.")
                     else:
                         st.error(result)
+
+        with tab[5]:
+            st.subheader("Maintenance")
+            st.write("Writes are appended to the end of the data files. Compaction rewrites them once, dropping torn rows left by interrupted writes and stray header rows.")
+            store = get_store()
+            st.write(f"Storage backend: **{store.name}**" + (f" ({store.db_path})" if store.name == 'sqlite' else ""))
+            if store.name == 'sqlite':
+                col1, col2 = st.columns(2)
+                if col1.button("Import master.csv / history.csv"):
+                    imported = [store.import_csv(path) for path in (MASTER_CSV, HISTORY_CSV)]
+                    get_data_cache().invalidate()
+                    get_snapshots().drop_after()
+                    get_snapshots().request_build()
+                    st.success(f"Imported {imported[0]} master rows and {imported[1]} history rows.")
+                if col2.button("Export to master.csv / history.csv"):
+                    exported = [store.export_csv(path) for path in (MASTER_CSV, HISTORY_CSV)]
+                    st.success(f"Exported {exported[0]} master rows and {exported[1]} history rows.")
+            if st.button("Compact Data Files"):
+                master_rows = compact_file(MASTER_CSV)
+                history_rows = compact_file(HISTORY_CSV)
+                st.success(f"Compacted master.csv ({master_rows} rows) and history.csv ({history_rows} rows).")
+
+            st.subheader("Archive")
+            st.write("Superseded versions and removed people move to monthly files under archive/. Day-to-day pages read only the current records; full history and person lookups still include the archive.")
+            st.caption(f"{len(get_archive().partitions())} archive partitions")
+            if st.button("Archive Old Records"):
+                result = archive_master()
+                st.success(f"Archived {result['archived']} records, {result['current']} current records kept." +
+                           (f" Partitions: {', '.join(result['partitions'])}" if result['partitions'] else ""))
+
+            st.subheader("Roster Snapshots")
+            st.write(f"As-of queries start from the roster saved every {SNAPSHOT_MONTHS} month(s) under snapshots/ and replay only the versions after it. Missing snapshots are built in the background - after a write, or after a query that needed one.")
+            snapshots = get_snapshots()
+            st.caption(f"{len(snapshots.cutoffs())} snapshots" + (" - building..." if snapshots.building() else ""))
+            if snapshots.last_error:
+                st.error(f"Last snapshot build failed: {snapshots.last_error}")
+            col1, col2 = st.columns(2)
+            if col1.button("Build Snapshots"):
+                st.success(f"Built {build_roster_snapshots()} snapshots.")
+            if col2.button("Rebuild Snapshots"):
+                get_snapshots().drop_after()
+                st.success(f"Rebuilt {build_roster_snapshots()} snapshots.")
+
+            st.subheader("GitHub Sync")
+            sync_worker = get_git_sync_worker()
+            st.write(f"Changes are pushed in the background once writes pause for {sync_worker.debounce:g}s, "
+                     f"and at least every {sync_worker.max_delay:g}s while they keep coming.")
+            sync_status = sync_worker.status()
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Pending Changes", sync_status['pending_changes'])
+            col2.metric("Last Successful Push", sync_status['last_push'].strftime('%Y-%m-%d %H:%M:%S') if sync_status['last_push'] else "Never")
+            col3.metric("Commits This Session", sync_status['commits'])
+            if sync_status['last_error']:
+                st.error(f"Last sync error: {sync_status['last_error']}")
+            if not sync_status['running']:
+                st.warning("Sync worker is not running.")
+            if st.button("Sync Now"):
+                if sync_worker.flush(timeout=120):
+                    st.success("Sync finished.")
+                else:
+                    st.warning("Sync is still running in the background.")
+
+        with tab[6]:
+            st.subheader("Performance")
+            recorder = get_perf_recorder()
+            st.write(f"Timings of the last {recorder.window} calls per operation in this process" +
+                     (f", also logged to {recorder.log_path}." if recorder.log_path else ". Set ERP_PERF_LOG to keep them in a JSON-lines file."))
+            if recorder.last_error:
+                st.error(f"Logging stopped - {recorder.last_error}")
+            perf = recorder.summary()
+            if perf.empty:
+                st.info("Nothing timed yet.")
+            else:
+                st.dataframe(perf, hide_index=True)
+                op = st.selectbox("Duration histogram", perf['operation'])
+                st.bar_chart(recorder.histogram(op))
+            if st.button("Reset Timings"):
+                recorder.reset()
+                st.rerun()
     
     elif page == "History" and role == 'admin':
         st.title("History")
-        st.dataframe(history_df)
-        if st.download_button("Export History CSV", history_df.to_csv(index=False), "history_export.csv"):
+        options = history_filter_options()
+        col1, col2, col3 = st.columns(3)
+        person_filter = col1.text_input("Person ID")
+        action_filter = col2.selectbox("Action", ["All"] + options['action'])
+        user_filter = col3.selectbox("By User", ["All"] + options['by_user'])
+        col1, col2, col3 = st.columns(3)
+        from_date = col1.date_input("From", value=None)
+        to_date = col2.date_input("To", value=None)
+        page_size = col3.selectbox("Rows per page", [25, 50, 100, 200], index=1)
+        filters = {
+            'person_id': person_filter,
+            'action': '' if action_filter == "All" else action_filter,
+            'by_user': '' if user_filter == "All" else user_filter,
+            'start': from_date,
+            'end': to_date + datetime.timedelta(days=1) if to_date else None,
+        }
+        # The page box is drawn after the query - one query gives both the rows and the page count
+        page_no = st.session_state.get('history_page', 1)
+        page_df, total = query_history(page_no - 1, page_size, **filters)
+        page_count = max(1, -(-total // page_size))
+        if page_no > page_count:
+            # Filters narrowed the results past the chosen page - show the last one
+            page_no = st.session_state['history_page'] = page_count
+            page_df, total = query_history(page_no - 1, page_size, **filters)
+        st.number_input("Page", min_value=1, max_value=page_count, step=1, key='history_page')
+        st.caption(f"{total} entries - page {page_no} of {page_count}, newest first")
+        st.dataframe(page_df)
+        export_format = st.radio("Export format", list(EXPORT_FORMATS), horizontal=True)
+        ext, mime = EXPORT_FORMATS[export_format]
+        if st.download_button(f"Export History {export_format}", lambda: export_data_file(HISTORY_CSV, ext),
+                              f"history_export.{ext}", mime=mime):
             pass
 
 if __name__ == "__main__":
@@ -0,0 +1,67 @@
+"""Shared test setup - the repo root on sys.path and a scratch ERP_DATA_DIR, so no test touches the real data files"""
+import os
+import shutil
+import sys
+import tempfile
+
+import pandas as pd
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+os.environ.setdefault('ERP_DATA_DIR', tempfile.mkdtemp(prefix='erp-test-'))
+# The data directory is no git repo - the sync worker must not run in the middle of a test
+os.environ.setdefault('ERP_GIT_SYNC_DEBOUNCE', '3600')
+os.environ.setdefault('ERP_GIT_SYNC_MAX_DELAY', '3600')
+
+def _reset(erp_data):
+    """Stop the background threads, drop every process-wide object and empty the data directory"""
+    for factory in (erp_data.get_write_queue, erp_data.get_git_sync_worker):
+        running = erp_data._singletons.get(factory.__wrapped__)
+        if running is not None:
+            running.stop()
+    snapshots = erp_data._singletons.get(erp_data.get_snapshots.__wrapped__)
+    while snapshots is not None and snapshots.building():
+        snapshots.build_lock.acquire()
+        snapshots.build_lock.release()
+    erp_data._singletons.clear()
+    erp_data._credentials.clear()
+    for name in os.listdir(erp_data.DATA_DIR):
+        path = os.path.join(erp_data.DATA_DIR, name)
+        shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+    # Bootstrap would bcrypt the default passwords - far slower than any test
+    with open(erp_data.CREDENTIALS_YAML, 'w') as f:
+        f.write('users: {}\n')
+
+@pytest.fixture
+def erp(monkeypatch):
+    """erp_data over an empty data directory on the CSV store - caches, ids and workers start fresh"""
+    import erp_data
+    monkeypatch.setattr(erp_data, 'STORAGE_BACKEND', 'csv')
+    _reset(erp_data)
+    yield erp_data
+    _reset(erp_data)
+
+@pytest.fixture(params=['csv', 'sqlite'])
+def backend(request, erp, monkeypatch):
+    """Same as erp, once per storage backend"""
+    monkeypatch.setattr(erp, 'STORAGE_BACKEND', request.param)
+    return erp
+
+SAMPLE = [
+    # person_id, record_id, area, pp_sz, zone, cc_uc, role, name, cnic, supervisor_id, status, updated_on
+    ('P001', 'W001', 'City', 'PP-110', 'Zone-01', 'CC-001', 'Supervisor', 'Imran Khan', '3520176543219', '', 'active', '2025-10-01 00:00:00'),
+    ('P002', 'W002', 'City', 'PP-110', 'Zone-01', 'CC-001', 'Driver', 'Kamran Ali', '3520298765439', 'W001', 'active', '2025-10-15 00:00:00'),
+    ('P003', 'W003', 'City', 'PP-110', 'Zone-01', 'CC-001', 'Sanitary Worker', 'Bilal Ahmed', '3520212345671', 'W001', 'active', '2025-11-01 00:00:00'),
+]
+
+def sample_rows(erp_data, rows=SAMPLE):
+    """Master rows in stored form from (person_id, record_id, ..., updated_on) tuples"""
+    columns = ['person_id', 'record_id', 'area', 'pp_sz', 'zone', 'cc_uc', 'role', 'name', 'cnic', 'supervisor_id', 'status', 'updated_on']
+    return pd.DataFrame(rows, columns=columns).reindex(columns=erp_data.MASTER_COLUMNS, fill_value='')
+
+@pytest.fixture
+def roster(backend):
+    """Three people at CC-001 - a supervisor and two workers"""
+    backend.append_rows(sample_rows(backend), backend.MASTER_CSV)
+    return backend
@@ -0,0 +1,104 @@
+"""Bulk upload - preview diff against the people on file, then the commit of new and changed rows"""
+import io
+
+from conftest import sample_rows
+
+class Upload(io.BytesIO):
+    """What Streamlit's file_uploader hands over - bytes with a file name"""
+
+    def __init__(self, rows, name='upload.csv'):
+        super().__init__(rows.to_csv(index=False).encode())
+        self.name = name
+
+def upload(erp, rows):
+    preview = erp.preview_bulk_upload(Upload(rows))
+    assert preview['error'] == ''
+    diff = dict(zip(preview['diff']['person_id'], preview['diff']['change']))
+    error, counts = erp.confirm_bulk_upload(preview, 'admin')
+    assert error == ''
+    return diff, counts, preview['report']
+
+def test_reupload_of_removed_person_is_a_new_version(roster):
+    erp = roster
+    export = erp._as_stored(erp.get_current_records(), erp.MASTER_COLUMNS)
+    assert erp.perform_remove('P002', 'W002', 'admin', 'left') is None
+
+    diff, counts, _ = upload(erp, export)
+
+    assert diff == {'P001': 'unchanged', 'P002': 'changed', 'P003': 'unchanged'}
+    assert counts['changed'] == 1 and counts['new'] == 0
+    master = erp.load_df(erp.MASTER_CSV)
+    assert not master['record_id'].duplicated().any()
+    latest = erp.get_latest_record('P002')
+    assert latest['record_id'] not in ('W002', '') and latest['status'] == 'active'
+    assert latest['updated_on'] > erp.pd.Timestamp('2025-10-15')
+    history = erp.load_df(erp.HISTORY_CSV)
+    assert history[history['person_id'] == 'P002']['action'].tolist() == ['remove', 'edit']
+
+def test_reupload_of_archived_person_is_a_new_version(roster):
+    erp = roster
+    export = erp._as_stored(erp.get_current_records(), erp.MASTER_COLUMNS)
+    erp.perform_remove('P002', 'W002', 'admin', 'left')
+    erp.archive_master()
+    assert erp.get_latest_record('P002') is None
+
+    diff, counts, _ = upload(erp, export)
+
+    assert diff['P002'] == 'changed'
+    assert erp.get_latest_record('P002')['status'] == 'active'
+    records = erp.find_person_records(person_id='P002')['record_id']
+    assert not records.duplicated().any()
+
+def test_new_person_with_a_taken_record_id_is_a_conflict(roster):
+    erp = roster
+    row = sample_rows(erp, [('P900', 'W002', 'City', 'PP-110', 'Zone-01', 'CC-001', 'Driver', 'New Driver',
+                             '3520200000001', 'W001', 'active', '')])
+
+    diff, counts, report = upload(erp, row)
+
+    assert diff == {'P900': 'conflict'} and counts['conflict'] == 1
+    assert 'record_conflict' in report['rule'].tolist()
+    master = erp.load_df(erp.MASTER_CSV)
+    assert 'P900' not in master['person_id'].tolist()
+    assert not master['record_id'].duplicated().any()
+
+def test_rows_are_classified_against_the_latest_records(roster):
+    erp = roster
+    rows = erp._as_stored(erp.get_current_records(), erp.MASTER_COLUMNS)
+    rows.loc[1, 'phone'] = '03001234567'
+    # No ids in the file - the CNIC finds the person
+    rows.loc[2, ['person_id', 'record_id', 'name']] = ['', '', 'Bilal Ahmed Khan']
+    rows = erp.pd.concat([rows, sample_rows(erp, [('', '', 'City', 'PP-110', 'Zone-01', 'CC-001', 'Driver', 'Naveed Iqbal',
+                                                   '3520255555555', '', 'active', '')])], ignore_index=True)
+
+    preview = erp.preview_bulk_upload(Upload(rows), batch_rows=2)
+    diff = preview['diff']
+    assert diff['change'].tolist() == ['unchanged', 'changed', 'changed', 'new']
+    assert diff['fields'].tolist() == ['', 'phone', 'name', '']
+    assert diff['person_id'].tolist()[:3] == ['P001', 'P002', 'P003']
+    error, counts = erp.confirm_bulk_upload(preview, 'admin')
+
+    assert error == '' and counts == {'new': 1, 'changed': 2, 'unchanged': 1, 'conflict': 0}
+    current = erp.get_current_records().set_index('name')
+    assert len(current) == 4 and current.loc['Bilal Ahmed Khan', 'person_id'] == 'P003'
+    new = current.loc['Naveed Iqbal']
+    assert new['person_id'] not in ('', 'P001', 'P002', 'P003') and new['record_id'] != ''
+    assert new['supervisor_id'] == 'W001'
+    history = erp.load_df(erp.HISTORY_CSV)
+    assert sorted(zip(history['action'], history['field'])) == [('add', ''), ('edit', 'name'), ('edit', 'phone')]
+
+    # The same file again changes nothing
+    _, counts, _ = upload(erp, rows.assign(person_id='', record_id=''))
+    assert counts == {'new': 0, 'changed': 0, 'unchanged': 4, 'conflict': 0}
+    assert len(erp.load_df(erp.MASTER_CSV)) == 6
+
+def test_cnic_of_another_person_is_a_conflict(roster):
+    erp = roster
+    rows = erp._as_stored(erp.get_current_records(), erp.MASTER_COLUMNS).iloc[[1]]
+    rows['cnic'] = '3520212345671'
+
+    diff, counts, report = upload(erp, rows)
+
+    assert diff == {'P002': 'conflict'} and counts['conflict'] == 1
+    assert report['rule'].tolist().count('cnic_conflict') == 1
+    assert erp.get_latest_record('P002')['cnic'] == '3520298765439'
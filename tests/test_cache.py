@@ -0,0 +1,96 @@
+"""Shared cache and its views - what readers see after a write, ids under concurrent adds, history paging"""
+import threading
+
+from conftest import sample_rows
+
+def test_cache_sees_writes_from_outside(roster):
+    erp = roster
+    assert len(erp.get_current_records()) == 3
+    # Another process appends straight to the store - the cached snapshot must not be served
+    erp.get_store().append(erp.MASTER_CSV, sample_rows(erp, [
+        ('P004', 'W004', 'City', 'PP-110', 'Zone-01', 'CC-001', 'Driver', 'Asif Raza', '3520211111111', 'W001', 'active', '2025-11-02 00:00:00')]))
+
+    assert erp.get_current_records()['person_id'].tolist() == ['P001', 'P002', 'P003', 'P004']
+    assert erp.person_ids_of_cnics(erp.pd.Series(['3520211111111'])).tolist() == ['P004']
+    assert len(erp.search_records('asif')) == 1
+
+def test_views_follow_an_edit(roster):
+    erp = roster
+    counts = erp.get_headcounts()
+    assert counts.loc[counts['role'] == 'Driver', 'count'].tolist() == [1]
+    assert len(erp.search_records('kamran')) == 1
+
+    assert erp.perform_edit('P002', 'W002', 'role', 'Sanitary Worker', 'admin', '') == ''
+    assert erp.perform_edit('P002', erp.get_latest_record('P002')['record_id'], 'name', 'Kamran Shah', 'admin', '') == ''
+
+    current = erp.get_current_records().set_index('person_id')
+    assert len(current) == 3
+    assert current.loc['P002', ['role', 'name']].tolist() == ['Sanitary Worker', 'Kamran Shah']
+    counts = erp.get_headcounts()
+    assert 'Driver' not in counts['role'].tolist()
+    assert counts.loc[counts['role'] == 'Sanitary Worker', 'count'].tolist() == [2]
+    # The index covers every version - the old name still finds the person's older records
+    hits = erp.load_cached_df(erp.MASTER_CSV).loc[erp.search_records('shah')]
+    assert hits['person_id'].tolist() == ['P002']
+    assert set(erp.load_cached_df(erp.MASTER_CSV).loc[erp.search_records('kamran'), 'person_id']) == {'P002'}
+
+def test_removed_people_leave_the_current_views(roster):
+    erp = roster
+    assert erp.get_supervisor_for_cc_uc('CC-001') == 'W001'
+    assert erp.is_supervisor_exists('W001')
+
+    erp.perform_remove('P001', 'W001', 'admin', 'left')
+    erp.perform_remove('P003', 'W003', 'admin', 'left')
+
+    assert erp.get_current_records()['person_id'].tolist() == ['P002']
+    assert erp.get_headcounts()['count'].sum() == 1
+    assert erp.get_supervisor_for_cc_uc('CC-001') == ''
+    assert not erp.is_supervisor_exists('W001')
+    assert erp.get_supervisor_map() == {}
+    # Still on file - the latest record and the CNIC lookup find them
+    assert erp.get_latest_record('P001')['status'] == 'removed'
+    assert erp.person_ids_of_cnics(erp.pd.Series(['3520176543219', '0000000000000'])).tolist() == ['P001', '']
+
+def test_concurrent_adds_get_unique_ids(backend):
+    erp = backend
+    form = {'area': 'City', 'pp_sz': 'PP-110', 'zone': 'Zone-01', 'cc_uc': 'CC-136', 'phone': '03001234567',
+            'vehicle_id': '', 'vehicle_reg_no': '', 'remarks': ''}
+    assert erp.add_new_worker({**form, 'role': 'Supervisor', 'name': 'Sup', 'cnic': '3520100000000'}, 'admin') == ''
+    errors = []
+
+    def add(n):
+        errors.append(erp.add_new_worker({**form, 'role': 'Sanitary Worker', 'name': f'Worker {n}', 'cnic': f'35202{n:08d}'}, 'admin'))
+
+    threads = [threading.Thread(target=add, args=(n,)) for n in range(100)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == [''] * 100
+    erp.get_data_cache().invalidate()
+    master = erp.load_df(erp.MASTER_CSV)
+    assert len(master) == 101
+    assert not master['record_id'].duplicated().any() and not master['person_id'].duplicated().any()
+    history = erp.load_df(erp.HISTORY_CSV)
+    assert len(history) == 101 and not history['log_id'].duplicated().any()
+    # The allocator picks up from the stored ids after a restart
+    erp._singletons.pop(erp.get_sequence_allocator.__wrapped__)
+    assert erp.generate_record_id() not in set(master['record_id'])
+
+def test_history_pages_with_quoted_newlines(backend):
+    erp = backend
+    notes = [f'note {n}, line one\nline "two"' if n % 2 else f'note {n}' for n in range(7)]
+    erp.log_actions([{'person_id': f'P{n % 3:03d}', 'record_id': f'W{n:03d}', 'action': 'edit', 'field': 'name',
+                      'old_value': '', 'new_value': '', 'by_user': 'admin', 'notes': note} for n, note in enumerate(notes)])
+    erp.log_action('P009', 'W009', 'remove', 'status', 'active', 'removed', 'clerk', 'last\n')
+
+    pages = [erp.query_history(page, 3) for page in range(3)]
+    assert [total for _, total in pages] == [8, 8, 8]
+    newest_first = ['last\n'] + notes[::-1]
+    assert [note for page, _ in pages for note in page['notes']] == newest_first
+
+    page, total = erp.query_history(0, 10, person_id='P001', action='edit')
+    assert total == 2 and page['notes'].tolist() == [notes[4], notes[1]]
+    page, total = erp.query_history(0, 10, by_user='clerk')
+    assert total == 1 and page['person_id'].tolist() == ['P009']
@@ -0,0 +1,119 @@
+"""GitSyncWorker against a real bare remote - bursts of writes become one commit, steady writes still get pushed"""
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from conftest import REPO_DIR
+from erp_data import GitSyncWorker
+
+def git(*args, cwd):
+    return subprocess.run(['git', *args], cwd=cwd, capture_output=True, text=True, check=True).stdout.strip()
+
+def remote_commits(remote) -> int:
+    return int(git('rev-list', '--count', 'HEAD', cwd=remote))
+
+def wait_for(predicate, timeout: float = 10) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return predicate()
+
+@pytest.fixture
+def repo(tmp_path):
+    """(work tree, bare remote) - the work tree tracks the remote and has one commit pushed"""
+    remote, work = tmp_path / 'remote.git', tmp_path / 'work'
+    git('init', '--bare', str(remote), cwd=tmp_path)
+    git('clone', str(remote), str(work), cwd=tmp_path)
+    git('config', 'user.email', 'sync@example.com', cwd=work)
+    git('config', 'user.name', 'sync', cwd=work)
+    (work / 'master.csv').write_text('person_id\n')
+    git('add', 'master.csv', cwd=work)
+    git('commit', '-m', 'init', cwd=work)
+    git('push', '-u', 'origin', 'HEAD', cwd=work)
+    return work, remote
+
+def write(work, n: int):
+    with open(os.path.join(work, 'master.csv'), 'a') as f:
+        f.write(f'P{n:03d}\n')
+
+def test_burst_of_writes_is_one_commit(repo):
+    work, remote = repo
+    worker = GitSyncWorker(str(work), ['master.csv'], debounce=0.5, max_delay=30)
+    try:
+        for n in range(10):
+            write(work, n)
+            worker.request('master.csv')
+            time.sleep(0.02)
+        assert wait_for(lambda: worker.status()['commits'] == 1)
+        time.sleep(1)
+        assert remote_commits(remote) == 2
+        assert worker.status()['pending_changes'] == 0
+        assert git('show', 'HEAD:master.csv', cwd=remote).splitlines()[1:] == [f'P{n:03d}' for n in range(10)]
+    finally:
+        worker.stop()
+
+def test_steady_writes_are_pushed_within_max_delay(repo):
+    work, remote = repo
+    # Writes every 0.2s never leave the 1s debounce quiet - only the cap gets them out
+    worker = GitSyncWorker(str(work), ['master.csv'], debounce=1, max_delay=1)
+    try:
+        start = time.monotonic()
+        n = 0
+        while time.monotonic() - start < 3:
+            write(work, n)
+            worker.request('master.csv')
+            n += 1
+            time.sleep(0.2)
+        assert remote_commits(remote) >= 2
+        assert worker.status()['last_error'] == ''
+    finally:
+        worker.stop()
+
+def test_failed_commit_is_reported(repo):
+    work, remote = repo
+    hook = work / '.git' / 'hooks' / 'pre-commit'
+    hook.write_text('#!/bin/sh\necho "commit refused" >&2\nexit 1\n')
+    hook.chmod(0o755)
+    worker = GitSyncWorker(str(work), ['master.csv'], debounce=30, max_delay=30)
+    try:
+        write(work, 1)
+        worker.request('master.csv')
+        assert worker.flush(10)
+        status = worker.status()
+        assert status['commits'] == 0 and status['last_push'] is None
+        assert 'commit refused' in status['last_error']
+        assert remote_commits(remote) == 1
+    finally:
+        worker.stop()
+
+def test_nothing_to_commit_is_no_error(repo):
+    work, remote = repo
+    worker = GitSyncWorker(str(work), ['master.csv'], debounce=30, max_delay=30)
+    try:
+        worker.request('master.csv')
+        assert worker.flush(10)
+        status = worker.status()
+        assert status['commits'] == 0 and status['last_error'] == '' and status['last_push'] is not None
+    finally:
+        worker.stop()
+
+EXIT_SCRIPT = """
+import erp_data
+# Writer first, then the sync worker - atexit would stop them in the opposite order
+writer = erp_data.get_write_queue()
+erp_data.get_git_sync_worker()
+writer.submit(erp_data.log_actions, [{'person_id': 'P001', 'record_id': 'W001', 'action': 'edit', 'by_user': 'exit'}])
+"""
+
+def test_writes_flushed_at_exit_are_pushed(repo):
+    work, remote = repo
+    (work / 'credentials.yaml').write_text('users: {}\n')
+    env = dict(os.environ, ERP_DATA_DIR=str(work), ERP_STORAGE_BACKEND='csv', PYTHONDONTWRITEBYTECODE='1',
+               ERP_GIT_SYNC_DEBOUNCE='3600', ERP_GIT_SYNC_MAX_DELAY='3600')
+    subprocess.run([sys.executable, '-c', EXIT_SCRIPT], cwd=REPO_DIR, env=env, check=True, timeout=120)
+    assert 'P001,W001,edit' in git('show', 'HEAD:history.csv', cwd=remote)
@@ -0,0 +1,54 @@
+"""Importing erp_data is cheap - no files written, no UI or optional packages loaded"""
+import json
+import os
+import subprocess
+import sys
+
+from conftest import REPO_DIR
+
+IMPORT_SECONDS = 0.5  # erp_data's own import, pandas / numpy / yaml already loaded
+
+PROBE = """
+import json, sys, time
+import numpy, pandas, yaml
+t0 = time.perf_counter()
+import erp_data
+print(json.dumps({'seconds': time.perf_counter() - t0,
+                  'modules': [name for name in ('streamlit', 'bcrypt', 'openpyxl') if name in sys.modules]}))
+"""
+
+def listing(path):
+    found = []
+    for root, dirs, files in os.walk(path):
+        dirs[:] = [name for name in dirs if name != '.git']
+        found += [os.path.relpath(os.path.join(root, name), path) for name in dirs + files]
+    return sorted(found)
+
+def test_import_is_side_effect_free(tmp_path):
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    repo_before = listing(REPO_DIR)
+    env = dict(os.environ, ERP_DATA_DIR=str(data_dir), PYTHONPATH=REPO_DIR, PYTHONDONTWRITEBYTECODE='1')
+    probe = subprocess.run([sys.executable, '-c', PROBE], cwd=tmp_path, env=env,
+                           capture_output=True, text=True, check=True)
+    result = json.loads(probe.stdout)
+    assert listing(data_dir) == []
+    assert listing(REPO_DIR) == repo_before
+    assert result['modules'] == []
+    assert result['seconds'] < IMPORT_SECONDS
+
+BOOTSTRAP = """
+import erp_data
+erp_data.ensure_bootstrap()
+"""
+
+def test_bootstrap_writes_only_to_the_data_dir(tmp_path):
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    # Present already, so bootstrap does not bcrypt the default passwords
+    (data_dir / 'credentials.yaml').write_text('users: {}\n')
+    repo_before = listing(REPO_DIR)
+    env = dict(os.environ, ERP_DATA_DIR=str(data_dir), PYTHONPATH=REPO_DIR, PYTHONDONTWRITEBYTECODE='1')
+    subprocess.run([sys.executable, '-c', BOOTSTRAP], cwd=tmp_path, env=env, capture_output=True, check=True)
+    assert listing(REPO_DIR) == repo_before
+    assert {'master.csv', 'history.csv', 'sample_master.csv', 'master_template.csv', 'history_template.csv'} <= set(listing(data_dir))
@@ -0,0 +1,119 @@
+"""Current and as-of rosters across archiving and snapshots, and the bulk transfer / status actions"""
+import pandas as pd
+
+from conftest import sample_rows
+
+def people(df):
+    return sorted(df['person_id'])
+
+def built(erp):
+    """Snapshot dates once the background build started by a query or an append is done"""
+    snapshots = erp.get_snapshots()
+    while snapshots.building():
+        snapshots.build_lock.acquire()
+        snapshots.build_lock.release()
+    return snapshots.cutoffs()
+
+def test_as_of_follows_the_record_dates(roster):
+    erp = roster
+    assert people(erp.as_of_roster('2025-09-30')) == []
+    assert people(erp.as_of_roster('2025-10-01')) == ['P001']
+    assert people(erp.as_of_roster('2025-10-31')) == ['P001', 'P002']
+    assert people(erp.as_of_roster(pd.Timestamp.now())) == ['P001', 'P002', 'P003']
+
+def test_removed_people_before_and_after_archiving(roster):
+    erp = roster
+    erp.perform_remove('P002', 'W002', 'admin', 'left')
+    yesterday = pd.Timestamp.now() - pd.Timedelta(days=1)
+    assert people(erp.get_current_records()) == ['P001', 'P003']
+    assert people(erp.as_of_roster(pd.Timestamp.now())) == ['P001', 'P003']
+    assert people(erp.as_of_roster(yesterday)) == ['P001', 'P002', 'P003']
+
+    result = erp.archive_master()
+
+    assert result['archived'] == 2 and result['current'] == 2
+    assert people(erp.load_df(erp.MASTER_CSV)) == ['P001', 'P003']
+    assert people(erp.get_current_records()) == ['P001', 'P003']
+    assert people(erp.as_of_roster(pd.Timestamp.now())) == ['P001', 'P003']
+    assert people(erp.as_of_roster(yesterday)) == ['P001', 'P002', 'P003']
+    assert erp.find_person_records(person_id='P002')['status'].tolist() == ['active', 'removed']
+    assert erp.person_ids_of_cnics(pd.Series(['3520298765439'])).tolist() == ['P002']
+    assert len(erp.load_master_history()) == 4
+
+def test_snapshots_replay_to_the_same_roster(roster):
+    erp = roster
+    erp.perform_remove('P003', 'W003', 'admin', 'left')
+    dates = ['2025-10-01', '2025-10-20', '2025-11-15', pd.Timestamp.now()]
+    # Replayed from the master alone - the first query starts the snapshot build
+    expected = [people(erp.as_of_roster(date)) for date in dates]
+
+    cutoffs = built(erp)
+    assert cutoffs[0] == pd.Timestamp('2025-11-01')
+    assert people(erp.get_snapshots().load(cutoffs[0])) == ['P001', 'P002']
+    assert [people(erp.as_of_roster(date)) for date in dates] == expected
+    erp.archive_master()
+    assert [people(erp.as_of_roster(date)) for date in dates] == expected
+
+def test_backdated_rows_drop_later_snapshots(roster):
+    erp = roster
+    erp.as_of_roster(pd.Timestamp.now())
+    assert pd.Timestamp('2025-11-01') in built(erp)
+    late = sample_rows(erp, [('P002', 'W010', 'City', 'PP-110', 'Zone-01', 'CC-001', 'Driver', 'Kamran Ali', '3520298765439',
+                              'W001', 'removed', '2025-10-20 00:00:00')])
+
+    erp.serialized_write(erp.append_rows)(late, erp.MASTER_CSV)
+    assert pd.Timestamp('2025-11-01') in built(erp)
+
+    assert people(erp.as_of_roster('2025-10-19')) == ['P001', 'P002']
+    assert people(erp.as_of_roster('2025-11-15')) == ['P001', 'P003']
+    assert people(erp.get_snapshots().load(pd.Timestamp('2025-11-01'))) == ['P001']
+
+PLACE = {'area': 'City', 'pp_sz': 'PP-110', 'zone': 'Zone-01', 'cc_uc': 'CC-136'}
+
+def skipped(result):
+    return dict(zip(result['person_id'], result['reason']))
+
+def test_bulk_transfer(roster):
+    erp = roster
+    error, result = erp.perform_bulk_transfer(['P002', 'P003'], PLACE, 'admin', '')
+    assert error == "Nobody in the selection can be transferred."
+    assert set(skipped(result).values()) == {"No supervisor found for the new CC/UC."}
+
+    # The supervisor moving with them takes the new CC/UC
+    error, result = erp.perform_bulk_transfer(['P002', 'P001', 'P003', 'P404', ' '], PLACE, 'admin', 'merged')
+    assert error == ''
+    assert skipped(result) == {'P404': "No records found for this Person ID."}
+    current = erp.get_current_records().set_index('person_id')
+    assert set(current['cc_uc']) == {'CC-136'}
+    supervisor = current.loc['P001', 'record_id']
+    assert erp.get_supervisor_for_cc_uc('CC-136') == supervisor
+    assert current.loc[['P002', 'P003'], 'supervisor_id'].tolist() == [supervisor, supervisor]
+    assert erp.load_df(erp.HISTORY_CSV)['field'].tolist() == ['cc_uc'] * 3
+
+    error, result = erp.perform_bulk_transfer(['P002'], PLACE, 'admin', '')
+    assert skipped(result) == {'P002': "Already at this CC/UC."}
+    error, _ = erp.perform_bulk_transfer(['P002'], {**PLACE, 'cc_uc': 'CC-999'}, 'admin', '')
+    assert error == "Unknown CC/UC for this area."
+
+def test_bulk_status(roster):
+    erp = roster
+    error, result = erp.perform_bulk_status(['P002', 'P003'], 'retired', 'admin', '')
+    assert error.startswith("Invalid Status")
+
+    error, result = erp.perform_bulk_status(['P001', 'P002'], 'removed', 'admin', 'left')
+    assert error == '' and result.empty
+    assert people(erp.get_current_records()) == ['P003']
+    error, result = erp.perform_bulk_status(['P002', 'P003'], 'removed', 'admin', '')
+    assert skipped(result) == {'P002': "Already removed."}
+    assert people(erp.get_current_records()) == []
+
+    # Reactivated after archiving - the supervisor is looked up before the batch, so workers wait for the next one
+    erp.archive_master()
+    error, result = erp.perform_bulk_status(['P002', 'P001', 'P003'], 'active', 'admin', 'back')
+    assert error == ''
+    assert skipped(result) == {'P002': "No supervisor found for this CC/UC.", 'P003': "No supervisor found for this CC/UC."}
+    error, result = erp.perform_bulk_status(['P002', 'P003', 'P001'], 'active', 'admin', 'back')
+    assert skipped(result) == {'P001': "Already active."}
+    current = erp.get_current_records().set_index('person_id')
+    assert current.loc[['P002', 'P003'], 'supervisor_id'].tolist() == [current.loc['P001', 'record_id']] * 2
+    assert erp.load_df(erp.HISTORY_CSV)['action'].tolist() == ['remove'] * 3 + ['status'] * 3
@@ -0,0 +1,102 @@
+"""Storage - the append-only CSV file with its torn-tail recovery, and the store API on both backends"""
+import pandas as pd
+import pytest
+
+import erp_data
+from conftest import sample_rows
+
+HEADER = b'person_id,record_id,notes\n'
+ROWS = b'P001,W001,plain\nP002,W002,"comma, and\nnewline"\n'
+
+def rows(*records):
+    return pd.DataFrame(records, columns=['person_id', 'record_id', 'notes'])
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_bytes(HEADER + ROWS)
+    return str(path)
+
+def test_append_creates_the_file_and_fsyncs(tmp_path, monkeypatch):
+    synced = []
+    fsync = erp_data.os.fsync
+    monkeypatch.setattr(erp_data.os, 'fsync', lambda fd: synced.append(fd) or fsync(fd))
+    path = str(tmp_path / 'new.csv')
+    erp_data.append_csv(path, rows(('P001', 'W001', 'first')))
+    erp_data.append_csv(path, rows(('P002', 'W002', 'second')))
+    assert open(path, 'rb').read() == HEADER + b'P001,W001,first\nP002,W002,second\n'
+    # Each append syncs the file, creating it also syncs the directory
+    assert len(synced) == 3
+
+@pytest.mark.parametrize('tail, kept', [
+    (b'', 2),
+    (b'P003,W0', 2),  # cut short
+    (b'P003,W003,"quoted, cut', 2),  # cut inside the last quoted value
+    (b'P003,W003,"two\n', 2),  # cut right after a newline inside the last quoted value
+    (b'P003,W003,"two\nlines, cut', 2),
+    ('P003,W003,Ø'.encode()[:-1], 2),  # cut inside a character
+    (b'P003,W003,done', 3),  # whole row, only the newline missing
+    (b'P003,W003,"two\nlines"', 3),
+])
+def test_torn_tail(path, tail, kept):
+    with open(path, 'ab') as f:
+        f.write(tail)
+    loaded = erp_data.load_csv(path)
+    assert loaded['person_id'].tolist() == ['P001', 'P002', 'P003'][:kept]
+    assert loaded['notes'].iloc[1] == 'comma, and\nnewline'
+
+    erp_data.append_csv(path, rows(('P004', 'W004', 'after "the" tail')))
+    loaded = erp_data.load_csv(path)
+    assert loaded['person_id'].tolist() == ['P001', 'P002', 'P003'][:kept] + ['P004']
+    assert loaded['notes'].iloc[-1] == 'after "the" tail'
+
+def test_rescan_after_truncation(path):
+    erp_data.append_csv(path, rows(('P003', 'W003', 'x')))
+    with open(path, 'r+b') as f:
+        f.truncate(len(HEADER))
+    with open(path, 'ab') as f:
+        f.write(b'P009,W009,"open\n')
+    assert erp_data.load_csv(path).empty
+    erp_data.append_csv(path, rows(('P010', 'W010', 'y')))
+    assert erp_data.load_csv(path)['person_id'].tolist() == ['P010']
+
+def test_a_row_with_a_newline_at_a_scan_chunk_edge(path, monkeypatch):
+    monkeypatch.setattr(erp_data, 'ROW_SCAN_BYTES', 7)
+    notes = ['a\nb\nc\nd', 'plain', '"\n"', '']
+    erp_data.append_csv(path, rows(*[(f'P1{n}', f'W1{n}', note) for n, note in enumerate(notes)]))
+    with open(path, 'ab') as f:
+        f.write(b'P099,W099,"torn\n')
+    assert erp_data.load_csv(path)['notes'].tolist()[2:] == notes
+
+def test_store_round_trip(backend):
+    store = backend.get_store()
+    master = backend.MASTER_CSV
+    people = sample_rows(backend)
+    people.loc[1, 'remarks'] = 'Moved, see "note"\nsecond line'
+    before = store.signature(master)
+    generation = store.generation(master)
+    store.append(master, people)
+    assert store.signature(master) != before
+    assert store.generation(master) == generation
+
+    loaded = store.load(master)
+    assert loaded['person_id'].tolist() == ['P001', 'P002', 'P003']
+    assert loaded['remarks'].iloc[1] == 'Moved, see "note"\nsecond line'
+    assert store.tail(master)['person_id'].tolist()[-1] == 'P003'
+    assert [len(chunk) for chunk in store.iter_chunks(master, chunk_size=2)] == [2, 1]
+
+    store.replace(master, loaded.iloc[:1])
+    assert store.load(master)['person_id'].tolist() == ['P001']
+    assert store.generation(master) != generation
+    assert store.compact(master) == 1
+    store.reset(master)
+    assert store.load(master).empty
+
+def test_store_drops_a_torn_master_row(erp):
+    store = erp.get_store()
+    store.append(erp.MASTER_CSV, sample_rows(erp))
+    with open(erp.MASTER_CSV, 'ab') as f:
+        f.write(b'P004,W004,City,"PP-1')
+    assert store.load(erp.MASTER_CSV)['person_id'].tolist() == ['P001', 'P002', 'P003']
+    assert store.compact(erp.MASTER_CSV) == 3
+    assert open(erp.MASTER_CSV, 'rb').read().endswith(b'\n')
@@ -0,0 +1,61 @@
+"""Validation rules - whole-frame reports and the single-value checks of the forms"""
+import pandas as pd
+import pytest
+
+def report(erp, rows, **kwargs):
+    found = erp.validate_frame(pd.DataFrame(rows), **kwargs)
+    return list(zip(found['row'], found['column'], found['rule']))
+
+GOOD = {'cnic': '3520112345678', 'phone': '03001234567', 'area': 'City', 'pp_sz': 'PP-110', 'zone': 'Zone-01',
+        'cc_uc': 'CC-136', 'role': 'Driver', 'vehicle_id': 'V1', 'updated_on': '2025-10-01 08:00:00'}
+
+def test_each_rule_reports_its_rows(erp):
+    rows = [
+        GOOD,
+        {**GOOD, 'cnic': '35201-1234567-8', 'phone': '3001234567'},
+        {**GOOD, 'area': 'Town'},
+        {**GOOD, 'pp_sz': 'SZ-01', 'cc_uc': 'UC-131'},
+        {**GOOD, 'cc_uc': 'CC-999'},
+        {**GOOD, 'zone': 'Zone-02'},
+        {**GOOD, 'role': 'Sanitary Worker', 'updated_on': '2025-02-30'},
+        {**GOOD, 'area': 'Sadar', 'pp_sz': 'SZ-01', 'zone': 'Z-01', 'cc_uc': 'UC-131', 'updated_on': '01/10/2025'},
+    ]
+    assert report(erp, rows) == [
+        (2, 'cnic', 'cnic_format'), (2, 'phone', 'phone_format'),
+        (3, 'area', 'area_value'),
+        (4, 'pp_sz', 'pp_sz_format'), (4, 'cc_uc', 'cc_uc_format'),
+        (5, 'cc_uc', 'cc_uc_known'),
+        (6, 'cc_uc', 'hierarchy'),
+        (7, 'role', 'vehicle_driver_only'), (7, 'updated_on', 'date_format'),
+    ]
+
+def test_required_and_columns(erp):
+    blank = {**GOOD, 'cnic': '', 'phone': ''}
+    assert report(erp, [blank]) == []
+    assert report(erp, [blank], required=['cnic']) == [(1, 'cnic', 'cnic_format')]
+    assert report(erp, [{**blank, 'area': 'Town'}], required=['cnic'], columns=['cnic', 'phone']) == [(1, 'cnic', 'cnic_format')]
+    assert erp.first_error(erp.validate_frame(pd.DataFrame([blank]), required=erp.REQUIRED_COLUMNS)) == "Invalid CNIC: Must be 13 digits."
+
+@pytest.mark.parametrize('check, args, valid', [
+    ('validate_cnic', ('3520112345678',), True),
+    ('validate_cnic', ('352011234567',), False),
+    ('validate_cnic', ('',), False),
+    ('validate_phone', ('03001234567',), True),
+    ('validate_phone', ('0300-1234567',), False),
+    ('validate_date', ('2025-10-01',), True),
+    ('validate_date', ('01/10/2025 08:00',), True),
+    ('validate_date', ('2025-13-01',), False),
+    ('validate_date', ('',), True),
+    ('validate_date', (None,), True),
+    ('validate_pp_sz', ('PP-110', 'City'), True),
+    ('validate_pp_sz', ('SZ-01', 'Sadar'), True),
+    ('validate_pp_sz', ('SZ-01', 'City'), False),
+    ('validate_pp_sz', ('PP-110', 'Town'), False),
+    ('validate_pp_sz', ('', 'City'), False),
+    ('validate_cc_uc', ('CC-136', 'City'), True),
+    ('validate_cc_uc', ('UC-131', 'Sadar'), True),
+    ('validate_cc_uc', ('UC-131', 'City'), False),
+    ('validate_cc_uc', ('CC-999', 'City'), False),
+])
+def test_single_value_checks(erp, check, args, valid):
+    assert getattr(erp, check)(*args) is valid
@@ -0,0 +1,55 @@
+"""Writer thread - failed requests and failed flushes leave the cache matching the store"""
+import pytest
+
+from conftest import sample_rows
+
+def person(erp, person_id, record_id):
+    return sample_rows(erp, [(person_id, record_id, 'City', 'PP-110', 'Zone-01', 'CC-001', 'Driver', 'Extra Driver',
+                              '', 'W001', 'active', '2025-12-01 00:00:00')])
+
+def person_ids(erp):
+    cached = erp.load_cached_df(erp.MASTER_CSV)['person_id'].tolist()
+    stored = erp.load_df(erp.MASTER_CSV)['person_id'].tolist()
+    assert cached == stored
+    return stored
+
+def test_failed_flush_leaves_no_phantom_rows(roster, monkeypatch):
+    erp = roster
+
+    def append_then_flush():
+        erp.append_rows(person(erp, 'P010', 'W010'), erp.MASTER_CSV)
+        erp._flush_pending(erp.MASTER_CSV)
+
+    def broken_append(file_path, rows):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(erp.get_store(), 'append', broken_append)
+    with pytest.raises(OSError):
+        erp.serialized_write(append_then_flush)()
+    monkeypatch.undo()
+
+    assert person_ids(erp) == ['P001', 'P002', 'P003']
+    erp.get_data_cache()._entries.clear()
+    assert person_ids(erp) == ['P001', 'P002', 'P003']
+
+def test_rows_of_a_failed_request_are_not_written(roster):
+    erp = roster
+
+    def append_then_fail():
+        erp.append_rows(person(erp, 'P010', 'W010'), erp.MASTER_CSV)
+        raise ValueError('rejected')
+
+    def append(person_id, record_id):
+        erp.append_rows(person(erp, person_id, record_id), erp.MASTER_CSV)
+
+    queue = erp.get_write_queue()
+    # Submitted together, so they usually share one batch with the failing request in the middle
+    futures = [queue.submit(append, 'P011', 'W011'), queue.submit(append_then_fail), queue.submit(append, 'P012', 'W012')]
+    with pytest.raises(ValueError):
+        futures[1].result()
+    futures[0].result()
+    futures[2].result()
+
+    assert person_ids(erp) == ['P001', 'P002', 'P003', 'P011', 'P012']
+    erp.get_data_cache()._entries.clear()
+    assert person_ids(erp) == ['P001', 'P002', 'P003', 'P011', 'P012']